@@ -0,0 +1,306 @@
+"""Precomputed answers for frequent questions.
+
+Answers are generated ahead of time and kept in a compact file (compressed JSON
+records plus float16 question embeddings) that the API loads at startup. Each
+answer is tagged with the knowledge base version it was generated from and is
+only served while that version is live. After a reload the API regenerates the
+stale answers in the background. The CLI builds the question list from a file,
+the test_queries in the knowledge file and the most frequent questions in the
+SQLite history:
+
+    python answer_store.py --test-queries --history --top 100
+    python answer_store.py --questions faq.txt
+    python answer_store.py            # regenerate stale answers only
+"""
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from file_lock import FileLock
+from response_cache import query_discriminators, normalize_question
+
+logger = logging.getLogger(__name__)
+
+# Save progress every this many regenerated answers, so an interrupted refresh keeps its work
+_SAVE_EVERY = 20
+
+
+class _Answer:
+    __slots__ = ("question", "version", "response", "created_at", "discriminators")
+
+    def __init__(self, question: str, version: str, response: Dict[str, Any], created_at: float):
+        self.question = question
+        self.version = version
+        self.response = response
+        self.created_at = created_at
+        self.discriminators = query_discriminators(normalize_question(question))
+
+
+class AnswerStore:
+    """Answers keyed on the normalized question, each tagged with the index version it came from.
+
+    Lookups match exactly on the normalized question or, given the question's
+    embedding, semantically with the same threshold and discriminator rules as
+    the response cache. Answers from another index version never match.
+    """
+
+    def __init__(self, path: str, embed_fn: Callable[[str], np.ndarray], similarity_threshold: float = 0.92,
+                 embedding_model: str = ""):
+        self.path = path
+        self.embed_fn = embed_fn
+        self.similarity_threshold = similarity_threshold
+        self.embedding_model = embedding_model
+        self._answers: Dict[str, _Answer] = {}
+        self._keys: List[str] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self._counters = {"exact_hits": 0, "semantic_hits": 0, "regenerated": 0, "failed": 0}
+        self.load()
+
+    def lookup(self, question: str, version: str,
+               embedding: Optional[np.ndarray] = None) -> Optional[Dict[str, Any]]:
+        """Stored response for the question at this index version, or None"""
+        normalized = normalize_question(question)
+        with self._lock:
+            answer = self._answers.get(normalized)
+            if answer is not None and answer.version == version:
+                self._counters["exact_hits"] += 1
+                return dict(answer.response)
+            if embedding is None or self._matrix is None or self._matrix.shape[1] != len(embedding):
+                return None
+            scores = self._matrix @ embedding.astype(np.float32)
+            discriminators = query_discriminators(normalized)
+            for i in np.argsort(-scores):
+                if scores[i] < self.similarity_threshold:
+                    break
+                answer = self._answers[self._keys[i]]
+                if answer.version == version and answer.discriminators == discriminators:
+                    self._counters["semantic_hits"] += 1
+                    logger.info(f"Precomputed answer ({scores[i]:.3f}) for question: {question}")
+                    return dict(answer.response)
+        return None
+
+    def put(self, question: str, version: str, response: Dict[str, Any]):
+        """Store an answer, dropping heavyweight fields such as source documents"""
+        answer = _Answer(question, version, {
+            "answer": response["answer"],
+            "confidence": response["confidence"],
+            "sources": list(response.get("sources", [])),
+        }, time.time())
+        key = normalize_question(question)
+        embedding = None if key in self._answers else self.embed_fn(question)
+        with self._lock:
+            if key not in self._answers:
+                self._keys.append(key)
+                row = embedding.astype(np.float32)[None, :]
+                self._matrix = row if self._matrix is None else np.vstack([self._matrix, row])
+            self._answers[key] = answer
+
+    def remove(self, questions: List[str]) -> int:
+        keys = {normalize_question(question) for question in questions}
+        with self._lock:
+            keep = [i for i, key in enumerate(self._keys) if key not in keys]
+            removed = len(self._keys) - len(keep)
+            for key in keys:
+                self._answers.pop(key, None)
+            self._keys = [self._keys[i] for i in keep]
+            self._matrix = self._matrix[keep] if self._matrix is not None and keep else None
+        return removed
+
+    def questions(self, stale_for: Optional[str] = None) -> List[str]:
+        """Stored questions, or only those whose answer is not for index version ``stale_for``"""
+        with self._lock:
+            return [answer.question for answer in self._answers.values()
+                    if stale_for is None or answer.version != stale_for]
+
+    def refresh(self, generate: Callable[[str], Optional[Dict[str, Any]]], version: str,
+                questions: Optional[List[str]] = None, force: bool = False,
+                should_stop: Optional[Callable[[], bool]] = None) -> Dict[str, Any]:
+        """Generate answers for ``questions`` (default: those stored) that are missing or stale for ``version``.
+
+        ``generate`` returns a response, or None when the question should not be
+        stored. Holds a file lock, so with several workers one regenerates while the
+        others wait and then load its file.
+        """
+        start = time.perf_counter()
+        report = {"version": version, "regenerated": 0, "skipped": 0, "failed": 0, "up_to_date": 0}
+        with FileLock(f"{self.path}.lock"):
+            self.load()
+            for question in questions if questions is not None else self.questions():
+                if should_stop is not None and should_stop():
+                    report["stopped"] = True
+                    break
+                with self._lock:
+                    answer = self._answers.get(normalize_question(question))
+                if answer is not None and answer.version == version and not force:
+                    report["up_to_date"] += 1
+                    continue
+                try:
+                    response = generate(question)
+                except Exception as e:
+                    logger.warning(f"Failed to precompute an answer for '{question}': {e}")
+                    report["failed"] += 1
+                    continue
+                if response is None:
+                    report["skipped"] += 1
+                    continue
+                self.put(question, version, response)
+                report["regenerated"] += 1
+                if report["regenerated"] % _SAVE_EVERY == 0:
+                    self.save()
+            if report["regenerated"]:
+                self.save()
+        with self._lock:
+            self._counters["regenerated"] += report["regenerated"]
+            self._counters["failed"] += report["failed"]
+        report["duration_seconds"] = round(time.perf_counter() - start, 3)
+        logger.info(f"Precomputed answers refreshed: {report}")
+        return report
+
+    def save(self):
+        """Write the store to disk, replacing the previous file atomically"""
+        with self._lock:
+            records = [
+                [answer.question, answer.version, answer.response, answer.created_at]
+                for answer in (self._answers[key] for key in self._keys)
+            ]
+            matrix = self._matrix if self._matrix is not None else np.zeros((0, 0), dtype=np.float32)
+        payload = json.dumps({"embedding_model": self.embedding_model, "records": records}).encode()
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(f, records=np.frombuffer(payload, dtype=np.uint8), embeddings=matrix.astype(np.float16))
+        os.replace(tmp_path, self.path)
+        logger.info(f"Saved {len(records)} precomputed answers to {self.path}")
+
+    def load(self):
+        """Replace the in-memory answers with the file's, re-embedding questions if the model changed"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path) as data:
+                payload = json.loads(data["records"].tobytes())
+                matrix = data["embeddings"].astype(np.float32)
+        except Exception as e:
+            logger.warning(f"Failed to load precomputed answers from {self.path}: {e}")
+            return
+        answers = {normalize_question(question): _Answer(question, version, response, created_at)
+                   for question, version, response, created_at in payload["records"]}
+        keys = list(answers)
+        if payload.get("embedding_model") != self.embedding_model or len(matrix) != len(keys):
+            logger.info(f"Re-embedding {len(keys)} precomputed questions for {self.embedding_model}")
+            matrix = np.vstack([self.embed_fn(answers[key].question) for key in keys]).astype(np.float32) if keys else None
+        with self._lock:
+            self._answers, self._keys = answers, keys
+            self._matrix = matrix if keys else None
+        logger.info(f"Loaded {len(keys)} precomputed answers from {self.path}")
+
+    def stats(self, version: Optional[str] = None) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._counters,
+                "entries": len(self._answers),
+                "current": sum(answer.version == version for answer in self._answers.values()),
+                "path": self.path,
+            }
+
+    def __len__(self) -> int:
+        return len(self._answers)
+
+
+def history_questions(path: str, top: int = 100, min_count: int = 2) -> List[Tuple[str, int]]:
+    """Most frequent questions in a SQLite history file as (question, count), most asked first"""
+    counts: Counter = Counter()
+    phrasing: Dict[str, str] = {}
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        for (question,) in connection.execute("SELECT question FROM history"):
+            normalized = normalize_question(question)
+            counts[normalized] += 1
+            phrasing.setdefault(normalized, question)
+    finally:
+        connection.close()
+    return [(phrasing[key], count) for key, count in counts.most_common(top) if count >= min_count]
+
+
+def read_questions(path: str) -> List[str]:
+    """Questions from a text file (one per line) or a JSON list of strings or {"question": ...} objects"""
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".json"):
+            return [item["question"] if isinstance(item, dict) else item for item in json.load(f)]
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Pre-generate answers for frequent questions")
+    parser.add_argument("--questions", action="append", default=[], metavar="FILE",
+                        help="Text file with one question per line, or a JSON list (repeatable)")
+    parser.add_argument("--test-queries", action="store_true", help="Add the test_queries from the knowledge file")
+    parser.add_argument("--history", nargs="?", const="", default=None, metavar="DB",
+                        help="Add the most frequent questions from a SQLite history file (default HISTORY_PATH)")
+    parser.add_argument("--top", type=int, default=100, help="Questions taken from the history")
+    parser.add_argument("--min-count", type=int, default=2, help="Times a history question must have been asked")
+    parser.add_argument("--force", action="store_true", help="Regenerate answers that are already current")
+    parser.add_argument("--prune", action="store_true", help="Drop stored questions not in this run's list")
+    parser.add_argument("--output", default=None, help="Store file (default PRECOMPUTED_ANSWERS_PATH)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    from config import settings
+    from knowledge_processor import KnowledgeBaseProcessor
+    from rag_system import SmartCityRAG
+
+    args = parse_args(argv)
+    logging.basicConfig(level=settings.LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    settings.PRECOMPUTED_ANSWERS_PATH = args.output or settings.PRECOMPUTED_ANSWERS_PATH or "precomputed_answers.npz"
+
+    questions: List[str] = []
+    for path in args.questions:
+        questions.extend(read_questions(path))
+    if args.test_queries:
+        with open(settings.KNOWLEDGE_BASE_PATH, encoding="utf-8") as f:
+            test_queries = json.load(f).get("knowledge_base", {}).get("test_queries", [])
+        questions.extend(item["query"] for item in test_queries)
+    if args.history is not None:
+        history = history_questions(args.history or settings.HISTORY_PATH, args.top, args.min_count)
+        logger.info(f"Took {len(history)} questions from the history")
+        questions.extend(question for question, _ in history)
+    # Keep the first phrasing of each question
+    questions = list({normalize_question(question): question for question in reversed(questions)}.values())[::-1]
+
+    processor = KnowledgeBaseProcessor()
+    vector_store = processor.load_from_file(settings.KNOWLEDGE_BASE_PATH)
+    rag = SmartCityRAG(
+        vector_store,
+        index_version=processor.index_version,
+        lexical_index=processor.lexical_index,
+        field_index=processor.field_index,
+        partitions=processor.partitions
+    )
+    store = rag.answer_store
+    if questions and not args.prune:
+        # Stored questions left out of this run are kept, and refreshed too if stale
+        listed = {normalize_question(question) for question in questions}
+        questions += [question for question in store.questions() if normalize_question(question) not in listed]
+    report = store.refresh(rag.precompute_answer, rag.index_version, questions or None, force=args.force)
+    if args.prune and questions:
+        listed = {normalize_question(question) for question in questions}
+        with FileLock(f"{store.path}.lock"):
+            store.load()
+            report["pruned"] = store.remove([question for question in store.questions()
+                                             if normalize_question(question) not in listed])
+            if report["pruned"]:
+                store.save()
+    print(json.dumps({**report, **store.stats(rag.index_version)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
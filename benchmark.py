@@ -0,0 +1,401 @@
+"""Offline benchmark for the Smart City Assistant.
+
+Runs the real retrieval and API code against a deterministic hashing embedder and
+a stub LLM, so it needs neither Ollama nor the sentence-transformers model:
+
+    python benchmark.py --concurrency 8 --iterations 5 --output results.json
+    python benchmark.py --compare results.json
+
+Reports per-stage latency percentiles, end-to-end endpoint latency under
+concurrency, and retrieval recall@k against the test_queries in knowledge.json.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import re
+import shutil
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import httpx
+import numpy as np
+from langchain.callbacks.manager import CallbackManagerForLLMRun
+from langchain.llms.base import LLM
+from langchain.schema.embeddings import Embeddings
+from langchain.schema.output import GenerationChunk
+
+from config import settings
+from context_assembly import estimate_tokens
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic bag-of-words embedder: hashed unigrams and bigrams, L2-normalized"""
+
+    def __init__(self, dimensions: int = 384):
+        self.dimensions = dimensions
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        words = _WORD_PATTERN.findall(text.lower())
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class StubLLM(LLM):
+    """LLM stand-in with a fixed latency, streaming a canned answer in equal slices"""
+
+    latency_ms: float = 50.0
+    tokens: int = 40
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _answer(self, prompt: str) -> str:
+        return "Final Answer: " + " ".join(["stub"] * self.tokens)
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None,
+              run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> str:
+        time.sleep(self.latency_ms / 1000.0)
+        return self._answer(prompt)
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[GenerationChunk]:
+        words = self._answer(prompt).split(" ")
+        for word in words:
+            time.sleep(self.latency_ms / 1000.0 / len(words))
+            yield GenerationChunk(text=word + " ")
+
+
+def summarize(samples_ms: List[float]) -> Dict[str, float]:
+    """Latency percentiles (nearest-rank) over a list of millisecond samples"""
+    if not samples_ms:
+        return {"count": 0}
+    ordered = sorted(samples_ms)
+
+    def percentile(p: float) -> float:
+        return round(ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)], 3)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered), 3),
+        "p50_ms": percentile(50),
+        "p90_ms": percentile(90),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+def _timed(fn: Callable, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def _normalize(text: str) -> set:
+    return set(_WORD_PATTERN.findall(text.lower()))
+
+
+def fact_found(fact: str, text_terms: set) -> bool:
+    """An expected fact counts as retrieved when all of its words occur in the retrieved text"""
+    terms = _normalize(fact)
+    return bool(terms) and terms <= text_terms
+
+
+class Benchmark:
+    """Builds an isolated index with the offline embedder and measures each pipeline stage"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.index_dir = tempfile.mkdtemp(prefix="smart-city-bench-")
+        with open(args.knowledge_file, "r") as f:
+            self.test_queries = json.load(f).get("knowledge_base", {}).get("test_queries", [])
+        if not self.test_queries:
+            raise SystemExit(f"No test_queries found in {args.knowledge_file}")
+
+        if not args.with_cache:
+            # Every request should pay for the full pipeline unless cache behaviour is what is measured
+            settings.RESPONSE_CACHE_MAX_ENTRIES = 0
+            settings.RESPONSE_CACHE_PATH = ""
+            settings.EMBED_CACHE_SIZE = 0
+            settings.RETRIEVAL_CACHE_SIZE = 0
+            settings.SHARED_CACHE_PATH = ""
+        settings.INDEX_PATH = self.index_dir
+        settings.WARMUP_ON_STARTUP = False
+        # Answers precomputed with the real model would short-circuit the measured pipeline
+        settings.PRECOMPUTED_ANSWERS_PATH = ""
+
+    def setup(self) -> Dict[str, float]:
+        # Imported late so the settings overrides above are in effect
+        import main
+        from crew_agents import SmartCityAgents
+        from knowledge_processor import KnowledgeBaseProcessor
+        from rag_system import SmartCityRAG
+
+        start = time.perf_counter()
+        self.processor = KnowledgeBaseProcessor(embedding_model=HashingEmbeddings())
+        vector_store = self.processor.load_from_file(self.args.knowledge_file)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        llm = StubLLM(latency_ms=self.args.llm_latency_ms, tokens=self.args.llm_tokens)
+        self.rag = SmartCityRAG(
+            vector_store,
+            index_version=self.processor.index_version,
+            lexical_index=self.processor.lexical_index,
+            field_index=self.processor.field_index,
+            partitions=self.processor.partitions,
+            llm=llm
+        )
+        main.knowledge_processor = self.processor
+        main.rag_system = self.rag
+        main.crew_agents = SmartCityAgents(self.rag) if not self.args.skip_crew else None
+        self.app = main.app
+        report = self.processor.index_report or {}
+        return {
+            "index_build_ms": round(build_ms, 3),
+            "chunks": vector_store.index.ntotal,
+            "index_type": report.get("type"),
+            "index_recall_at_k": report.get("recall_at_k"),
+        }
+
+    def run_stages(self) -> Dict[str, Any]:
+        """Time each stage in isolation, sequentially, over every test query"""
+        embeddings = self.processor.embeddings
+        searcher = self.rag.searcher
+        index = searcher.vector_store.index
+        k = settings.RETRIEVAL_K
+        samples = {name: [] for name in ("embedding", "faiss_search", "retrieval", "prompt_build", "generation")}
+        for _ in range(self.args.iterations):
+            for item in self.test_queries:
+                question = item["query"]
+                samples["embedding"].append(_timed(embeddings.embed_query, question))
+                # The raw index call, which no result cache sits in front of
+                vector = np.ascontiguousarray(searcher.embed(question), dtype=np.float32).reshape(1, -1)
+                samples["faiss_search"].append(_timed(index.search, vector, k))
+                samples["retrieval"].append(_timed(self.rag.retrieve, question, k))
+
+                documents = self.rag.retrieve(question, k)
+                start = time.perf_counter()
+                prompt = self.rag.prompt.format(
+                    context="\n\n".join(doc.page_content for doc in documents),
+                    question=question
+                )
+                samples["prompt_build"].append((time.perf_counter() - start) * 1000)
+                samples["generation"].append(_timed(self.rag.llm, prompt))
+        return {name: summarize(values) for name, values in samples.items()}
+
+    async def _load(self, client: httpx.AsyncClient, path: str, payloads: List[Dict]) -> Dict[str, Any]:
+        """Send every payload with at most ``concurrency`` requests in flight"""
+        samples, errors, answer_paths = [], 0, {}
+        queue: "asyncio.Queue[Dict]" = asyncio.Queue()
+        for payload in payloads:
+            queue.put_nowait(payload)
+
+        async def worker():
+            nonlocal errors
+            while not queue.empty():
+                payload = queue.get_nowait()
+                start = time.perf_counter()
+                response = await client.post(path, json=payload)
+                samples.append((time.perf_counter() - start) * 1000)
+                if response.status_code != 200:
+                    errors += 1
+                    continue
+                answer_path = response.json().get("answer_path")
+                if answer_path:
+                    answer_paths[answer_path] = answer_paths.get(answer_path, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(self.args.concurrency)))
+        elapsed = time.perf_counter() - start
+        result = summarize(samples)
+        result.update({
+            "errors": errors,
+            "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        })
+        if answer_paths:
+            result["answer_paths"] = answer_paths
+        return result
+
+    async def run_endpoints(self) -> Dict[str, Any]:
+        questions = [item["query"] for item in self.test_queries] * self.args.iterations
+        transport = httpx.ASGITransport(app=self.app)
+        results = {}
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            results["/search"] = await self._load(
+                client, "/search", [{"query": q, "top_k": settings.RETRIEVAL_K} for q in questions]
+            )
+            results["/query"] = await self._load(
+                client, "/query", [{"question": q, "user_id": "benchmark"} for q in questions]
+            )
+            if not self.args.skip_crew:
+                results["/query-crew"] = await self._load(
+                    client, "/query-crew", [{"question": q, "user_id": "benchmark"} for q in questions]
+                )
+        return results
+
+    def run_retrieval_quality(self) -> Dict[str, Any]:
+        """Recall@k of expected facts (and expected source titles, when listed) in the retrieved chunks"""
+        ks = sorted(set(self.args.k))
+        per_query = []
+        totals = {k: {"facts": 0, "found": 0, "hits": 0, "sources": 0, "sources_found": 0} for k in ks}
+        for item in self.test_queries:
+            documents = self.rag.retrieve(item["query"], max(ks))
+            expected_facts = item.get("expected_info", [])
+            expected_sources = item.get("expected_sources", [])
+            row = {"query": item["query"], "retrieved": [doc.metadata.get("title", "") for doc in documents]}
+            for k in ks:
+                top = documents[:k]
+                text_terms = set().union(*(_normalize(doc.page_content) for doc in top)) if top else set()
+                found = [fact for fact in expected_facts if fact_found(fact, text_terms)]
+                titles = {doc.metadata.get("title", "") for doc in top}
+                totals[k]["facts"] += len(expected_facts)
+                totals[k]["found"] += len(found)
+                totals[k]["hits"] += bool(found)
+                totals[k]["sources"] += len(expected_sources)
+                totals[k]["sources_found"] += sum(1 for source in expected_sources if source in titles)
+                row[f"recall@{k}"] = round(len(found) / len(expected_facts), 3) if expected_facts else None
+                if k == max(ks):
+                    row["missing"] = [fact for fact in expected_facts if fact not in found]
+            per_query.append(row)
+
+        summary = {}
+        for k, total in totals.items():
+            summary[f"@{k}"] = {
+                "fact_recall": round(total["found"] / total["facts"], 4) if total["facts"] else None,
+                "hit_rate": round(total["hits"] / len(self.test_queries), 4),
+                "source_recall": round(total["sources_found"] / total["sources"], 4) if total["sources"] else None,
+            }
+        return {"summary": summary, "context": self._context_quality(), "per_query": per_query}
+
+    def _context_quality(self) -> Dict[str, Any]:
+        """Fact recall and size of the context the LLM actually receives"""
+        retriever = self.rag.qa_chain.retriever
+        facts, found, tokens = 0, 0, []
+        for item in self.test_queries:
+            documents = retriever.get_relevant_documents(item["query"])
+            text_terms = set().union(*(_normalize(doc.page_content) for doc in documents)) if documents else set()
+            expected_facts = item.get("expected_info", [])
+            facts += len(expected_facts)
+            found += sum(1 for fact in expected_facts if fact_found(fact, text_terms))
+            tokens.append(sum(estimate_tokens(doc.page_content) for doc in documents))
+        return {
+            "fact_recall": round(found / facts, 4) if facts else None,
+            "avg_tokens": round(sum(tokens) / len(tokens), 1),
+            "max_tokens": max(tokens),
+        }
+
+    def run(self) -> Dict[str, Any]:
+        try:
+            setup = self.setup()
+            return {
+                "created_at": datetime.now().isoformat(),
+                "config": {
+                    "concurrency": self.args.concurrency,
+                    "iterations": self.args.iterations,
+                    "queries": len(self.test_queries),
+                    "llm_latency_ms": self.args.llm_latency_ms,
+                    "caches_enabled": self.args.with_cache,
+                    "chunk_size": settings.CHUNK_SIZE,
+                    "chunk_overlap": settings.CHUNK_OVERLAP,
+                    "retrieval_k": settings.RETRIEVAL_K,
+                    "hybrid_retrieval": settings.HYBRID_RETRIEVAL,
+                    "field_fast_path": settings.FIELD_FAST_PATH,
+                    "context_assembly": settings.CONTEXT_ASSEMBLY,
+                    "context_token_budget": settings.CONTEXT_TOKEN_BUDGET,
+                },
+                "setup": setup,
+                "stages": self.run_stages(),
+                "endpoints": asyncio.run(self.run_endpoints()),
+                "retrieval": self.run_retrieval_quality(),
+            }
+        finally:
+            shutil.rmtree(self.index_dir, ignore_errors=True)
+
+
+def print_report(results: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    def delta(section: str, name: str, metric: str) -> str:
+        if not baseline:
+            return ""
+        old = baseline.get(section, {}).get(name, {}).get(metric)
+        new = results[section][name].get(metric)
+        if old is None or new is None:
+            return ""
+        return f" ({new - old:+.2f})"
+
+    setup = results["setup"]
+    print(f"Index: {setup['chunks']} chunks, {setup.get('index_type')} (recall {setup.get('index_recall_at_k')} "
+          f"vs exact), built in {setup['index_build_ms']:.0f} ms")
+    # Header and rows share one width per column; p50/p95 cells carry the delta when comparing
+    name_width = 2 + max((len(name) for section in ("stages", "endpoints") for name in results[section]), default=12)
+    width = 18 if baseline else 10
+    for section in ("stages", "endpoints"):
+        print(f"\n{section.title():<{name_width}}{'p50 ms':>{width}}{'p95 ms':>{width}}{'p99 ms':>10}{'count':>8}")
+        for name, stats in results[section].items():
+            if not stats.get("count"):
+                continue
+            p50 = f"{stats['p50_ms']:.2f}{delta(section, name, 'p50_ms')}"
+            p95 = f"{stats['p95_ms']:.2f}{delta(section, name, 'p95_ms')}"
+            print(f"{name:<{name_width}}{p50:>{width}}{p95:>{width}}{stats['p99_ms']:>10.2f}{stats['count']:>8}")
+
+    print("\nRetrieval quality")
+    for k, stats in results["retrieval"]["summary"].items():
+        line = f"  recall{k}: facts={stats['fact_recall']} hit_rate={stats['hit_rate']}"
+        if baseline and k in baseline.get("retrieval", {}).get("summary", {}):
+            old = baseline["retrieval"]["summary"][k]
+            if old.get("fact_recall") is not None and stats["fact_recall"] is not None:
+                line += f" ({stats['fact_recall'] - old['fact_recall']:+.4f})"
+        print(line)
+    context = results["retrieval"]["context"]
+    line = f"  prompt context: facts={context['fact_recall']} avg_tokens={context['avg_tokens']}"
+    old = baseline.get("retrieval", {}).get("context") if baseline else None
+    if old:
+        line += f" ({context['avg_tokens'] - old['avg_tokens']:+.1f} tokens)"
+    print(line)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline latency and retrieval-quality benchmark")
+    parser.add_argument("--knowledge-file", default="knowledge.json")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight per endpoint")
+    parser.add_argument("--iterations", type=int, default=3, help="Passes over the test queries")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5], help="Cut-offs for recall@k")
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0, help="Stub LLM generation time")
+    parser.add_argument("--llm-tokens", type=int, default=40, help="Stub LLM answer length")
+    parser.add_argument("--with-cache", action="store_true", help="Keep response/embedding/retrieval caches on")
+    parser.add_argument("--skip-crew", action="store_true", help="Do not benchmark /query-crew")
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    parser.add_argument("--compare", help="Earlier JSON results to show deltas against")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+
+    results = Benchmark(args).run()
+    print_report(results, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
@@ -0,0 +1,127 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+import numpy as np
+from langchain.schema.embeddings import Embeddings
+
+from response_cache import normalize_question
+from shared_cache import SharedCache
+
+
+class LRUCache:
+    """Thread-safe bounded mapping with least-recently-used eviction and hit counters"""
+
+    def __init__(self, name: str, max_entries: int):
+        self.name = name
+        self.max_entries = max_entries
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that embeds and memoizes queries by their normalized text.
+
+    A query is embedded in the normalized form it is cached under, so case and
+    punctuation variants share one vector. Vectors are stored as float32 arrays
+    (about 1.5 KB each for MiniLM) rather than Python float lists. Document
+    embedding is not cached since it only runs at index build time. A ``shared``
+    store is consulted on local misses, so a query embedded by one worker process
+    is not embedded again by the others.
+    """
+
+    def __init__(self, embeddings: Embeddings, max_entries: int = 4096, shared: Optional[SharedCache] = None):
+        self.embeddings = embeddings
+        self.cache = LRUCache("query_embeddings", max_entries)
+        self.shared = shared
+
+    def _cached(self, key: str) -> Optional[np.ndarray]:
+        vector = self.cache.get(key)
+        if vector is None and self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                # frombuffer over bytes gives a read-only array
+                vector = np.frombuffer(value, dtype=np.float32)
+                self.cache.put(key, vector)
+        return vector
+
+    def _store(self, key: str, values: List[float]) -> np.ndarray:
+        vector = np.asarray(values, dtype=np.float32)
+        vector.setflags(write=False)
+        self.cache.put(key, vector)
+        if self.shared is not None:
+            self.shared.put(key, vector.tobytes())
+        return vector
+
+    def embed_query_vector(self, text: str) -> np.ndarray:
+        """Return the query embedding as a read-only float32 array"""
+        key = normalize_question(text)
+        vector = self._cached(key)
+        if vector is None:
+            vector = self._store(key, self.embeddings.embed_query(key))
+        return vector
+
+    def embed_query_vectors(self, texts: List[str]) -> np.ndarray:
+        """Embed several queries as one (n, dim) matrix, encoding all cache misses in a single call"""
+        keys = [normalize_question(text) for text in texts]
+        vectors = [self._cached(key) for key in keys]
+        missing = list(dict.fromkeys(key for key, vector in zip(keys, vectors) if vector is None))
+        if missing:
+            encoded = self.embeddings.embed_documents(missing)
+            computed = {key: self._store(key, values) for key, values in zip(missing, encoded)}
+            vectors = [vector if vector is not None else computed[key] for key, vector in zip(keys, vectors)]
+        return np.vstack(vectors)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_query_vector(text).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.cache.stats()
+        if self.shared is not None:
+            stats["shared"] = self.shared.stats()
+        return stats
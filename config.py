@@ -6,9 +6,138 @@ load_dotenv()
 class Settings:
     OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
     OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "mistral:7b")
+    OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+    OLLAMA_PRELOAD = os.getenv("OLLAMA_PRELOAD", "true").lower() == "true"
+    # Generations sent to Ollama at once per process; more callers wait in a first-come queue
+    OLLAMA_MAX_CONCURRENCY = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "2"))
+    OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+    # Upper bound per request; the request's own deadline shortens it
+    OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "120"))
+    # Retries for connection errors and 429/5xx responses, with jittered exponential backoff
+    OLLAMA_MAX_RETRIES = int(os.getenv("OLLAMA_MAX_RETRIES", "2"))
+    OLLAMA_RETRY_BACKOFF = float(os.getenv("OLLAMA_RETRY_BACKOFF", "0.5"))
+    WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
     API_PORT = int(os.getenv("API_PORT", "8000"))
+    # uvicorn worker processes; with more than one, history and caches default to shared SQLite files
+    API_WORKERS = int(os.getenv("API_WORKERS", "1"))
     STREAMLIT_PORT = int(os.getenv("STREAMLIT_PORT", "8501"))
+    # Streamlit client: pooled connections to the API, per-request timeouts, and how long
+    # /search results and example answers are shared between browser sessions
+    STREAMLIT_POOL_SIZE = int(os.getenv("STREAMLIT_POOL_SIZE", "32"))
+    STREAMLIT_CONNECT_TIMEOUT = float(os.getenv("STREAMLIT_CONNECT_TIMEOUT", "5"))
+    STREAMLIT_READ_TIMEOUT = float(os.getenv("STREAMLIT_READ_TIMEOUT", "130"))
+    STREAMLIT_CACHE_TTL = int(os.getenv("STREAMLIT_CACHE_TTL", "300"))
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
     KNOWLEDGE_BASE_PATH = os.getenv("KNOWLEDGE_BASE_PATH", "knowledge.json")
+    INDEX_PATH = os.getenv("INDEX_PATH", "faiss_index")
+    EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+    CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
+    CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+    # Ingestion: chunks per embedding batch, and worker processes embedding them (0 or 1: in-process)
+    INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "256"))
+    EMBED_PROCESSES = int(os.getenv("EMBED_PROCESSES", "0"))
+
+    # Vector index: "flat" (exact), "hnsw", "ivfflat" or "ivfpq" (approximate); IVF_NLIST=0 sizes it from the corpus.
+    # Defaults to ivfflat with several workers, whose memory-mapped lists are shared instead of copied per worker
+    FAISS_INDEX_TYPE = (os.getenv("FAISS_INDEX_TYPE") or ("ivfflat" if API_WORKERS > 1 else "flat")).lower()
+    HNSW_M = int(os.getenv("HNSW_M", "32"))
+    HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+    HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+    IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))
+    IVF_NPROBE = int(os.getenv("IVF_NPROBE", "16"))
+    PQ_M = int(os.getenv("PQ_M", "48"))
+    PQ_NBITS = int(os.getenv("PQ_NBITS", "8"))
+    INDEX_TRAIN_SAMPLE = int(os.getenv("INDEX_TRAIN_SAMPLE", "100000"))
+    # Memory-map the saved index read-only so processes share its pages. FAISS only maps IVF indexes
+    # (ivfflat, ivfpq); flat and HNSW are read into each process's memory regardless
+    INDEX_MMAP = os.getenv("INDEX_MMAP", "true").lower() == "true"
+    # Sampled queries for the build-time recall check against exact search (0 skips it)
+    INDEX_RECALL_QUERIES = int(os.getenv("INDEX_RECALL_QUERIES", "500"))
+
+    # Micro-batching of query embeddings across concurrent requests (1 disables)
+    EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", "32"))
+    EMBED_BATCH_MAX_WAIT_MS = float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", "5"))
+
+    # LRU caches for query embeddings and top-k retrieval results (entries, 0 disables)
+    EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "4096"))
+    RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "4096"))
+
+    # Retrieval: chunks passed to the LLM, and hybrid BM25 + dense fusion
+    RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "4"))
+    HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "true").lower() == "true"
+    HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+    RRF_K = int(os.getenv("RRF_K", "60"))
+    # RRF weight of the chunks containing every identifier in the query ("BP-101", "Room 205")
+    HYBRID_IDENTIFIER_WEIGHT = float(os.getenv("HYBRID_IDENTIFIER_WEIGHT", "2.0"))
+    # Category filters: per-category sub-indexes (otherwise an ID pre-filter on the main index),
+    # and routing unfiltered queries to the categories whose centroids are clearly closest.
+    # Sub-indexes default to approximate index types only: for flat the pre-filter is exact and needs no copy.
+    # The margin is a cosine-similarity gap and depends on the embedding model; check recall before enabling
+    CATEGORY_PARTITIONS = (os.getenv("CATEGORY_PARTITIONS")
+                           or ("false" if FAISS_INDEX_TYPE == "flat" else "true")).lower() == "true"
+    CATEGORY_ROUTING = os.getenv("CATEGORY_ROUTING", "false").lower() == "true"
+    CATEGORY_ROUTING_MARGIN = float(os.getenv("CATEGORY_ROUTING_MARGIN", "0.1"))
+    CATEGORY_ROUTING_MAX = int(os.getenv("CATEGORY_ROUTING_MAX", "2"))
+
+    # Structured-field fast path: contact/hours/location lookups answered without the LLM
+    FIELD_FAST_PATH = os.getenv("FIELD_FAST_PATH", "true").lower() == "true"
+    # Share of the question's entity words the item must match; below 1.0 "pool hours at the recreation
+    # center" can be answered with the recreation center's own hours
+    FIELD_MATCH_MIN_SCORE = float(os.getenv("FIELD_MATCH_MIN_SCORE", "1.0"))
+
+    # Conversation history: "memory" (per-process ring buffers) or "sqlite" (shared file, WAL)
+    HISTORY_BACKEND = (os.getenv("HISTORY_BACKEND") or ("sqlite" if API_WORKERS > 1 else "memory")).lower()
+    HISTORY_PATH = os.getenv("HISTORY_PATH", "history.db")
+    HISTORY_MAX_PER_USER = int(os.getenv("HISTORY_MAX_PER_USER", "100"))
+    HISTORY_MAX_USERS = int(os.getenv("HISTORY_MAX_USERS", "10000"))
+    HISTORY_TTL = int(os.getenv("HISTORY_TTL", "604800"))  # Seconds; 0 keeps entries until capped
+    HISTORY_WRITE_QUEUE = int(os.getenv("HISTORY_WRITE_QUEUE", "1000"))
+    HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "20"))
+
+    # Context assembly: merge overlapping chunks, pick diverse ones (MMR), fit a token budget
+    CONTEXT_ASSEMBLY = os.getenv("CONTEXT_ASSEMBLY", "true").lower() == "true"
+    CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "8"))
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1000"))
+    MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+
+    # Batch queries: largest accepted batch and how many of its generations run at once
+    BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "32"))
+    BATCH_GENERATION_CONCURRENCY = int(os.getenv("BATCH_GENERATION_CONCURRENCY", "2"))
+
+    # CrewAI city_search tool: "retrieval" returns raw chunks, "answer" runs a nested RAG generation
+    CREW_TOOL_MODE = os.getenv("CREW_TOOL_MODE", "retrieval")
+    CREW_TOOL_K = int(os.getenv("CREW_TOOL_K", "4"))
+    CREW_POOL_SIZE = int(os.getenv("CREW_POOL_SIZE", "2"))
+    CREW_AGENT_TIMEOUT = float(os.getenv("CREW_AGENT_TIMEOUT", "45"))
+    CREW_TOTAL_TIMEOUT = float(os.getenv("CREW_TOTAL_TIMEOUT", "90"))
+    CREW_VERBOSE = os.getenv("CREW_VERBOSE", "false").lower() == "true"
+
+    # Hot reload of the knowledge base (0 disables the file watcher)
+    KB_WATCH_INTERVAL = float(os.getenv("KB_WATCH_INTERVAL", "0"))
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+    # Execution pools for blocking retrieval and generation work
+    RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", "4"))
+    GENERATION_WORKERS = int(os.getenv("GENERATION_WORKERS", "2"))
+    MAX_QUEUE_DEPTH = int(os.getenv("MAX_QUEUE_DEPTH", "32"))
+    REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "120"))
+    SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", "10"))
+    RETRY_AFTER_SECONDS = int(os.getenv("RETRY_AFTER_SECONDS", "5"))
+
+    # Semantic response cache
+    RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.92"))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+    RESPONSE_CACHE_MAX_MB = float(os.getenv("RESPONSE_CACHE_MAX_MB", "32"))
+    RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+    RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "")
+
+    # Precomputed answers for frequent questions (built with answer_store.py; empty disables), and
+    # regenerating stale ones in the background at startup and after a knowledge base reload
+    PRECOMPUTED_ANSWERS_PATH = os.getenv("PRECOMPUTED_ANSWERS_PATH", "precomputed_answers.npz")
+    PRECOMPUTED_REFRESH = os.getenv("PRECOMPUTED_REFRESH", "true").lower() == "true"
+
+    # Response and query-embedding caches shared by all worker processes (SQLite, WAL; empty disables)
+    SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH") or ("shared_cache.db" if API_WORKERS > 1 else "")
+    SHARED_EMBED_CACHE_SIZE = int(os.getenv("SHARED_EMBED_CACHE_SIZE", "100000"))
 
 settings = Settings()
@@ -0,0 +1,147 @@
+import logging
+import math
+import threading
+from typing import Any, Dict, List, Set, Tuple
+
+from langchain.schema import Document
+
+from lexical_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Neighbouring chunks share at most CHUNK_OVERLAP characters; shorter matches are treated as coincidence
+_MIN_OVERLAP = 20
+_MAX_OVERLAP = 400
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for prompt budgeting: about four characters per token"""
+    return max(1, len(text) // 4) if text else 0
+
+
+def _merge_pair(first: str, second: str) -> str:
+    """Join two chunks if one contains the other or the end of one repeats the start of the other"""
+    if second in first:
+        return first
+    if first in second:
+        return second
+    for a, b in ((first, second), (second, first)):
+        for length in range(min(len(a), len(b), _MAX_OVERLAP), _MIN_OVERLAP - 1, -1):
+            if a.endswith(b[:length]):
+                return a + b[length:]
+    return ""
+
+
+def _similarity(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / math.sqrt(len(a) * len(b))
+
+
+class ContextAssembler:
+    """Turns ranked chunks into a compact prompt context.
+
+    Overlapping chunks of the same item are merged, blocks are picked by maximal
+    marginal relevance (rank-based relevance, token-overlap similarity) and added
+    until the token budget is used up.
+    """
+
+    def __init__(self, token_budget: int = 1000, max_blocks: int = 4, mmr_lambda: float = 0.7,
+                 baseline_chunks: int = 4):
+        self.token_budget = token_budget
+        self.max_blocks = max_blocks
+        self.mmr_lambda = mmr_lambda
+        # Tokens saved are measured against stuffing this many top chunks unchanged
+        self.baseline_chunks = baseline_chunks
+        self._lock = threading.Lock()
+        self._totals = {"assemblies": 0, "candidate_chunks": 0, "merged_chunks": 0,
+                        "baseline_tokens": 0, "context_tokens": 0}
+
+    def assemble(self, documents: List[Document]) -> Tuple[List[Document], Dict[str, int]]:
+        """Return the documents to stuff into the prompt and a report of what was saved"""
+        blocks = self._merge(documents)
+        selected = self._select(blocks)
+
+        baseline_tokens = sum(estimate_tokens(doc.page_content) for doc in documents[:self.baseline_chunks])
+        context_tokens = sum(estimate_tokens(doc.page_content) for doc in selected)
+        report = {
+            "candidate_chunks": len(documents),
+            "blocks": len(selected),
+            "baseline_tokens": baseline_tokens,
+            "context_tokens": context_tokens,
+            "tokens_saved": baseline_tokens - context_tokens,
+        }
+        with self._lock:
+            self._totals["assemblies"] += 1
+            self._totals["candidate_chunks"] += len(documents)
+            self._totals["merged_chunks"] += len(documents) - len(blocks)
+            self._totals["baseline_tokens"] += baseline_tokens
+            self._totals["context_tokens"] += context_tokens
+        return selected, report
+
+    def _merge(self, documents: List[Document]) -> List[Tuple[int, Document]]:
+        """Merge chunks of the same item; each block keeps the best rank among its chunks"""
+        groups: Dict[str, List[Tuple[int, str, Dict[str, Any], int]]] = {}
+        for rank, doc in enumerate(documents):
+            item_id = doc.metadata.get("id", f"#{rank}")
+            blocks = groups.setdefault(item_id, [])
+            text, metadata, count = doc.page_content, doc.metadata, doc.metadata.get("merged_chunks", 1)
+            # Keep merging until the new text overlaps none of the item's existing blocks
+            merged = True
+            while merged:
+                merged = False
+                for i, (block_rank, block_text, _, block_count) in enumerate(blocks):
+                    joined = _merge_pair(block_text, text)
+                    if joined:
+                        rank = min(rank, block_rank)
+                        text, count = joined, count + block_count
+                        del blocks[i]
+                        merged = True
+                        break
+            blocks.append((rank, text, metadata, count))
+
+        merged_blocks = []
+        for blocks in groups.values():
+            for rank, text, metadata, count in blocks:
+                merged_blocks.append((rank, Document(page_content=text, metadata={**metadata, "merged_chunks": count})))
+        merged_blocks.sort(key=lambda block: block[0])
+        return merged_blocks
+
+    def _select(self, blocks: List[Tuple[int, Document]]) -> List[Document]:
+        """Maximal marginal relevance selection within the token budget, most relevant first"""
+        if not blocks:
+            return []
+        worst_rank = max(rank for rank, _ in blocks) + 1
+        candidates = [
+            (1.0 - rank / worst_rank, set(tokenize(doc.page_content)), doc)
+            for rank, doc in blocks
+        ]
+        selected: List[Tuple[Set[str], Document]] = []
+        used_tokens = 0
+        while candidates and len(selected) < self.max_blocks:
+            best_index, best_score = 0, -math.inf
+            for i, (relevance, terms, _) in enumerate(candidates):
+                redundancy = max((_similarity(terms, chosen) for chosen, _ in selected), default=0.0)
+                score = self.mmr_lambda * relevance - (1 - self.mmr_lambda) * redundancy
+                if score > best_score:
+                    best_index, best_score = i, score
+            _, terms, doc = candidates.pop(best_index)
+
+            tokens = estimate_tokens(doc.page_content)
+            if used_tokens + tokens <= self.token_budget:
+                selected.append((terms, doc))
+                used_tokens += tokens
+            elif not selected:
+                # Never return an empty context: cut the best block down to the budget
+                text = doc.page_content[:self.token_budget * 4]
+                selected.append((terms, Document(page_content=text, metadata=doc.metadata)))
+                used_tokens = self.token_budget
+        return [doc for _, doc in selected]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            totals = dict(self._totals)
+        totals["tokens_saved"] = totals["baseline_tokens"] - totals["context_tokens"]
+        assemblies = totals["assemblies"]
+        totals["avg_context_tokens"] = round(totals["context_tokens"] / assemblies, 1) if assemblies else 0.0
+        return totals
@@ -1,17 +1,94 @@
+import contextvars
 import logging
-from crewai import Agent, Task, Crew
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from typing import Any, Dict, List, Optional, Tuple
+from crewai import Agent, Task
 from langchain.tools import Tool
+from response_cache import normalize_question
+from metrics import CREW_RUNS, ERRORS, record_stage
+from config import settings
 
 logger = logging.getLogger(__name__)
 
+# The request being served by the current agent thread; agents are shared, so tools look it up here
+_current_context: contextvars.ContextVar = contextvars.ContextVar("crew_query_context", default=None)
+
+class CrewDeadlineExceeded(Exception):
+    """Raised when an agent or the whole crew runs past its deadline"""
+
+class QueryContext:
+    """Retrieval and answer state computed once per request and shared by the endpoint, agents and fallback"""
+    
+    def __init__(self, question: str, rag_result: Dict[str, Any], categories: Optional[List[str]] = None):
+        self.question = question
+        self.rag_result = rag_result
+        # Source categories the request was restricted to; tool searches stay within them
+        self.categories = categories
+        self.retrievals: Dict[str, str] = {}
+        self.tool_calls = 0
+        # The research agents run in parallel and call tools on the same context
+        self._lock = threading.Lock()
+        
+        # The request's own question was already retrieved for the RAG answer
+        if rag_result.get("source_documents"):
+            self.retrievals[normalize_question(question)] = format_chunks(rag_result["source_documents"])
+    
+    def count_tool_call(self):
+        with self._lock:
+            self.tool_calls += 1
+
+def format_chunks(docs) -> str:
+    """Render retrieved chunks as tool output for an agent"""
+    return "\n\n".join(
+        f"[{doc.metadata.get('title') or 'Untitled'}]\n{doc.page_content}" for doc in docs
+    )
+
 class SmartCityAgents:
     def __init__(self, rag_system):
         self.rag_system = rag_system
-        self.search_tool = Tool(
+        self.search_tool = self.create_search_tool()
+        # Agent sets are built once and reused; each request borrows one set at a time
+        self._agent_pool: "queue.Queue[Tuple[Agent, Agent, Agent]]" = queue.Queue()
+        self._agents_created = 0
+        self._pool_lock = threading.Lock()
+        # Two workers per agent set: the search and policy tasks run side by side
+        self._executor = ThreadPoolExecutor(
+            max_workers=2 * settings.CREW_POOL_SIZE, thread_name_prefix="crew"
+        )
+    
+    def create_search_tool(self) -> Tool:
+        """Create the city_search tool; it serves whichever request the calling thread is working on"""
+        if settings.CREW_TOOL_MODE == "answer":
+            description = "Ask the city knowledge base a question and get a written answer"
+        else:
+            description = "Search the city knowledge base and get the most relevant passages"
+        return Tool(
             name="city_search",
-            description="Search the city knowledge base for information",
-            func=lambda query: self.rag_system.query(query)["answer"]
+            description=description,
+            func=lambda query: self.search_knowledge_base(query, _current_context.get())
         )
+    
+    def search_knowledge_base(self, query: str, context: Optional[QueryContext] = None) -> str:
+        """Tool body: raw chunks in retrieval mode, a full RAG answer in answer mode"""
+        key = normalize_question(query)
+        if context is not None:
+            context.count_tool_call()
+            if settings.CREW_TOOL_MODE == "answer" and key == normalize_question(context.question):
+                return context.rag_result["answer"]
+            if settings.CREW_TOOL_MODE != "answer" and key in context.retrievals:
+                return context.retrievals[key]
+        
+        categories = context.categories if context is not None else None
+        if settings.CREW_TOOL_MODE == "answer":
+            return self.rag_system.query(query, categories)["answer"]
+        
+        result = format_chunks(self.rag_system.retrieve(query, k=settings.CREW_TOOL_K, categories=categories))
+        if context is not None:
+            context.retrievals[key] = result
+        return result
         
     def create_agents(self):
         """Create specialized agents for different city services"""
@@ -21,7 +98,8 @@ class SmartCityAgents:
             goal='Find accurate information from the city database',
             backstory='Expert at searching and retrieving city service information',
             tools=[self.search_tool],
-            verbose=True,
+            llm=self.rag_system.llm,
+            verbose=settings.CREW_VERBOSE,
             allow_delegation=False
         )
         
@@ -30,7 +108,8 @@ class SmartCityAgents:
             goal='Provide guidance on city policies and regulations',
             backstory='Specializes in city ordinances, regulations, and compliance requirements',
             tools=[self.search_tool],
-            verbose=True,
+            llm=self.rag_system.llm,
+            verbose=settings.CREW_VERBOSE,
             allow_delegation=False
         )
         
@@ -39,24 +118,91 @@ class SmartCityAgents:
             goal='Help citizens navigate city services and procedures',
             backstory='Expert at guiding citizens through city processes and connecting them with the right services',
             tools=[self.search_tool],
-            verbose=True,
+            llm=self.rag_system.llm,
+            verbose=settings.CREW_VERBOSE,
             allow_delegation=False
         )
         
         return info_agent, policy_agent, coordinator_agent
     
-    def process_query(self, question: str) -> str:
-        """Process query using multi-agent system"""
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+    
+    def _acquire_agents(self, timeout: float) -> Tuple[Agent, Agent, Agent]:
+        """Borrow an agent set, building a new one while the pool is below its size"""
+        try:
+            return self._agent_pool.get_nowait()
+        except queue.Empty:
+            pass
+        with self._pool_lock:
+            build = self._agents_created < settings.CREW_POOL_SIZE
+            if build:
+                self._agents_created += 1
+        if build:
+            try:
+                return self.create_agents()
+            except Exception:
+                with self._pool_lock:
+                    self._agents_created -= 1
+                raise
+        try:
+            return self._agent_pool.get(timeout=max(0.0, timeout))
+        except queue.Empty:
+            raise CrewDeadlineExceeded("No agent set became free before the deadline")
+    
+    def _release_when_done(self, agents: Tuple[Agent, Agent, Agent], futures):
+        """Return the agent set once every task using it has finished, even after a timeout"""
+        pending = [f for f in futures if not f.done()]
+        if not pending:
+            self._agent_pool.put(agents)
+            return
+        remaining = [len(pending)]
+        lock = threading.Lock()
+        
+        def on_done(_future):
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                self._agent_pool.put(agents)
+        
+        for future in pending:
+            future.add_done_callback(on_done)
+    
+    @staticmethod
+    def _run_task(context: QueryContext, task: Task, task_context: Optional[str] = None) -> str:
+        token = _current_context.set(context)
+        try:
+            return str(task.execute(context=task_context))
+        finally:
+            _current_context.reset(token)
+    
+    def _submit(self, context: QueryContext, task: Task, task_context: Optional[str] = None):
+        """Run a task on the crew pool in a copy of the caller's context, so the request deadline reaches its LLM calls"""
+        return self._executor.submit(contextvars.copy_context().run, self._run_task, context, task, task_context)
+    
+    def process_query(self, question: str, rag_result: Optional[Dict[str, Any]] = None,
+                      categories: Optional[List[str]] = None) -> str:
+        """Process query using multi-agent system, reusing the caller's RAG result when given"""
         # First try to get a direct answer from the RAG system
-        direct_answer = self.rag_system.query(question)
+        direct_answer = rag_result if rag_result is not None else self.rag_system.query(question, categories)
         
         # If we have a high-confidence direct answer, use it
         if direct_answer["confidence"] >= 0.7:
+            CREW_RUNS.inc(outcome="direct")
             return direct_answer["answer"]
             
+        start = time.perf_counter()
+        context = QueryContext(question, direct_answer, categories)
+        deadline = time.monotonic() + settings.CREW_TOTAL_TIMEOUT
+        
+        def time_left() -> float:
+            return min(settings.CREW_AGENT_TIMEOUT, deadline - time.monotonic())
+        
+        agents = None
+        futures = []
         try:
-            # Create agents and tasks
-            info_agent, policy_agent, coordinator_agent = self.create_agents()
+            info_agent, policy_agent, coordinator_agent = agents = self._acquire_agents(time_left())
             
             search_task = Task(
                 description=f"Search for information about: {question}",
@@ -76,18 +222,37 @@ class SmartCityAgents:
                 expected_output="Step-by-step guidance addressing the user's question"
             )
             
-            # Create and run the crew
-            crew = Crew(
-                agents=[info_agent, policy_agent, coordinator_agent],
-                tasks=[search_task, policy_task, coordination_task],
-                verbose=True,
-                process={"name": "sequential"}  # Use sequential processing to avoid delegation issues
+            # Search and policy research are independent, so run them side by side
+            futures = [self._submit(context, search_task), self._submit(context, policy_task)]
+            _, not_done = wait(futures, timeout=max(0.0, time_left()))
+            if not_done:
+                raise CrewDeadlineExceeded("Research agents did not finish before the deadline")
+            findings = [future.result() for future in futures]
+            
+            # The coordinator turns both findings into the final guidance
+            coordination_context = (
+                f"Information Retriever findings:\n{findings[0]}\n\n"
+                f"Policy Expert findings:\n{findings[1]}"
             )
+            coordination = self._submit(context, coordination_task, coordination_context)
+            futures.append(coordination)
+            result = coordination.result(timeout=max(0.0, time_left()))
             
-            result = crew.kickoff()
-            return str(result)
+            logger.info(f"CrewAI answered with {context.tool_calls} tool calls")
+            CREW_RUNS.inc(outcome="completed")
+            return result
             
+        except (CrewDeadlineExceeded, FutureTimeoutError) as e:
+            logger.warning(f"CrewAI deadline exceeded, falling back to RAG answer: {e}")
+            CREW_RUNS.inc(outcome="deadline")
+            return direct_answer["answer"]
         except Exception as e:
             logger.error(f"CrewAI processing error: {e}")
+            CREW_RUNS.inc(outcome="error")
+            ERRORS.inc(component="crew")
             # Return the direct answer from RAG system if CrewAI fails
-            return direct_answer["answer"]
\ No newline at end of file
+            return direct_answer["answer"]
+        finally:
+            record_stage("crew", time.perf_counter() - start)
+            if agents is not None:
+                self._release_when_done(agents, futures)
@@ -0,0 +1,135 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+
+from langchain.schema.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+
+class BatchingEmbeddings(Embeddings):
+    """Embeddings wrapper that micro-batches concurrent ``embed_query`` calls.
+
+    Query requests are collected for up to ``max_wait_ms`` or until ``max_batch_size``
+    are waiting, encoded with a single ``embed_documents`` call, and each caller gets
+    its own vector back. The window is only waited out while there is concurrency to
+    collect: another query on its way in, or a previous batch of more than one. A
+    lone query is encoded at once, together with anything already queued. ``embed_documents`` is already batched and passes straight
+    through. Only suitable for models that embed queries and documents the same way,
+    which holds for the sentence-transformers models used here.
+    """
+
+    def __init__(self, embeddings: Embeddings, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._max_batch_seen = 0
+        self._encode_seconds = 0.0
+        # Queries submitted and not yet answered, and the size of the last batch encoded
+        self._in_flight = 0
+        self._last_batch_size = 0
+        # Batch sizes bucketed by fill ratio: <=25%, <=50%, <=75%, >75% of max_batch_size
+        self._fill_histogram = [0, 0, 0, 0]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        self._ensure_worker()
+        future: Future = Future()
+        with self._stats_lock:
+            self._in_flight += 1
+        self._queue.put((text, future))
+        return future.result()
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    # Queries already queued join without waiting
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except queue.Empty:
+                    pass
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._expect_more(len(batch)):
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._last_batch_size = len(batch)
+            self._encode(batch)
+
+    def _expect_more(self, batch_size: int) -> bool:
+        """Whether waiting is likely to fill the batch further"""
+        with self._stats_lock:
+            return self._in_flight > batch_size or self._last_batch_size > 1
+
+    def _encode(self, batch: List[tuple]):
+        texts = [text for text, _ in batch]
+        start = time.perf_counter()
+        try:
+            vectors = self.embeddings.embed_documents(texts)
+        except Exception as e:
+            with self._stats_lock:
+                self._in_flight -= len(batch)
+            logger.error(f"Batched embedding of {len(texts)} queries failed: {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        elapsed = time.perf_counter() - start
+
+        with self._stats_lock:
+            self._in_flight -= len(batch)
+        for (_, future), vector in zip(batch, vectors):
+            future.set_result(vector)
+
+        with self._stats_lock:
+            self._batches += 1
+            self._items += len(batch)
+            self._max_batch_seen = max(self._max_batch_seen, len(batch))
+            self._encode_seconds += elapsed
+            fill = len(batch) / self.max_batch_size
+            self._fill_histogram[min(3, max(0, int((fill - 1e-9) * 4)))] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return batch counts and fill statistics"""
+        with self._stats_lock:
+            batches = self._batches
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "batches": batches,
+                "queries": self._items,
+                "avg_batch_size": round(self._items / batches, 2) if batches else 0.0,
+                "avg_fill_ratio": round(self._items / (batches * self.max_batch_size), 4) if batches else 0.0,
+                "max_batch_seen": self._max_batch_seen,
+                "avg_encode_ms": round(self._encode_seconds * 1000 / batches, 2) if batches else 0.0,
+                "fill_histogram": {
+                    "le_25pct": self._fill_histogram[0],
+                    "le_50pct": self._fill_histogram[1],
+                    "le_75pct": self._fill_histogram[2],
+                    "gt_75pct": self._fill_histogram[3],
+                },
+                "queued": self._queue.qsize(),
+            }
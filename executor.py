@@ -0,0 +1,186 @@
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional
+
+from metrics import record_stage
+
+logger = logging.getLogger(__name__)
+
+_END_OF_STREAM = object()
+
+# Monotonic time by which the current pool work item must finish; read by the LLM client
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left before the current work item's deadline, or None outside a deadline"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+class OverloadedError(Exception):
+    """Raised when a pool's queue is full and new work must be shed"""
+
+    def __init__(self, pool_name: str, retry_after: int):
+        super().__init__(f"{pool_name} pool is at capacity")
+        self.pool_name = pool_name
+        self.retry_after = retry_after
+
+
+class DeadlineExceededError(Exception):
+    """Raised when work does not finish before its request deadline"""
+
+    def __init__(self, pool_name: str, timeout: float):
+        super().__init__(f"{pool_name} work exceeded its {timeout:.1f}s deadline")
+        self.pool_name = pool_name
+        self.timeout = timeout
+
+
+class BoundedExecutor:
+    """Thread pool with a bounded queue for running blocking work off the event loop"""
+
+    def __init__(self, name: str, max_workers: int, max_queue_depth: int,
+                 default_timeout: Optional[float] = None, retry_after: int = 5):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue_depth = max_queue_depth
+        self.default_timeout = default_timeout
+        self.retry_after = retry_after
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._pending = 0  # Running plus queued work items
+        self.rejected = 0
+        self.timed_out = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue_depth
+
+    def _acquire_slot(self):
+        with self._lock:
+            if self._pending >= self.capacity:
+                self.rejected += 1
+                raise OverloadedError(self.name, self.retry_after)
+            self._pending += 1
+
+    def _release_slot(self, _future=None):
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Run a blocking callable in the pool, honouring the queue limit and deadline"""
+        self._acquire_slot()
+        # Copy the caller's context so request-scoped state follows the work into the thread
+        ctx = contextvars.copy_context()
+        submitted = time.perf_counter()
+        timeout = timeout if timeout is not None else self.default_timeout
+        deadline = time.monotonic() + timeout if timeout is not None else None
+
+        def call():
+            record_stage("queue_wait", time.perf_counter() - submitted)
+            _deadline.set(deadline)
+            return fn(*args, **kwargs)
+
+        try:
+            future = self._pool.submit(ctx.run, call)
+        except Exception:
+            self._release_slot()
+            raise
+        # The slot is only freed once the thread finishes, even if the caller gave up
+        future.add_done_callback(self._release_slot)
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            with self._lock:
+                self.timed_out += 1
+            raise DeadlineExceededError(self.name, timeout)
+
+    def stream(self, fn: Callable[..., Iterator[Any]], *args, timeout: Optional[float] = None,
+               **kwargs) -> AsyncIterator[Any]:
+        """Run a blocking generator in the pool and relay its items to the event loop.
+
+        Admission control happens immediately so a full queue is reported before the
+        response starts; the deadline covers the whole stream.
+        """
+        self._acquire_slot()
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+
+        def publish(item):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                # Event loop already closed, nobody is listening any more
+                stop.set()
+
+        submitted = time.perf_counter()
+        timeout = timeout if timeout is not None else self.default_timeout
+        deadline = time.monotonic() + timeout if timeout is not None else None
+
+        def produce():
+            record_stage("queue_wait", time.perf_counter() - submitted)
+            _deadline.set(deadline)
+            try:
+                for item in fn(*args, **kwargs):
+                    if stop.is_set():
+                        break
+                    publish(item)
+            except BaseException as e:
+                publish(e)
+            finally:
+                publish(_END_OF_STREAM)
+
+        ctx = contextvars.copy_context()
+        try:
+            future = self._pool.submit(ctx.run, produce)
+        except Exception:
+            self._release_slot()
+            raise
+        future.add_done_callback(self._release_slot)
+
+        return self._drain(queue, stop, timeout)
+
+    async def _drain(self, queue: asyncio.Queue, stop: threading.Event,
+                     timeout: Optional[float]) -> AsyncIterator[Any]:
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        try:
+            while True:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise asyncio.TimeoutError()
+                item = await asyncio.wait_for(queue.get(), timeout=remaining)
+                if item is _END_OF_STREAM:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timed_out += 1
+            raise DeadlineExceededError(self.name, timeout)
+        finally:
+            # Tell the producer to stop early if the consumer went away
+            stop.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return a snapshot of pool utilisation"""
+        with self._lock:
+            pending = self._pending
+        return {
+            "max_workers": self.max_workers,
+            "max_queue_depth": self.max_queue_depth,
+            "in_flight": min(pending, self.max_workers),
+            "queued": max(0, pending - self.max_workers),
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+    def shutdown(self, wait: bool = False):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
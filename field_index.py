@@ -0,0 +1,147 @@
+import json
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from lexical_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+FIELD_INDEX_FILE = "fields.json"
+
+# Structured item keys grouped by the kind of lookup they answer
+FIELD_KEYS = {
+    "contact": ("contact", "phone", "emergency_contact", "emergency", "after_hours", "report_violations"),
+    "hours": ("office_hours", "hours"),
+    "location": ("location", "address", "payment_locations"),
+    "website": ("website",),
+}
+
+# Words that signal which field a question asks for; checked against the raw question tokens
+FIELD_INTENTS = {
+    "contact": {"phone", "number", "call", "contact", "telephone", "reach"},
+    "hours": {"hours", "open", "opening", "close", "closing"},
+    "location": {"where", "address", "located", "location"},
+    "website": {"website", "url", "site"},
+}
+
+# Questions with these words want an explanation, not a field value
+_PROCEDURAL_WORDS = {
+    "how", "why", "apply", "cost", "fee", "fees", "price", "register", "requirements", "should", "need",
+}
+_GENERIC_WORDS = {"metro", "city", "s", "number", "phone", "hours", "address", "website", "there", "get", "find"}
+_INTENT_WORDS = set().union(*FIELD_INTENTS.values())
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def _stem(token: str) -> str:
+    """Crude plural folding so "libraries" matches "library" and "parks" matches "park" """
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def _terms(text: str) -> Set[str]:
+    return {_stem(token) for token in tokenize(text) if len(token) > 1}
+
+
+def detect_field(question: str) -> Optional[str]:
+    """Return the single field a question asks for, or None if it asks for several or something else"""
+    words = set(_WORD_PATTERN.findall(question.lower()))
+    if words & _PROCEDURAL_WORDS:
+        return None
+    matches = [field for field, intent_words in FIELD_INTENTS.items() if words & intent_words]
+    if "what" in words and "time" in words and "hours" not in matches:
+        matches.append("hours")
+    return matches[0] if len(matches) == 1 else None
+
+
+class FieldIndex:
+    """Typed index of structured item fields (contact, hours, location, website) keyed by item and field.
+
+    A question is only answered from an item that every entity word of the question
+    names (at the default ``min_score``), so a question about something inside an
+    item, such as the pool at a recreation center, falls through to retrieval.
+    """
+
+    def __init__(self, min_score: float = 1.0):
+        self.min_score = min_score
+        self.items: Dict[str, Dict[str, Any]] = {}
+        self._aliases: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def add(self, item_id: str, title: str, category: str, fields: Dict[str, List[Tuple[str, str]]]):
+        self.items[item_id] = {"title": title, "category": category, "fields": fields}
+        # An item is recognised by its title, category and the labels on its values ("Building Department: ...")
+        alias_text = f"{title} {category.replace('_', ' ')}"
+        for values in fields.values():
+            for _, value in values:
+                if ":" in value:
+                    alias_text += " " + value.split(":", 1)[0]
+        self._aliases[item_id] = _terms(alias_text)
+
+    def add_item(self, item_id: str, item: Dict[str, Any]):
+        """Index the structured fields of one knowledge base item, if it has any"""
+        if "content" not in item:
+            return
+        fields = {}
+        for field, keys in FIELD_KEYS.items():
+            values = [(key, str(item[key])) for key in keys if item.get(key)]
+            if values:
+                fields[field] = values
+        if fields:
+            self.add(item_id, item.get("title", ""), item.get("category", ""), fields)
+
+    def match(self, question: str) -> Optional[Dict[str, Any]]:
+        """Answer a field lookup from the index, or return None when the question is not a confident match"""
+        field = detect_field(question)
+        if field is None:
+            return None
+
+        entity_terms = _terms(question) - {_stem(word) for word in _INTENT_WORDS | _GENERIC_WORDS}
+        if not entity_terms:
+            return None
+
+        scored = sorted(
+            ((len(entity_terms & aliases) / len(entity_terms), item_id) for item_id, aliases in self._aliases.items()),
+            reverse=True
+        )
+        best_score, best_id = scored[0] if scored else (0.0, None)
+        runner_up = scored[1][0] if len(scored) > 1 else 0.0
+        # Ties mean the question names something shared by several items, so let the LLM sort it out
+        if best_id is None or best_score < self.min_score or best_score == runner_up:
+            return None
+
+        item = self.items[best_id]
+        values = item["fields"].get(field)
+        if not values:
+            return None
+
+        lines = [f"{key.replace('_', ' ').title()}: {value}" for key, value in values]
+        return {
+            "answer": f"{item['title']}\n" + "\n".join(lines),
+            "sources": [item["title"]],
+            "field": field,
+            "item_id": best_id,
+            "score": round(best_score, 3)
+        }
+
+    def save(self, folder_path: str):
+        payload = {"items": self.items}
+        with open(os.path.join(folder_path, FIELD_INDEX_FILE), "w") as f:
+            json.dump(payload, f, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, folder_path: str, **kwargs) -> "FieldIndex":
+        with open(os.path.join(folder_path, FIELD_INDEX_FILE), "r") as f:
+            payload = json.load(f)
+        index = cls(**kwargs)
+        for item_id, item in payload["items"].items():
+            fields = {field: [tuple(value) for value in values] for field, values in item["fields"].items()}
+            index.add(item_id, item["title"], item["category"], fields)
+        return index
@@ -0,0 +1,239 @@
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryStore(ABC):
+    """Per-user conversation history with a cap per user, TTL expiry and cursor paging.
+
+    Entries carry a store-wide increasing ``id``; a page holds the newest entries
+    older than ``cursor`` in chronological order, and ``next_cursor`` fetches the
+    page before it.
+    """
+
+    def __init__(self, max_entries_per_user: int = 100, ttl_seconds: float = 0):
+        self.max_entries_per_user = max_entries_per_user
+        self.ttl_seconds = ttl_seconds
+
+    @abstractmethod
+    def append(self, user_id: str, question: str, answer: str, answer_path: Optional[str] = None):
+        """Record one question and its answer for a user"""
+
+    @abstractmethod
+    def page(self, user_id: str, cursor: Optional[int] = None,
+             limit: int = 20) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Return (entries, next_cursor) for the page of a user's history before cursor"""
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+    def close(self):
+        pass
+
+    def _cutoff(self) -> float:
+        return time.time() - self.ttl_seconds if self.ttl_seconds > 0 else 0.0
+
+    @staticmethod
+    def _entry(entry_id: int, question: str, answer: str, created_at: float,
+               answer_path: Optional[str]) -> Dict[str, Any]:
+        return {
+            "id": entry_id,
+            "question": question,
+            "answer": answer,
+            "answer_path": answer_path,
+            "timestamp": datetime.fromtimestamp(created_at).isoformat()
+        }
+
+
+class MemoryHistoryStore(HistoryStore):
+    """Ring buffer per user, with least-recently-active users evicted past ``max_users``"""
+
+    def __init__(self, max_entries_per_user: int = 100, ttl_seconds: float = 0, max_users: int = 10000):
+        super().__init__(max_entries_per_user, ttl_seconds)
+        self.max_users = max_users
+        self._users: "OrderedDict[str, Deque[Tuple]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self.evicted_users = 0
+
+    def append(self, user_id: str, question: str, answer: str, answer_path: Optional[str] = None):
+        with self._lock:
+            entries = self._users.get(user_id)
+            if entries is None:
+                entries = self._users[user_id] = deque(maxlen=self.max_entries_per_user)
+            self._users.move_to_end(user_id)
+            entries.append((self._next_id, question, answer, time.time(), answer_path))
+            self._next_id += 1
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+                self.evicted_users += 1
+
+    def page(self, user_id: str, cursor: Optional[int] = None,
+             limit: int = 20) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        cutoff = self._cutoff()
+        with self._lock:
+            entries = self._users.get(user_id)
+            if entries is None:
+                return [], None
+            while entries and entries[0][3] < cutoff:
+                entries.popleft()
+            older = [entry for entry in entries if cursor is None or entry[0] < cursor]
+        selected = older[-limit:] if limit > 0 else []
+        next_cursor = selected[0][0] if selected and len(older) > len(selected) else None
+        return [self._entry(*entry) for entry in selected], next_cursor
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "users": len(self._users),
+                "entries": sum(len(entries) for entries in self._users.values()),
+                "evicted_users": self.evicted_users,
+            }
+
+
+class SQLiteHistoryStore(HistoryStore):
+    """SQLite history in WAL mode, shareable between worker processes.
+
+    Appends are queued and written in batches by a background thread, so requests
+    never wait on disk; when the queue is full new entries are dropped and counted.
+    """
+
+    def __init__(self, path: str, max_entries_per_user: int = 100, ttl_seconds: float = 0,
+                 max_pending_writes: int = 1000):
+        super().__init__(max_entries_per_user, ttl_seconds)
+        self.path = path
+        self._local = threading.local()
+        self._pending: "queue.Queue[Optional[Tuple]]" = queue.Queue(maxsize=max_pending_writes)
+        self.dropped_writes = 0
+        self.written = 0
+        self._last_purge = 0.0
+        # Set by close(); the writer stops once the queue is drained even if no sentinel got through
+        self._closing = threading.Event()
+
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS history ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, question TEXT NOT NULL, "
+            "answer TEXT NOT NULL, answer_path TEXT, created_at REAL NOT NULL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS history_user ON history (user_id, id)")
+        connection.commit()
+
+        self._writer = threading.Thread(target=self._run_writer, name="history-writer", daemon=True)
+        self._writer.start()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def append(self, user_id: str, question: str, answer: str, answer_path: Optional[str] = None):
+        try:
+            self._pending.put_nowait((user_id, question, answer, answer_path, time.time()))
+        except queue.Full:
+            self.dropped_writes += 1
+            logger.warning("History write queue is full, dropping entry")
+
+    def _run_writer(self):
+        while True:
+            batch = [self._pending.get()]
+            while len(batch) < 256:
+                try:
+                    batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            rows = [row for row in batch if row is not None]
+            if rows:
+                try:
+                    self._write(rows)
+                except sqlite3.Error as e:
+                    logger.error(f"Failed to write {len(rows)} history entries: {e}")
+            if len(rows) < len(batch) or (self._closing.is_set() and self._pending.empty()):
+                self._close_connection()
+                return
+
+    def _write(self, rows: List[Tuple]):
+        connection = self._connection()
+        with connection:
+            connection.executemany(
+                "INSERT INTO history (user_id, question, answer, answer_path, created_at) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            # Trim each touched user back to the cap
+            for user_id in {row[0] for row in rows}:
+                connection.execute(
+                    "DELETE FROM history WHERE user_id = ? AND id <= ("
+                    "SELECT id FROM history WHERE user_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                    (user_id, user_id, self.max_entries_per_user)
+                )
+            if self.ttl_seconds > 0 and time.time() - self._last_purge > 60:
+                connection.execute("DELETE FROM history WHERE created_at < ?", (self._cutoff(),))
+                self._last_purge = time.time()
+        self.written += len(rows)
+
+    def page(self, user_id: str, cursor: Optional[int] = None,
+             limit: int = 20) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        rows = self._connection().execute(
+            "SELECT id, question, answer, created_at, answer_path FROM history "
+            "WHERE user_id = ? AND id < ? AND created_at >= ? ORDER BY id DESC LIMIT ?",
+            (user_id, cursor if cursor is not None else 2 ** 63 - 1, self._cutoff(), limit + 1)
+        ).fetchall()
+        next_cursor = rows[limit - 1][0] if len(rows) > limit and limit > 0 else None
+        return [self._entry(*row) for row in reversed(rows[:limit])], next_cursor
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "pending_writes": self._pending.qsize(),
+            "written": self.written,
+            "dropped_writes": self.dropped_writes,
+        }
+
+    def close(self, timeout: float = 10):
+        """Write everything still queued, then stop the writer thread, waiting at most timeout seconds"""
+        deadline = time.monotonic() + timeout
+        self._closing.set()
+        if self._writer.is_alive():
+            try:
+                self._pending.put(None, timeout=timeout)
+            except queue.Full:
+                logger.warning(f"History writer is stuck, closing with {self._pending.qsize()} entries unwritten")
+        self._writer.join(timeout=max(0.0, deadline - time.monotonic()))
+
+    def _close_connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+def create_history_store(settings) -> HistoryStore:
+    """Build the history backend selected by HISTORY_BACKEND"""
+    if settings.HISTORY_BACKEND == "sqlite":
+        return SQLiteHistoryStore(
+            settings.HISTORY_PATH,
+            max_entries_per_user=settings.HISTORY_MAX_PER_USER,
+            ttl_seconds=settings.HISTORY_TTL,
+            max_pending_writes=settings.HISTORY_WRITE_QUEUE
+        )
+    if settings.HISTORY_BACKEND != "memory":
+        logger.warning(f"Unknown HISTORY_BACKEND '{settings.HISTORY_BACKEND}', using memory")
+    return MemoryHistoryStore(
+        max_entries_per_user=settings.HISTORY_MAX_PER_USER,
+        ttl_seconds=settings.HISTORY_TTL,
+        max_users=settings.HISTORY_MAX_USERS
+    )
@@ -0,0 +1,258 @@
+import json
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+import numpy as np
+from langchain.schema.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_READ_BLOCK = 1 << 16
+# Section assumed for JSONL records that do not name one
+DEFAULT_SECTION = "records"
+
+
+class _JsonReader:
+    """Pulls JSON values one at a time from a text stream that is read in blocks"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffer = ""
+        self.pos = 0
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        block = self.stream.read(max(_READ_BLOCK, len(self.buffer) - self.pos))
+        if not block:
+            return False
+        self.buffer = self.buffer[self.pos:] + block
+        self.pos = 0
+        return True
+
+    def _peek(self) -> str:
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON input")
+
+    def consume(self, char: str) -> bool:
+        if self._peek() == char:
+            self.pos += 1
+            return True
+        return False
+
+    def expect(self, char: str):
+        if not self.consume(char):
+            raise ValueError(f"Expected '{char}' in JSON input, found '{self._peek()}'")
+
+    def value(self) -> Any:
+        while True:
+            self._peek()
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number at the very end of the buffer may continue in the next block
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def array(self) -> Iterator[Any]:
+        """Yield the elements of the array whose '[' was just consumed"""
+        if self.consume("]"):
+            return
+        while True:
+            yield self.value()
+            if not self.consume(","):
+                self.expect("]")
+                return
+
+    def keys(self) -> Iterator[str]:
+        """Yield the keys of the object whose '{' was just consumed; the caller reads each value"""
+        if self.consume("}"):
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            if not self.consume(","):
+                self.expect("}")
+                return
+
+
+def _iter_json_items(stream) -> Iterator[Tuple[str, int, Any]]:
+    reader = _JsonReader(stream)
+    reader.expect("{")
+    for key in reader.keys():
+        if key != "knowledge_base" or not reader.consume("{"):
+            reader.value()
+            continue
+        for section in reader.keys():
+            if not reader.consume("["):
+                # Only lists of items are knowledge; anything else is skipped as before
+                reader.value()
+                continue
+            for position, item in enumerate(reader.array()):
+                yield section, position, item
+
+
+def _iter_jsonl_items(stream) -> Iterator[Tuple[str, int, Any]]:
+    positions: Dict[str, int] = {}
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"Invalid JSON on line {line_number}: {e}") from e
+        section = item.pop("section", DEFAULT_SECTION) if isinstance(item, dict) else DEFAULT_SECTION
+        position = positions.get(section, 0)
+        positions[section] = position + 1
+        yield section, position, item
+
+
+def iter_knowledge_items(file_path: str) -> Iterator[Tuple[str, int, Any]]:
+    """Yield (section, position, item) from a knowledge file without loading it whole.
+
+    ``.jsonl`` files hold one item per line, optionally naming their section in a
+    ``section`` key; other files are read as ``{"knowledge_base": {section: [items]}}``.
+    """
+    with open(file_path, "r", encoding="utf-8") as f:
+        if file_path.endswith(".jsonl"):
+            yield from _iter_jsonl_items(f)
+        else:
+            yield from _iter_json_items(f)
+
+
+def iter_knowledge_data(knowledge_data: Dict) -> Iterator[Tuple[str, int, Any]]:
+    """The same (section, position, item) stream for an already parsed knowledge base"""
+    for section, items in knowledge_data.get("knowledge_base", {}).items():
+        if isinstance(items, list):
+            for position, item in enumerate(items):
+                yield section, position, item
+
+
+def batched(iterable: Iterable[T], size: int) -> Iterator[List[T]]:
+    batch: List[T] = []
+    for element in iterable:
+        batch.append(element)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+_worker_model = None
+
+
+def _init_worker(model_name: str, threads: int):
+    global _worker_model
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    from langchain.embeddings import HuggingFaceEmbeddings
+    _worker_model = HuggingFaceEmbeddings(model_name=model_name)
+
+
+def _embed_in_worker(texts: List[str]) -> np.ndarray:
+    return np.asarray(_worker_model.embed_documents(texts), dtype=np.float32)
+
+
+class ParallelEmbedder:
+    """Embeds batches of texts, in worker processes when ``processes`` > 1.
+
+    Results come back in submission order and at most two batches per process are
+    in flight, so the input can be a lazy stream of any length without piling up
+    in memory.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: Optional[str] = None, processes: int = 0):
+        self.embeddings = embeddings
+        # Worker processes load the model by name, so custom in-process embedders always run inline
+        self.processes = processes if model_name and processes > 1 else 0
+        self.model_name = model_name
+
+    def embed_batches(self, batches: Iterable[List[T]],
+                      text: Callable[[T], str]) -> Iterator[Tuple[List[T], np.ndarray]]:
+        if not self.processes:
+            for batch in batches:
+                yield batch, np.asarray(self.embeddings.embed_documents([text(x) for x in batch]), dtype=np.float32)
+            return
+
+        threads = max(1, (os.cpu_count() or 1) // self.processes)
+        pending: Deque[Tuple[List[T], Future]] = deque()
+        with ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.model_name, threads)
+        ) as pool:
+            for batch in batches:
+                pending.append((batch, pool.submit(_embed_in_worker, [text(x) for x in batch])))
+                if len(pending) >= self.processes * 2:
+                    done, future = pending.popleft()
+                    yield done, future.result()
+            while pending:
+                done, future = pending.popleft()
+                yield done, future.result()
+
+
+class IngestionProgress:
+    """Counts items and embedded chunks and logs throughput every ``interval`` seconds"""
+
+    def __init__(self, interval: float = 5.0):
+        self.interval = interval
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._last_log = self._start
+        self._end: Optional[float] = None
+        self.status = "running"
+        self.items = 0
+        self.embedded = 0
+
+    def item(self):
+        self.items += 1
+
+    def embedded_batch(self, chunks: int):
+        self.embedded += chunks
+        now = time.perf_counter()
+        if now - self._last_log >= self.interval:
+            self._last_log = now
+            snapshot = self.snapshot()
+            logger.info(f"Ingested {snapshot['items']} items, embedded {snapshot['embedded_chunks']} chunks "
+                        f"({snapshot['chunks_per_second']}/s)")
+
+    def finish(self, status: str = "done"):
+        self._end = time.perf_counter()
+        self.status = status
+        snapshot = self.snapshot()
+        logger.info(f"Ingestion {status}: {snapshot['items']} items, {snapshot['embedded_chunks']} chunks embedded "
+                    f"in {snapshot['elapsed_seconds']}s ({snapshot['chunks_per_second']}/s)")
+
+    def snapshot(self) -> Dict[str, Any]:
+        elapsed = (self._end or time.perf_counter()) - self._start
+        return {
+            "status": self.status,
+            "started_at": self.started_at,
+            "items": self.items,
+            "embedded_chunks": self.embedded,
+            "elapsed_seconds": round(elapsed, 1),
+            "chunks_per_second": round(self.embedded / elapsed, 1) if elapsed > 0 else 0.0,
+        }
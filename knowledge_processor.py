@@ -1,86 +1,529 @@
+import hashlib
 import json
 import logging
 import os
-from typing import List, Dict, Any
+import shutil
+import threading
+import time
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+import numpy as np
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.embeddings import HuggingFaceEmbeddings
 from langchain.vectorstores import FAISS
 from langchain.schema import Document
+from langchain.schema.embeddings import Embeddings
+from embedding_batcher import BatchingEmbeddings
+from caching import CachedEmbeddings
+from file_lock import FileLock
+from shared_cache import SharedCache
+from ingestion import IngestionProgress, ParallelEmbedder, batched, iter_knowledge_data, iter_knowledge_items
+from lexical_index import BM25Index, LEXICAL_INDEX_FILE
+from field_index import FieldIndex, FIELD_INDEX_FILE
+from partitions import CategoryPartitions
+from metrics import INDEX_LOADS, timed
+from vector_index import (
+    INDEX_FILE, DOCSTORE_FILE, IndexBuilder, configure_search, index_params, load_vectors,
+    measure_recall, open_vector_store, save_vector_store
+)
+from config import settings
 
 logger = logging.getLogger(__name__)
 
+MANIFEST_FILE = "manifest.json"
+MANIFEST_FORMAT = 2
+# Sections of knowledge.json that are not knowledge: test_queries drives the benchmark instead
+EXCLUDED_SECTIONS = {"test_queries"}
+# Saved vectors are copied into a rebuilt index this many at a time
+_COPY_BATCH = 10000
+# Saved index versions are directories named INDEX_PATH + this + a timestamp; INDEX_PATH links to the live one
+_VERSION_SUFFIX = ".v-"
+
+class LazyEmbeddings(Embeddings):
+    """Embeddings proxy that loads the sentence-transformers model on first use.
+    
+    Lets the saved index be opened while the model is still loading, and keeps
+    the model load out of import time.
+    """
+    
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._model: Optional[HuggingFaceEmbeddings] = None
+        self._lock = threading.Lock()
+    
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+    
+    def load(self) -> HuggingFaceEmbeddings:
+        """Load the model if needed; safe to call from several threads"""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    start = time.perf_counter()
+                    self._model = HuggingFaceEmbeddings(model_name=self.model_name)
+                    logger.info(f"Loaded embedding model {self.model_name} in {time.perf_counter() - start:.1f}s")
+        return self._model
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.load().embed_documents(texts)
+    
+    def embed_query(self, text: str) -> List[float]:
+        return self.load().embed_query(text)
+
 class KnowledgeBaseProcessor:
-    def __init__(self):
-        self.documents: List[Document] = []
+    def __init__(self, embedding_model: Optional[Embeddings] = None):
         self.vector_store = None
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2"
+        self.embedding_model = embedding_model or LazyEmbeddings(settings.EMBEDDING_MODEL)
+        # Query embeddings from concurrent requests are micro-batched in front of the model
+        self.embedding_batcher = None
+        query_embeddings = self.embedding_model
+        if settings.EMBED_BATCH_MAX_SIZE > 1:
+            self.embedding_batcher = BatchingEmbeddings(
+                self.embedding_model,
+                max_batch_size=settings.EMBED_BATCH_MAX_SIZE,
+                max_wait_ms=settings.EMBED_BATCH_MAX_WAIT_MS
+            )
+            query_embeddings = self.embedding_batcher
+        # Repeated queries are answered from the embedding cache without touching the model;
+        # the shared cache lets worker processes reuse each other's query embeddings
+        shared = SharedCache(
+            settings.SHARED_CACHE_PATH,
+            f"embeddings:{settings.EMBEDDING_MODEL}",
+            max_entries=settings.SHARED_EMBED_CACHE_SIZE
+        ) if settings.SHARED_CACHE_PATH and settings.EMBED_CACHE_SIZE > 0 else None
+        self.embeddings = CachedEmbeddings(query_embeddings, max_entries=settings.EMBED_CACHE_SIZE, shared=shared)
+        self.index_path = settings.INDEX_PATH
+        self.index_version = "unversioned"
+        # BM25 index over the same chunks as the vector store, saved alongside it
+        self.lexical_index: Optional[BM25Index] = None
+        # Structured contact/hours/location fields per item, for answering lookups without the LLM
+        self.field_index: Optional[FieldIndex] = None
+        # Index rows per source category, for category-filtered and routed retrieval
+        self.partitions: Optional[CategoryPartitions] = None
+        # Type, size and build-time recall of the current vector index, as recorded in the manifest
+        self.index_report: Optional[Dict[str, Any]] = None
+        # Progress of the current or last index build, for /stats
+        self.ingestion: Optional[IngestionProgress] = None
+        self.text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=settings.CHUNK_SIZE,
+            chunk_overlap=settings.CHUNK_OVERLAP,
+            length_function=len
         )
-        self.index_path = "faiss_index"
+    
+    @staticmethod
+    def compute_version(file_path: str) -> str:
+        """Derive a short version tag from the knowledge base file contents"""
+        if not os.path.exists(file_path):
+            return "unversioned"
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()[:12]
     
     def load_from_file(self, file_path: str):
-        """Load knowledge base from JSON file"""
-        # Try to load existing vector store first
-        if os.path.exists(self.index_path):
-            try:
-                logger.info(f"Loading existing vector store from {self.index_path}")
-                self.vector_store = FAISS.load_local(self.index_path, self.embeddings)
-                logger.info("Vector store loaded successfully")
+        """Load knowledge base from JSON file, updating the saved index incrementally"""
+        with timed("index_load"):
+            return self._load_from_file(file_path)
+    
+    def _load_from_file(self, file_path: str):
+        self.index_version = self.compute_version(file_path)
+        if self._load_saved_index(file_path):
+            return self.vector_store
+        
+        # Only one worker process builds; the others wait here, then open what it saved
+        with FileLock(f"{self.index_path}.lock"):
+            if self._load_saved_index(file_path):
                 return self.vector_store
-            except Exception as e:
-                logger.warning(f"Failed to load existing vector store: {e}")
-                logger.info("Creating new vector store...")
+            return self._build_index(file_path)
+    
+    def _load_saved_index(self, file_path: str) -> bool:
+        """Open the saved index if it was built from exactly this file, as the configured index type"""
+        manifest = self._read_manifest()
+        if not (manifest and manifest.get("source_version") == self.index_version
+                and manifest.get("index", {}).get("params") == index_params(settings)):
+            return False
+        try:
+            logger.info(f"Loading up-to-date vector store from {self.index_path}")
+            self.vector_store = self._open_vector_store()
+            self.partitions = self._open_partitions()
+            self.index_report = manifest["index"]
+            self.lexical_index = self._load_lexical_index(self.vector_store)
+            self.field_index = self._load_field_index(file_path)
+            INDEX_LOADS.inc(mode="saved")
+            logger.info("Vector store loaded successfully")
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to load existing vector store: {e}")
+            return False
+    
+    def _build_index(self, file_path: str):
+        manifest = self._read_manifest()
+        if not os.path.exists(file_path):
+            if os.path.exists(self.index_path):
+                logger.warning(f"{file_path} not found, serving existing vector store as-is")
+                self.vector_store = self._open_vector_store()
+                self.partitions = self._open_partitions()
+                self.index_report = manifest.get("index") if manifest else None
+                self.lexical_index = self._load_lexical_index(self.vector_store)
+                self.field_index = self._load_field_index(file_path)
+                INDEX_LOADS.inc(mode="saved")
+                return self.vector_store
+            raise FileNotFoundError(file_path)
         
-        # If no existing vector store, create a new one
-        with open(file_path, 'r') as f:
-            knowledge_data = json.load(f)
-        return self.load_knowledge_base(knowledge_data)
+        if manifest and self._manifest_compatible(manifest):
+            try:
+                vector_store = self._update_knowledge_base(iter_knowledge_items(file_path), manifest)
+                INDEX_LOADS.inc(mode="incremental")
+                return vector_store
+            except Exception as e:
+                logger.warning(f"Incremental index update failed, rebuilding: {e}")
         
+        logger.info("Creating new vector store...")
+        vector_store = self._ingest(iter_knowledge_items(file_path))
+        INDEX_LOADS.inc(mode="full")
+        return vector_store
+    
     def load_knowledge_base(self, knowledge_data: Dict):
         """Process the provided JSON knowledge base"""
-        logger.info("Loading knowledge base...")
-        
-        for category, items in knowledge_data.get("knowledge_base", {}).items():
-            if isinstance(items, list):
-                for item in items:
-                    content = f"Title: {item.get('title', '')}\n"
-                    content += f"Category: {item.get('category', '')}\n"
-                    content += f"Content: {item.get('content', '')}\n"
-                    
-                    for key, value in item.items():
-                        if key not in ['title', 'category', 'content', 'id']:
-                            content += f"{key.title()}: {value}\n"
-                    
-                    doc = Document(
-                        page_content=content,
-                        metadata={
-                            "id": item.get("id", ""),
-                            "title": item.get("title", ""),
-                            "category": item.get("category", ""),
-                            "source_category": category
-                        }
-                    )
-                    self.documents.append(doc)
-        
-        logger.info(f"Loaded {len(self.documents)} documents")
-        return self.chunk_documents()
-    
-    def chunk_documents(self):
-        """Split documents into chunks for better retrieval"""
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len
+        return self._ingest(iter_knowledge_data(knowledge_data))
+    
+    def _iter_documents(self, items: Iterable[Tuple[str, int, Any]]) -> Iterator[Tuple[Document, Dict[str, Any]]]:
+        """Turn knowledge base items into one document per item with a stable id, as they are read"""
+        seen_ids = set()
+        for category, position, item in items:
+            if category in EXCLUDED_SECTIONS or not isinstance(item, dict):
+                continue
+            content = f"Title: {item.get('title', '')}\n"
+            content += f"Category: {item.get('category', '')}\n"
+            content += f"Content: {item.get('content', '')}\n"
+            
+            for key, value in item.items():
+                if key not in ['title', 'category', 'content', 'id']:
+                    content += f"{key.title()}: {value}\n"
+            
+            # Items without an id are keyed by position so they can still be diffed
+            item_id = item.get("id") or f"{category}-{position}"
+            if item_id in seen_ids:
+                item_id = f"{item_id}#{position}"
+            seen_ids.add(item_id)
+            
+            doc = Document(
+                page_content=content,
+                metadata={
+                    "id": item_id,
+                    "title": item.get("title", ""),
+                    "category": item.get("category", ""),
+                    "source_category": category
+                }
+            )
+            yield doc, item
+    
+    def _ingest(self, items: Iterable[Tuple[str, int, Any]]):
+        """Stream items through document building, chunking and batched embedding into a new index.
+        
+        Only the batches in flight are held in memory besides the index itself; vectors
+        are spooled to disk as they are embedded.
+        """
+        start = time.perf_counter()
+        self.ingestion = progress = IngestionProgress()
+        field_index = FieldIndex(min_score=settings.FIELD_MATCH_MIN_SCORE)
+        lexical_index = BM25Index()
+        manifest = self._new_manifest()
+        builder = IndexBuilder(index_params(settings), self._spool_path())
+        
+        def chunks() -> Iterator[Tuple[str, Document]]:
+            for doc, item in self._iter_documents(items):
+                field_index.add_item(doc.metadata["id"], item)
+                manifest["items"][doc.metadata["id"]] = self._hash_document(doc)
+                progress.item()
+                yield from zip(*self._split_documents([doc]))
+        
+        try:
+            with timed("index_embed"):
+                for batch in self._embed_batches(chunks()):
+                    builder.add(*batch)
+                    lexical_index.add_many((chunk_id, doc.page_content) for chunk_id, doc in zip(batch[0], batch[1]))
+                    manifest["chunks"].update((chunk_id, doc.metadata["id"]) for chunk_id, doc in zip(batch[0], batch[1]))
+                    progress.embedded_batch(len(batch[0]))
+            vector_store, index_report, vectors, partitions = self._finish_vector_store(builder)
+            logger.info(f"Vector store created in {time.perf_counter() - start:.1f}s")
+            
+            # Save the vector store to disk, then serve it from the saved files
+            manifest["index"] = index_report
+            self._save_index(vector_store, vectors, manifest, lexical_index, field_index, partitions)
+            progress.finish()
+        except Exception:
+            progress.finish("failed")
+            raise
+        finally:
+            builder.discard()
+        
+        self.vector_store = self._open_vector_store()
+        self.partitions = self._open_partitions()
+        self.index_report = index_report
+        self.lexical_index = lexical_index
+        self.field_index = field_index
+        return self.vector_store
+    
+    def _update_knowledge_base(self, items: Iterable[Tuple[str, int, Any]], manifest: Dict[str, Any]):
+        """Re-embed only added or changed chunks and rebuild the index from saved and new vectors"""
+        start = time.perf_counter()
+        self.ingestion = progress = IngestionProgress()
+        old_store = self._open_vector_store()
+        old_vectors = load_vectors(self.index_path)
+        if old_vectors is None:
+            raise ValueError("saved index has no stored vectors")
+        lexical_index = self._load_lexical_index(old_store)
+        
+        old_items: Dict[str, str] = manifest["items"]
+        old_chunks: Dict[str, str] = manifest["chunks"]
+        field_index = FieldIndex(min_score=settings.FIELD_MATCH_MIN_SCORE)
+        new_items: Dict[str, str] = {}
+        changed_docs = []
+        for doc, item in self._iter_documents(items):
+            item_id = doc.metadata["id"]
+            field_index.add_item(item_id, item)
+            new_items[item_id] = self._hash_document(doc)
+            progress.item()
+            if old_items.get(item_id) != new_items[item_id]:
+                changed_docs.append(doc)
+        changed_item_ids = {doc.metadata["id"] for doc in changed_docs}
+        removed_item_ids = set(old_items) - set(new_items)
+        
+        # Chunk ids embed the chunk hash, so unchanged chunks of an edited item are kept
+        chunk_ids, chunked_docs = self._split_documents(changed_docs)
+        new_chunks = {
+            chunk_id: item_id for chunk_id, item_id in old_chunks.items()
+            if item_id not in changed_item_ids and item_id not in removed_item_ids
+        }
+        new_chunks.update({chunk_id: doc.metadata["id"] for chunk_id, doc in zip(chunk_ids, chunked_docs)})
+        
+        stale_ids = [chunk_id for chunk_id in old_chunks if chunk_id not in new_chunks]
+        added = [(chunk_id, doc) for chunk_id, doc in zip(chunk_ids, chunked_docs) if chunk_id not in old_chunks]
+        kept = {chunk_id: doc for chunk_id, doc in zip(chunk_ids, chunked_docs) if chunk_id in old_chunks}
+        
+        for chunk_id in stale_ids:
+            lexical_index.remove(chunk_id)
+        
+        builder = IndexBuilder(index_params(settings), self._spool_path())
+        try:
+            # Surviving chunks keep their saved vectors; same text means the same vector, but item
+            # metadata such as the title may have moved on, so kept chunks take their new document
+            positions = {chunk_id: position for position, chunk_id in old_store.index_to_docstore_id.items()}
+            retained = sorted((chunk_id for chunk_id in old_chunks if chunk_id in new_chunks), key=positions.__getitem__)
+            for batch in batched(retained, _COPY_BATCH):
+                builder.add(
+                    batch,
+                    [kept[chunk_id] if chunk_id in kept else old_store.docstore.search(chunk_id) for chunk_id in batch],
+                    old_vectors[[positions[chunk_id] for chunk_id in batch]]
+                )
+            with timed("index_embed"):
+                for batch in self._embed_batches(added):
+                    builder.add(*batch)
+                    lexical_index.add_many((chunk_id, doc.page_content) for chunk_id, doc in zip(batch[0], batch[1]))
+                    progress.embedded_batch(len(batch[0]))
+            vector_store, index_report, vectors, partitions = self._finish_vector_store(builder)
+            
+            manifest = self._new_manifest()
+            manifest["items"] = new_items
+            manifest["chunks"] = new_chunks
+            manifest["index"] = index_report
+            self._save_index(vector_store, vectors, manifest, lexical_index, field_index, partitions)
+            progress.finish()
+        except Exception:
+            progress.finish("failed")
+            raise
+        finally:
+            builder.discard()
+        
+        logger.info(
+            f"Vector store updated in {time.perf_counter() - start:.1f}s: "
+            f"{len(changed_item_ids)} changed/added items, {len(removed_item_ids)} removed items, "
+            f"{len(added)} chunks embedded, {len(stale_ids)} chunks deleted"
         )
+        self.vector_store = self._open_vector_store()
+        self.partitions = self._open_partitions()
+        self.index_report = index_report
+        self.lexical_index = lexical_index
+        self.field_index = field_index
+        return self.vector_store
+    
+    def _embed_batches(self, chunks: Iterable[Tuple[str, Document]]
+                       ) -> Iterator[Tuple[List[str], List[Document], np.ndarray]]:
+        """Embed (chunk id, chunk) pairs in batches, in worker processes if EMBED_PROCESSES > 1"""
+        model_name = self.embedding_model.model_name if isinstance(self.embedding_model, LazyEmbeddings) else None
+        embedder = ParallelEmbedder(self.embeddings, model_name=model_name, processes=settings.EMBED_PROCESSES)
+        batches = embedder.embed_batches(batched(chunks, settings.INGEST_BATCH_SIZE), lambda chunk: chunk[1].page_content)
+        for batch, vectors in batches:
+            yield [chunk_id for chunk_id, _ in batch], [doc for _, doc in batch], vectors
+    
+    def _spool_path(self) -> str:
+        return f"{self.index_path}.spool-{os.getpid()}"
+    
+    def _finish_vector_store(self, builder: IndexBuilder
+                             ) -> Tuple[FAISS, Dict[str, Any], np.ndarray, CategoryPartitions]:
+        """Finish the configured index type and its category partitions, and check recall against exact search"""
+        vector_store, built_type, vectors = builder.finish(self.embeddings)
+        partitions = CategoryPartitions.build(
+            vectors,
+            (builder.docstore.metadata(chunk_id).get("source_category", "") for chunk_id in builder.chunk_ids),
+            builder.params if builder.params["partitions"] else None
+        )
+        report = {
+            "params": builder.params,
+            "type": built_type,
+            "vectors": len(builder.chunk_ids),
+            "dimension": builder.dimension,
+            "build_seconds": round(builder.index_seconds, 3),
+            "partitions": partitions.sizes()
+        }
+        if settings.INDEX_RECALL_QUERIES > 0:
+            configure_search(vector_store.index, settings.HNSW_EF_SEARCH, settings.IVF_NPROBE)
+            report.update(measure_recall(vector_store.index, vectors, settings.INDEX_RECALL_QUERIES))
+            logger.info(
+                f"Built {built_type} index over {report['vectors']} vectors in {report['build_seconds']:.1f}s: "
+                f"recall@{report['k']} {report['recall_at_k']:.3f} against exact search, "
+                f"p50 {report['search_ms_p50']}ms, p99 {report['search_ms_p99']}ms per query"
+            )
+        return vector_store, report, vectors, partitions
+    
+    def _open_vector_store(self) -> FAISS:
+        return open_vector_store(
+            self.index_path,
+            self.embeddings,
+            mmap=settings.INDEX_MMAP,
+            ef_search=settings.HNSW_EF_SEARCH,
+            nprobe=settings.IVF_NPROBE
+        )
+    
+    def _open_partitions(self) -> Optional[CategoryPartitions]:
+        return CategoryPartitions.load(
+            self.index_path,
+            mmap=settings.INDEX_MMAP,
+            ef_search=settings.HNSW_EF_SEARCH,
+            nprobe=settings.IVF_NPROBE
+        )
+    
+    def _load_lexical_index(self, vector_store) -> BM25Index:
+        """Load the saved BM25 index, rebuilding it from the docstore if it is missing"""
+        if os.path.exists(os.path.join(self.index_path, LEXICAL_INDEX_FILE)):
+            try:
+                return BM25Index.load(self.index_path)
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Failed to load lexical index, rebuilding: {e}")
+        return BM25Index.from_vector_store(vector_store)
+    
+    def _load_field_index(self, file_path: str) -> FieldIndex:
+        """Load the saved field index, rebuilding it from the knowledge file if it is missing"""
+        if os.path.exists(os.path.join(self.index_path, FIELD_INDEX_FILE)):
+            try:
+                return FieldIndex.load(self.index_path, min_score=settings.FIELD_MATCH_MIN_SCORE)
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Failed to load field index, rebuilding: {e}")
+        field_index = FieldIndex(min_score=settings.FIELD_MATCH_MIN_SCORE)
+        if os.path.exists(file_path):
+            for doc, item in self._iter_documents(iter_knowledge_items(file_path)):
+                field_index.add_item(doc.metadata["id"], item)
+        return field_index
+    
+    def _split_documents(self, documents: List[Document]) -> Tuple[List[str], List[Document]]:
+        """Split documents into chunks with content-derived ids"""
+        chunk_ids = []
+        chunked_docs = []
+        for doc in documents:
+            occurrences: Dict[str, int] = {}
+            for chunk in self.text_splitter.split_documents([doc]):
+                chunk_hash = hashlib.sha256(chunk.page_content.encode("utf-8")).hexdigest()[:16]
+                occurrences[chunk_hash] = occurrences.get(chunk_hash, 0) + 1
+                suffix = f"-{occurrences[chunk_hash]}" if occurrences[chunk_hash] > 1 else ""
+                chunk_ids.append(f"{doc.metadata['id']}:{chunk_hash}{suffix}")
+                chunked_docs.append(chunk)
+        return chunk_ids, chunked_docs
+    
+    @staticmethod
+    def _hash_document(doc: Document) -> str:
+        payload = json.dumps({"content": doc.page_content, "metadata": doc.metadata}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+    
+    def _new_manifest(self) -> Dict[str, Any]:
+        return {
+            "format": MANIFEST_FORMAT,
+            "source_version": self.index_version,
+            "embedding_model": settings.EMBEDDING_MODEL,
+            "chunk_size": settings.CHUNK_SIZE,
+            "chunk_overlap": settings.CHUNK_OVERLAP,
+            "items": {},
+            "chunks": {}
+        }
+    
+    def _manifest_compatible(self, manifest: Dict[str, Any]) -> bool:
+        """Chunks can only be reused if they were produced the same way"""
+        reference = self._new_manifest()
+        return all(manifest.get(key) == reference[key]
+                   for key in ("format", "embedding_model", "chunk_size", "chunk_overlap"))
+    
+    def _read_manifest(self) -> Optional[Dict[str, Any]]:
+        path = os.path.join(self.index_path, MANIFEST_FILE)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable index manifest {path}: {e}")
+            return None
+    
+    def _save_index(self, vector_store, vectors: np.ndarray, manifest: Dict[str, Any], lexical_index: BM25Index,
+                    field_index: FieldIndex, partitions: CategoryPartitions):
+        """Write the index, lexical and field indexes and manifest to a new versioned directory, then publish it"""
+        version_path = f"{self.index_path}{_VERSION_SUFFIX}{time.time_ns()}-{os.getpid()}"
+        shutil.rmtree(version_path, ignore_errors=True)
+        
+        save_vector_store(vector_store, vectors, version_path)
+        partitions.save(version_path)
+        lexical_index.save(version_path)
+        field_index.save(version_path)
+        manifest["index"]["index_bytes"] = os.path.getsize(os.path.join(version_path, INDEX_FILE))
+        manifest["index"]["docstore_bytes"] = os.path.getsize(os.path.join(version_path, DOCSTORE_FILE))
+        with open(os.path.join(version_path, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f)
         
-        chunked_docs = text_splitter.split_documents(self.documents)
-        logger.info(f"Created {len(chunked_docs)} chunks")
+        self._publish(version_path)
+        logger.info(f"Vector store saved to {version_path}")
+    
+    def _publish(self, version_path: str):
+        """Point INDEX_PATH at a saved version with one atomic rename of a symlink.
         
-        self.vector_store = FAISS.from_documents(chunked_docs, self.embeddings)
-        logger.info("Vector store created successfully")
+        Readers see the old or the new index, never a missing one. The version just
+        replaced is kept for processes still opening it; older versions are removed.
+        """
+        previous = os.path.realpath(self.index_path) if os.path.islink(self.index_path) else None
+        link_path = f"{self.index_path}.link-{os.getpid()}"
+        if os.path.lexists(link_path):
+            os.remove(link_path)
+        try:
+            os.symlink(os.path.basename(version_path), link_path, target_is_directory=True)
+        except OSError as e:
+            # Windows without symlink rights: fall back to swapping the directory itself
+            logger.warning(f"Cannot create a symlink ({e}), replacing {self.index_path} non-atomically")
+            old_path = f"{self.index_path}.old-{os.getpid()}"
+            if os.path.exists(self.index_path):
+                os.rename(self.index_path, old_path)
+            os.rename(version_path, self.index_path)
+            shutil.rmtree(old_path, ignore_errors=True)
+            return
         
-        # Save the vector store to disk
-        self.vector_store.save_local(self.index_path)
-        logger.info(f"Vector store saved to {self.index_path}")
+        if os.path.isdir(self.index_path) and not os.path.islink(self.index_path):
+            # A directory saved before versioning; a symlink cannot replace it, so it is moved aside once
+            previous = f"{self.index_path}{_VERSION_SUFFIX}0-{os.getpid()}"
+            os.rename(self.index_path, previous)
+        os.replace(link_path, self.index_path)
         
-        return self.vector_store
\ No newline at end of file
+        keep = {os.path.realpath(version_path), previous and os.path.realpath(previous)}
+        directory = os.path.dirname(os.path.abspath(self.index_path))
+        prefix = os.path.basename(self.index_path) + _VERSION_SUFFIX
+        for name in os.listdir(directory):
+            path = os.path.realpath(os.path.join(directory, name))
+            if name.startswith(prefix) and path not in keep:
+                shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,151 @@
+import json
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+LEXICAL_INDEX_FILE = "bm25.json"
+
+# Compound tokens such as "bp-101" or "24/7" are kept whole and also split into their parts
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-/][a-z0-9]+)*")
+# A number only identifies something after a word naming what it numbers ("Room 205", "Form 12")
+_NUMBERED_PATTERN = re.compile(
+    r"\b(zone|sector|lot|room|suite|unit|route|line|bus|form|permit|case|ticket|district|ward)\s+#?(\d[a-z0-9-]*)\b"
+)
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it my of on or the to what when "
+    "where which who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case word tokens, keeping compound identifiers alongside their parts"""
+    tokens = []
+    for match in _TOKEN_PATTERN.findall(text.lower()):
+        if match not in _STOPWORDS:
+            tokens.append(match)
+        if "-" in match or "/" in match:
+            tokens.extend(part for part in re.split(r"[-/]", match) if part and part not in _STOPWORDS)
+    return tokens
+
+
+def identifier_tokens(text: str) -> Set[str]:
+    """Tokens that look like identifiers: letter/digit codes ("bp-101") or numbered things ("room 205").
+
+    Bare numbers ("30 days", "2 story") are quantities, not identifiers.
+    """
+    text = text.lower()
+    tokens = {
+        token for token in _TOKEN_PATTERN.findall(text)
+        if any(ch.isdigit() for ch in token) and any(ch.isalpha() for ch in token)
+    }
+    for keyword, number in _NUMBERED_PATTERN.findall(text):
+        tokens.update((keyword, number))
+    return tokens
+
+
+class BM25Index:
+    """In-memory inverted index with Okapi BM25 scoring, keyed by chunk id"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._doc_terms: Dict[str, Dict[str, int]] = {}
+        self._doc_lengths: Dict[str, int] = {}
+        self._total_length = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._doc_lengths)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._doc_lengths
+
+    def add(self, doc_id: str, text: str):
+        self._add_terms(doc_id, dict(Counter(tokenize(text))))
+
+    def add_many(self, items: Iterable[Tuple[str, str]]):
+        for doc_id, text in items:
+            self.add(doc_id, text)
+
+    def remove(self, doc_id: str):
+        with self._lock:
+            terms = self._doc_terms.pop(doc_id, None)
+            if terms is None:
+                return
+            for term in terms:
+                posting = self._postings.get(term)
+                if posting is not None:
+                    posting.pop(doc_id, None)
+                    if not posting:
+                        del self._postings[term]
+            self._total_length -= self._doc_lengths.pop(doc_id)
+
+    def _add_terms(self, doc_id: str, terms: Dict[str, int]):
+        with self._lock:
+            if doc_id in self._doc_terms:
+                self.remove(doc_id)
+            self._doc_terms[doc_id] = terms
+            length = sum(terms.values())
+            self._doc_lengths[doc_id] = length
+            self._total_length += length
+            for term, frequency in terms.items():
+                self._postings.setdefault(term, {})[doc_id] = frequency
+
+    def search(self, query: str, k: int,
+               doc_filter: Optional[Callable[[str], bool]] = None) -> List[Tuple[str, float]]:
+        """Return up to k (doc id, BM25 score) pairs, best first, keeping only ids accepted by doc_filter"""
+        query_terms = set(tokenize(query))
+        with self._lock:
+            doc_count = len(self._doc_lengths)
+            if not doc_count or not query_terms:
+                return []
+            avg_length = self._total_length / doc_count
+            scores: Dict[str, float] = {}
+            for term in query_terms:
+                posting = self._postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (doc_count - len(posting) + 0.5) / (len(posting) + 0.5))
+                for doc_id, frequency in posting.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        results = scores.items() if doc_filter is None else [item for item in scores.items() if doc_filter(item[0])]
+        return sorted(results, key=lambda item: item[1], reverse=True)[:k]
+
+    def contains_all(self, doc_id: str, tokens: Set[str]) -> bool:
+        """True if the document contains every given token"""
+        with self._lock:
+            terms = self._doc_terms.get(doc_id, {})
+            return all(token in terms for token in tokens)
+
+    def save(self, folder_path: str):
+        with self._lock:
+            payload = {"k1": self.k1, "b": self.b, "docs": self._doc_terms}
+        with open(os.path.join(folder_path, LEXICAL_INDEX_FILE), "w") as f:
+            json.dump(payload, f, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, folder_path: str) -> "BM25Index":
+        with open(os.path.join(folder_path, LEXICAL_INDEX_FILE), "r") as f:
+            payload = json.load(f)
+        index = cls(k1=payload["k1"], b=payload["b"])
+        for doc_id, terms in payload["docs"].items():
+            index._add_terms(doc_id, terms)
+        return index
+
+    @classmethod
+    def from_vector_store(cls, vector_store) -> "BM25Index":
+        """Build the index from the chunks already stored in a FAISS docstore"""
+        index = cls()
+        for docstore_id in vector_store.index_to_docstore_id.values():
+            doc = vector_store.docstore.search(docstore_id)
+            if hasattr(doc, "page_content"):
+                index.add(docstore_id, doc.page_content)
+        return index
@@ -1,23 +1,67 @@
+import asyncio
+import json
 import logging
+import os
+import time
 from datetime import datetime
-from fastapi import FastAPI, HTTPException
+from typing import List, Optional
+from fastapi import FastAPI, HTTPException, Request, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 
-from models import QueryRequest, QueryResponse, SearchRequest, SearchResult
+from models import (
+    QueryRequest, QueryResponse, SearchRequest, SearchResult,
+    BatchQueryRequest, BatchQueryResult, BatchQueryResponse
+)
 from knowledge_processor import KnowledgeBaseProcessor
-from rag_system import SmartCityRAG
+from rag_system import SmartCityRAG, preload_model
 from crew_agents import SmartCityAgents
+from executor import BoundedExecutor, OverloadedError, DeadlineExceededError
+from reloader import KnowledgeBaseReloader, ReloadInProgressError
+from history_store import create_history_store
+from response_cache import normalize_question
+from metrics import REGISTRY, HTTP_REQUEST_SECONDS, ERRORS, start_request_timing, server_timing_header
 from config import settings
 
 # Setup logging
 logging.basicConfig(level=getattr(logging, settings.LOG_LEVEL))
 logger = logging.getLogger(__name__)
 
-# Global variables
-knowledge_processor = KnowledgeBaseProcessor()
+# Global variables, populated by the background initialization started on startup
+knowledge_processor = None
 rag_system = None
 crew_agents = None
-conversation_history = {}
+reloader = None
+watch_task = None
+init_task = None
+history_store = None
+
+# Readiness of each initialization step: "pending", "ready", "skipped" or "failed: <reason>"
+readiness = {
+    "embeddings": "pending",
+    "index": "pending",
+    "llm": "pending",
+    "rag": "pending",
+    "warmup": "pending"
+}
+# Steps that must succeed before the instance takes traffic
+REQUIRED_STEPS = ("embeddings", "index", "rag")
+
+# Bounded pools so blocking retrieval and generation never run on the event loop
+retrieval_pool = BoundedExecutor(
+    "retrieval",
+    max_workers=settings.RETRIEVAL_WORKERS,
+    max_queue_depth=settings.MAX_QUEUE_DEPTH,
+    default_timeout=settings.SEARCH_TIMEOUT,
+    retry_after=settings.RETRY_AFTER_SECONDS
+)
+generation_pool = BoundedExecutor(
+    "generation",
+    max_workers=settings.GENERATION_WORKERS,
+    max_queue_depth=settings.MAX_QUEUE_DEPTH,
+    default_timeout=settings.REQUEST_TIMEOUT,
+    retry_after=settings.RETRY_AFTER_SECONDS
+)
 
 # Initialize FastAPI app
 app = FastAPI(title="Smart City Information Assistant", version="1.0.0")
@@ -30,36 +74,224 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize the system on startup"""
-    global rag_system, crew_agents
+@app.exception_handler(OverloadedError)
+async def overloaded_handler(request: Request, exc: OverloadedError):
+    """Shed load with 503 and a Retry-After hint when a pool queue is full"""
+    logger.warning(f"Rejected {request.url.path}: {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.exception_handler(DeadlineExceededError)
+async def deadline_handler(request: Request, exc: DeadlineExceededError):
+    """Report requests that ran past their deadline"""
+    logger.warning(f"Deadline exceeded for {request.url.path}: {exc}")
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    """Collect per-stage timings for each request and report them in a Server-Timing header"""
+    start = time.perf_counter()
+    timings = start_request_timing()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+    
+    # Label by route template so path parameters such as user ids do not explode cardinality
+    route = request.scope.get("route")
+    path = route.path if route is not None else "unmatched"
+    HTTP_REQUEST_SECONDS.observe(elapsed, method=request.method, path=path, status=str(response.status_code))
+    if response.status_code >= 500 and path != "/ready":
+        ERRORS.inc(component="http")
+    
+    # Streaming responses only cover the stages finished before the first byte
+    response.headers["Server-Timing"] = server_timing_header(timings, elapsed)
+    return response
+
+def _collect_component_metrics():
+    """Scrape-time samples from caches, worker pools, the LLM client, the embedding batcher and coalescing"""
+    caches = {}
+    if rag_system:
+        caches["response"] = rag_system.response_cache.stats()
+        caches["retrieval"] = rag_system.retrieval_cache.stats()
+        for name, flight in (("query", rag_system.query_flight), ("search", rag_system.search_flight)):
+            stats = flight.stats()
+            yield ("smartcity_coalesced_requests_total", "counter",
+                   "Requests that joined an identical in-flight request", {"flight": name}, stats["coalesced"])
+        if rag_system.context_assembler:
+            stats = rag_system.context_assembler.stats()
+            yield ("smartcity_context_tokens_total", "counter",
+                   "Prompt context tokens: as assembled, and as naive top-k stuffing would have sent",
+                   {"kind": "assembled"}, stats["context_tokens"])
+            yield ("smartcity_context_tokens_total", "counter",
+                   "Prompt context tokens: as assembled, and as naive top-k stuffing would have sent",
+                   {"kind": "baseline"}, stats["baseline_tokens"])
+    if knowledge_processor:
+        caches["embedding"] = knowledge_processor.embeddings.stats()
+        if knowledge_processor.embedding_batcher:
+            stats = knowledge_processor.embedding_batcher.stats()
+            yield ("smartcity_embedding_batches_total", "counter", "Embedding batches encoded", {}, stats["batches"])
+            yield ("smartcity_embedding_queue_depth", "gauge", "Queries waiting to be embedded", {}, stats["queued"])
+    
+    for name, stats in caches.items():
+        yield ("smartcity_cache_hits_total", "counter", "Cache hits", {"cache": name}, stats["hits"])
+        yield ("smartcity_cache_misses_total", "counter", "Cache misses", {"cache": name}, stats["misses"])
+        yield ("smartcity_cache_entries", "gauge", "Entries currently cached", {"cache": name}, stats["entries"])
+    
+    for pool in (retrieval_pool, generation_pool):
+        stats = pool.stats()
+        labels = {"pool": pool.name}
+        yield ("smartcity_pool_queue_depth", "gauge", "Requests waiting for a worker", labels, stats["queued"])
+        yield ("smartcity_pool_in_flight", "gauge", "Requests running on a worker", labels, stats["in_flight"])
+        yield ("smartcity_pool_rejected_total", "counter", "Requests shed with 503", labels, stats["rejected"])
+        yield ("smartcity_pool_timed_out_total", "counter", "Requests that hit their deadline", labels, stats["timed_out"])
+    
+    llm_client = getattr(rag_system.llm, "client", None) if rag_system else None
+    if llm_client:
+        stats = llm_client.stats()
+        yield ("smartcity_llm_in_flight", "gauge", "Generations running in Ollama", {}, stats["in_flight"])
+        yield ("smartcity_llm_queue_depth", "gauge", "Generations waiting for a slot", {}, stats["queued"])
+        yield ("smartcity_llm_retries_total", "counter", "Ollama requests retried", {}, stats["retries"])
+        yield ("smartcity_llm_timeouts_total", "counter", "Ollama calls that hit their deadline", {}, stats["timeouts"])
+    
+    yield ("smartcity_ready", "gauge", "1 when the instance is ready for traffic", {}, 1 if is_ready() else 0)
+
+REGISTRY.register_collector(_collect_component_metrics)
+
+async def _run_step(name: str, fn, *args):
+    """Run one blocking initialization step in a thread and record its outcome"""
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    try:
+        result = await loop.run_in_executor(None, fn, *args)
+        readiness[name] = "ready"
+        logger.info(f"Startup step '{name}' finished in {loop.time() - start:.1f}s")
+        return result
+    except Exception as e:
+        readiness[name] = f"failed: {e}"
+        logger.error(f"Startup step '{name}' failed: {e}")
+        raise
+
+async def initialize_system():
+    """Load the model, index and LLM concurrently, then assemble the RAG and agent layers"""
+    global knowledge_processor, rag_system, crew_agents, reloader, watch_task
     
     logger.info("Initializing Smart City Assistant...")
+    knowledge_processor = KnowledgeBaseProcessor()
+    
+    async def preload_llm():
+        if not settings.OLLAMA_PRELOAD:
+            readiness["llm"] = "skipped"
+            return
+        try:
+            await _run_step("llm", preload_model)
+        except Exception:
+            pass  # The LLM is optional for readiness; /search keeps working without it
+    
+    # The index can be opened while the embedding model loads; both wait on the model only if a rebuild is needed
+    results = await asyncio.gather(
+        _run_step("embeddings", knowledge_processor.embedding_model.load),
+        _run_step("index", knowledge_processor.load_from_file, settings.KNOWLEDGE_BASE_PATH),
+        preload_llm(),
+        return_exceptions=True
+    )
+    if any(isinstance(result, Exception) for result in results):
+        logger.error("System initialization failed; /ready will report the failing steps")
+        return
+    vector_store = results[1]
     
     try:
-        # Load knowledge base from file
-        vector_store = knowledge_processor.load_from_file(settings.KNOWLEDGE_BASE_PATH)
-        
         # Initialize RAG system
-        rag_system = SmartCityRAG(vector_store)
-        
-        # Initialize CrewAI agents
-        crew_agents = SmartCityAgents(rag_system)
+        rag = SmartCityRAG(
+            vector_store,
+            index_version=knowledge_processor.index_version,
+            lexical_index=knowledge_processor.lexical_index,
+            field_index=knowledge_processor.field_index,
+            partitions=knowledge_processor.partitions
+        )
         
-        logger.info("System initialized successfully!")
+        # Initialize CrewAI agents; they reach the index through rag_system, so reloads carry over
+        crew = SmartCityAgents(rag)
+        readiness["rag"] = "ready"
     except Exception as e:
+        readiness["rag"] = f"failed: {e}"
         logger.error(f"Startup error: {e}")
+        return
+    
+    if settings.WARMUP_ON_STARTUP:
+        try:
+            await _run_step("warmup", rag.warmup)
+        except Exception:
+            pass  # A failed warmup only means the first request pays the cold start
+    else:
+        readiness["warmup"] = "skipped"
+    
+    rag_system, crew_agents = rag, crew
+    # Answers precomputed against an older knowledge base are regenerated in the background
+    rag_system.refresh_precomputed_answers()
+    reloader = KnowledgeBaseReloader(knowledge_processor, rag_system, settings.KNOWLEDGE_BASE_PATH)
+    if settings.KB_WATCH_INTERVAL > 0:
+        watch_task = asyncio.create_task(reloader.watch(settings.KB_WATCH_INTERVAL))
+    elif settings.API_WORKERS > 1:
+        logger.warning("KB_WATCH_INTERVAL is 0: /admin/reload only reloads the worker that receives it")
+    
+    logger.info(f"System initialized successfully! (worker pid {os.getpid()})")
+
+def is_ready() -> bool:
+    return rag_system is not None and all(readiness[step] == "ready" for step in REQUIRED_STEPS)
+
+@app.on_event("startup")
+async def startup_event():
+    """Start initialization in the background so the server binds immediately"""
+    global init_task, history_store
+    history_store = create_history_store(settings)
+    init_task = asyncio.create_task(initialize_system())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release worker pools on shutdown"""
+    for task in (init_task, watch_task):
+        if task:
+            task.cancel()
+    retrieval_pool.shutdown()
+    generation_pool.shutdown()
+    if crew_agents:
+        crew_agents.shutdown()
+    if rag_system:
+        rag_system.response_cache.save()
+    if history_store:
+        history_store.close()
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
+    """Liveness check: the process is up and serving, whether or not initialization has finished"""
+    if is_ready():
+        status = "healthy"
+    elif any(state.startswith("failed") for state in readiness.values()):
+        status = "degraded"
+    else:
+        status = "starting"
     return {
-        "status": "healthy",
+        "status": status,
         "timestamp": datetime.now().isoformat(),
         "version": "1.0.0"
     }
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness check: 200 only once the index, embeddings and RAG system are usable"""
+    ready = is_ready()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "ready": ready,
+            "steps": readiness,
+            "index_version": rag_system.index_version if rag_system else None,
+            "timestamp": datetime.now().isoformat()
+        }
+    )
+
 @app.post("/query", response_model=QueryResponse)
 async def query_endpoint(request: QueryRequest):
     """Main query endpoint"""
@@ -67,59 +299,183 @@ async def query_endpoint(request: QueryRequest):
         if not rag_system:
             raise HTTPException(status_code=503, detail="System not initialized")
         
-        result = rag_system.query(request.question)
+        categories = _check_categories(request.categories)
+        result = await generation_pool.run(rag_system.query, request.question, categories)
         
-        if request.user_id not in conversation_history:
-            conversation_history[request.user_id] = []
-        
-        conversation_history[request.user_id].append({
-            "question": request.question,
-            "answer": result["answer"],
-            "timestamp": datetime.now().isoformat()
-        })
+        _record_history(request.user_id, request.question, result["answer"], result.get("answer_path"))
         
         return QueryResponse(
             answer=result["answer"],
             confidence=result["confidence"],
             sources=result["sources"],
+            answer_path=result.get("answer_path", "llm"),
             timestamp=datetime.now().isoformat()
         )
         
+    except (HTTPException, OverloadedError, DeadlineExceededError):
+        raise
     except Exception as e:
         logger.error(f"Query endpoint error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/query/batch", response_model=BatchQueryResponse)
+async def query_batch_endpoint(request: BatchQueryRequest):
+    """Answer several questions with one shared retrieval pass and bounded concurrent generation"""
+    if not rag_system:
+        raise HTTPException(status_code=503, detail="System not initialized")
+    if not request.questions or len(request.questions) > settings.BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"A batch must contain between 1 and {settings.BATCH_MAX_QUESTIONS} questions"
+        )
+    
+    categories = _check_categories(request.categories)
+    plan = await retrieval_pool.run(rag_system.prepare_batch, request.questions, categories)
+    semaphore = asyncio.Semaphore(settings.BATCH_GENERATION_CONCURRENCY)
+    
+    async def answer(question: str, item: dict) -> dict:
+        if "answer" in item:
+            return item
+        async with semaphore:
+            return await generation_pool.run(
+                rag_system.answer_from_documents, question, item["source_documents"], plan["index_version"]
+            )
+    
+    # Repeated questions share one generation; each item succeeds or fails on its own
+    tasks = {}
+    for question, item in zip(request.questions, plan["items"]):
+        key = normalize_question(question)
+        if key not in tasks:
+            tasks[key] = asyncio.ensure_future(answer(question, item))
+    outcomes = await asyncio.gather(
+        *(tasks[normalize_question(question)] for question in request.questions),
+        return_exceptions=True
+    )
+    
+    results = []
+    for question, outcome in zip(request.questions, outcomes):
+        if isinstance(outcome, BaseException):
+            logger.warning(f"Batch item failed for '{question}': {outcome!r}")
+            results.append(BatchQueryResult(question=question, error=str(outcome) or type(outcome).__name__))
+            continue
+        _record_history(request.user_id, question, outcome["answer"], outcome.get("answer_path"))
+        results.append(BatchQueryResult(
+            question=question,
+            answer=outcome["answer"],
+            confidence=outcome["confidence"],
+            sources=outcome["sources"],
+            answer_path=outcome.get("answer_path")
+        ))
+    
+    return BatchQueryResponse(
+        results=results,
+        retrieved_chunks=plan["retrieved_chunks"],
+        unique_chunks=plan["unique_chunks"],
+        timestamp=datetime.now().isoformat()
+    )
+
+def _check_categories(categories: Optional[List[str]]) -> Optional[List[str]]:
+    """Reject unknown source categories with 422 rather than silently retrieving nothing"""
+    if not categories:
+        return None
+    known = rag_system.categories()
+    unknown = sorted(set(categories) - set(known))
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown categories {unknown}; available: {sorted(known)}")
+    return categories
+
+def _record_history(user_id: Optional[str], question: str, answer: str, answer_path: Optional[str]):
+    """Queue a history entry; anonymous requests are not recorded"""
+    if user_id and history_store:
+        history_store.append(user_id, question, answer, answer_path)
+
+def _format_sse(event: str, data: dict) -> str:
+    """Format a single server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/query/stream")
+async def query_stream_endpoint(request: QueryRequest):
+    """Streaming query endpoint: sources first, then answer tokens, then a final summary"""
+    if not rag_system:
+        raise HTTPException(status_code=503, detail="System not initialized")
+    
+    # Admission control runs here so an overloaded pool still returns a plain 503
+    events = generation_pool.stream(rag_system.stream_query, request.question, _check_categories(request.categories))
+    
+    async def event_source():
+        answer_parts = []
+        try:
+            async for event in events:
+                if event["event"] == "token":
+                    answer_parts.append(event["data"]["text"])
+                elif event["event"] == "done":
+                    _record_history(request.user_id, request.question, "".join(answer_parts),
+                                    event["data"].get("answer_path"))
+                    event["data"]["timestamp"] = datetime.now().isoformat()
+                yield _format_sse(event["event"], event["data"])
+        except DeadlineExceededError as e:
+            logger.warning(f"Streaming query deadline exceeded: {e}")
+            yield _format_sse("error", {"detail": str(e)})
+        except Exception as e:
+            logger.error(f"Streaming query error: {e}")
+            yield _format_sse("error", {"detail": str(e)})
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/query-crew")
 async def query_crew_endpoint(request: QueryRequest):
     """Query endpoint using CrewAI multi-agent system"""
+    if not crew_agents:
+        raise HTTPException(status_code=503, detail="CrewAI system not initialized")
+    # The crew, its tools and the fallback all stay within the requested categories
+    categories = _check_categories(request.categories)
+    rag_result = None
     try:
-        if not crew_agents:
-            raise HTTPException(status_code=503, detail="CrewAI system not initialized")
+        # First get a RAG result for fallback and confidence scoring; the crew reuses it
+        rag_result = await generation_pool.run(rag_system.query, request.question, categories)
         
-        # First get a RAG result for fallback and confidence scoring
-        rag_result = rag_system.query(request.question)
+        # Field lookups are already exact; the agents would only restate them
+        if rag_result.get("answer_path") == "fields":
+            return {
+                "answer": rag_result["answer"],
+                "confidence": rag_result["confidence"],
+                "sources": rag_result["sources"],
+                "method": "Structured Fields",
+                "answer_path": "fields",
+                "timestamp": datetime.now().isoformat()
+            }
         
         # Try to get result from CrewAI
-        crew_result = crew_agents.process_query(request.question)
+        crew_result = await generation_pool.run(crew_agents.process_query, request.question, rag_result, categories)
         
         return {
             "answer": crew_result,
             "confidence": rag_result["confidence"],
             "sources": rag_result["sources"],
             "method": "CrewAI Multi-Agent",
+            # High-confidence RAG answers are returned by the crew unchanged
+            "answer_path": rag_result.get("answer_path", "llm") if crew_result == rag_result["answer"] else "crew",
             "timestamp": datetime.now().isoformat()
         }
         
+    except (HTTPException, OverloadedError, DeadlineExceededError):
+        raise
     except Exception as e:
         logger.error(f"CrewAI query error: {e}")
-        # Return RAG result as fallback
+        # Return RAG result as fallback, only querying again if the first attempt never finished
         if rag_system:
-            rag_result = rag_system.query(request.question)
+            if rag_result is None:
+                rag_result = await generation_pool.run(rag_system.query, request.question, categories)
             return {
                 "answer": rag_result["answer"],
                 "confidence": rag_result["confidence"],
                 "sources": rag_result["sources"],
                 "method": "RAG Fallback",
+                "answer_path": rag_result.get("answer_path", "llm"),
                 "timestamp": datetime.now().isoformat()
             }
         else:
@@ -127,14 +483,17 @@ async def query_crew_endpoint(request: QueryRequest):
 
 @app.post("/search")
 async def search_endpoint(request: SearchRequest):
-    """Vector search endpoint"""
+    """Vector search endpoint; each result's score_type says whether a higher or lower score is better"""
     try:
         if not rag_system:
             raise HTTPException(status_code=503, detail="System not initialized")
         
-        docs = rag_system.vector_store.similarity_search_with_score(
+        score_type = rag_system.score_type()
+        docs = await retrieval_pool.run(
+            rag_system.search,
             request.query, 
-            k=request.top_k
+            k=request.top_k,
+            categories=_check_categories(request.categories)
         )
         
         results = []
@@ -142,21 +501,89 @@ async def search_endpoint(request: SearchRequest):
             results.append(SearchResult(
                 content=doc.page_content,
                 metadata=doc.metadata,
-                score=float(score)
+                score=float(score),
+                score_type=score_type
             ))
         
         return {"results": results}
         
+    except (HTTPException, OverloadedError, DeadlineExceededError):
+        raise
     except Exception as e:
         logger.error(f"Search endpoint error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/categories")
+async def categories_endpoint():
+    """Source categories that /search and /query can be filtered by, with their chunk counts"""
+    if not rag_system:
+        raise HTTPException(status_code=503, detail="System not initialized")
+    return {"categories": rag_system.categories()}
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/stats")
+async def stats_endpoint():
+    """Cache and worker pool statistics"""
+    return {
+        "response_cache": rag_system.response_cache.stats() if rag_system else None,
+        "precomputed_answers": rag_system.answer_store.stats(rag_system.index_version)
+            if rag_system and rag_system.answer_store else None,
+        "coalescing": {
+            "query": rag_system.query_flight.stats(),
+            "search": rag_system.search_flight.stats()
+        } if rag_system else None,
+        "pools": {
+            "retrieval": retrieval_pool.stats(),
+            "generation": generation_pool.stats()
+        },
+        "embedding_batcher": knowledge_processor.embedding_batcher.stats()
+            if knowledge_processor and knowledge_processor.embedding_batcher else None,
+        "embedding_cache": knowledge_processor.embeddings.stats() if knowledge_processor else None,
+        "retrieval_cache": rag_system.retrieval_cache.stats() if rag_system else None,
+        "history": history_store.stats() if history_store else None,
+        "context_assembly": rag_system.context_assembler.stats()
+            if rag_system and rag_system.context_assembler else None,
+        "llm": rag_system.llm.client.stats()
+            if rag_system and getattr(rag_system.llm, "client", None) else None,
+        "index": knowledge_processor.index_report if knowledge_processor else None,
+        "ingestion": knowledge_processor.ingestion.snapshot()
+            if knowledge_processor and knowledge_processor.ingestion else None,
+        "index_version": rag_system.index_version if rag_system else None
+    }
+
+@app.post("/admin/reload")
+async def reload_endpoint(force: bool = False, x_admin_token: Optional[str] = Header(default=None)):
+    """Rebuild the vector store in the background and swap it in without downtime"""
+    if settings.ADMIN_TOKEN and x_admin_token != settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    if not reloader:
+        raise HTTPException(status_code=503, detail="System not initialized")
+    
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(None, reloader.reload, force)
+    except ReloadInProgressError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"Reload error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/history/{user_id}")
-async def get_conversation_history(user_id: str):
-    """Get conversation history for a user"""
+async def get_conversation_history(user_id: str, cursor: Optional[int] = None,
+                                   limit: int = Query(default=settings.HISTORY_PAGE_SIZE, ge=1, le=100)):
+    """Get a page of conversation history for a user, newest page first; pass next_cursor for older entries"""
+    if not history_store:
+        raise HTTPException(status_code=503, detail="History store not initialized")
+    loop = asyncio.get_running_loop()
+    entries, next_cursor = await loop.run_in_executor(None, history_store.page, user_id, cursor, limit)
     return {
         "user_id": user_id,
-        "history": conversation_history.get(user_id, [])
+        "history": entries,
+        "next_cursor": next_cursor
     }
 
 if __name__ == "__main__":
@@ -0,0 +1,230 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain.schema import LLMResult
+
+from context_assembly import estimate_tokens
+
+# Seconds; wide enough to cover sub-millisecond cache hits and multi-second generations
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# A collector returns (name, type, help, labels, value) samples computed at scrape time
+Sample = Tuple[str, str, str, Dict[str, str], float]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(dict(zip(self.labelnames, key)))} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels"""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            # Per series: one count per bucket, then sum and total count
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series_items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in series_items:
+            labels = dict(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {int(count)}")
+            lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {int(series[-1])}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {int(series[-1])}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds metrics and scrape-time collectors, and renders the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: List[Any] = []
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterable[Sample]]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+
+        # Samples from collectors are grouped by metric name so each gets one HELP/TYPE header
+        grouped: Dict[str, Tuple[str, str, List[Tuple[Dict[str, str], float]]]] = {}
+        for collector in self._collectors:
+            for name, metric_type, help_text, labels, value in collector():
+                if value is None:
+                    continue
+                grouped.setdefault(name, (metric_type, help_text, []))[2].append((labels, value))
+        for name, (metric_type, help_text, samples) in grouped.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "smartcity_stage_duration_seconds", "Time spent in each processing stage", ["stage"]
+)
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "smartcity_http_request_duration_seconds", "Time to response headers per endpoint", ["method", "path", "status"]
+)
+ERRORS = REGISTRY.counter("smartcity_errors_total", "Errors by component", ["component"])
+ANSWER_PATHS = REGISTRY.counter("smartcity_answers_total", "Answers by the path that produced them", ["path"])
+LLM_CALLS = REGISTRY.counter("smartcity_llm_calls_total", "LLM generations by outcome", ["outcome"])
+LLM_TOKENS = REGISTRY.counter(
+    "smartcity_llm_tokens_total", "LLM tokens in (prompt) and out (completion)", ["direction"]
+)
+INDEX_LOADS = REGISTRY.counter("smartcity_index_loads_total", "Vector store loads by mode", ["mode"])
+CREW_RUNS = REGISTRY.counter("smartcity_crew_runs_total", "CrewAI queries by outcome", ["outcome"])
+CATEGORY_SEARCHES = REGISTRY.counter(
+    "smartcity_category_searches_total",
+    "Dense searches by scope: filtered by the caller, routed to some categories, or over all of them", ["scope"]
+)
+
+# Stage durations of the current request, in seconds; shared with worker threads via copied contexts
+_request_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+
+def start_request_timing() -> Dict[str, float]:
+    """Begin collecting stage timings for the current request"""
+    timings: Dict[str, float] = {}
+    _request_timings.set(timings)
+    return timings
+
+
+def record_stage(stage: str, seconds: float):
+    """Record a stage duration globally and, inside a request, for its Server-Timing header"""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+def server_timing_header(timings: Dict[str, float], total_seconds: float) -> str:
+    """Render stage timings as a Server-Timing header value, in milliseconds"""
+    entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items()]
+    entries.append(f"total;dur={total_seconds * 1000:.1f}")
+    return ", ".join(entries)
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """Times LLM calls and counts tokens, preferring the counts Ollama reports over estimates"""
+
+    def __init__(self):
+        self._runs: Dict[Any, Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id=None, **kwargs: Any):
+        with self._lock:
+            self._runs[run_id] = (time.perf_counter(), sum(estimate_tokens(prompt) for prompt in prompts))
+
+    def _finish(self, run_id) -> Tuple[Optional[float], int]:
+        with self._lock:
+            start, prompt_tokens = self._runs.pop(run_id, (None, 0))
+        if start is not None:
+            record_stage("llm", time.perf_counter() - start)
+        return start, prompt_tokens
+
+    def on_llm_end(self, response: LLMResult, *, run_id=None, **kwargs: Any):
+        _, prompt_tokens = self._finish(run_id)
+        tokens_in, tokens_out = 0, 0
+        for generations in response.generations:
+            for generation in generations:
+                info = generation.generation_info or {}
+                tokens_in += info.get("prompt_eval_count") or 0
+                tokens_out += info.get("eval_count") or estimate_tokens(generation.text)
+        LLM_TOKENS.inc(tokens_in or prompt_tokens, direction="in")
+        LLM_TOKENS.inc(tokens_out, direction="out")
+        LLM_CALLS.inc(outcome="success")
+
+    def on_llm_error(self, error: BaseException, *, run_id=None, **kwargs: Any):
+        self._finish(run_id)
+        LLM_CALLS.inc(outcome="error")
+        ERRORS.inc(component="llm")
@@ -4,19 +4,43 @@ from datetime import datetime
 
 class QueryRequest(BaseModel):
     question: str
-    user_id: Optional[str] = "default"
+    user_id: Optional[str] = None  # History is only kept for requests that identify a user
+    categories: Optional[List[str]] = None  # Source categories to retrieve from; all when omitted
 
 class QueryResponse(BaseModel):
     answer: str
     confidence: float
     sources: List[str]
+    answer_path: str = "llm"  # "fields", "precomputed", "cache" or "llm"
+    timestamp: str
+
+class BatchQueryRequest(BaseModel):
+    questions: List[str]
+    user_id: Optional[str] = None
+    categories: Optional[List[str]] = None
+
+class BatchQueryResult(BaseModel):
+    question: str
+    answer: Optional[str] = None
+    confidence: float = 0.0
+    sources: List[str] = []
+    answer_path: Optional[str] = None
+    error: Optional[str] = None
+
+class BatchQueryResponse(BaseModel):
+    results: List[BatchQueryResult]
+    retrieved_chunks: int
+    unique_chunks: int
     timestamp: str
 
 class SearchRequest(BaseModel):
     query: str
     top_k: int = 5
+    categories: Optional[List[str]] = None
 
 class SearchResult(BaseModel):
     content: str
     metadata: Dict[str, Any]
-    score: float
\ No newline at end of file
+    score: float
+    # "rrf": hybrid rank-fusion score, higher is better; "distance": dense L2 distance, lower is better
+    score_type: str = "distance"
\ No newline at end of file
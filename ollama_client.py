@@ -0,0 +1,296 @@
+import json
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from langchain.callbacks.manager import CallbackManagerForLLMRun
+from langchain.llms.base import BaseLLM
+from langchain.schema.output import Generation, GenerationChunk, LLMResult
+
+from executor import DeadlineExceededError, remaining_time
+from metrics import record_stage
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Status codes worth another attempt: overloaded or briefly unavailable server
+_RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class FairSemaphore:
+    """Counting semaphore that hands free slots to waiters strictly in arrival order"""
+
+    def __init__(self, value: int):
+        self._value = value
+        self._lock = threading.Lock()
+        self._waiters: Deque[threading.Event] = deque()
+
+    @property
+    def waiting(self) -> int:
+        with self._lock:
+            return len(self._waiters)
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        with self._lock:
+            if self._value > 0 and not self._waiters:
+                self._value -= 1
+                return True
+            waiter = threading.Event()
+            self._waiters.append(waiter)
+        if waiter.wait(timeout):
+            return True
+        with self._lock:
+            if waiter.is_set():
+                # The slot was handed over just as the wait timed out
+                return True
+            self._waiters.remove(waiter)
+        return False
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                # Pass the slot straight to the oldest waiter so late arrivals cannot overtake it
+                self._waiters.popleft().set()
+            else:
+                self._value += 1
+
+
+class OllamaClient:
+    """HTTP client for Ollama's generate API with pooled connections and a cap on concurrent generations.
+
+    Waiting for a generation slot and every HTTP attempt are bounded by the
+    deadline of the pool work item that made the call (see executor.remaining_time).
+    Connection errors and overload responses are retried with jittered backoff
+    while the deadline allows; read timeouts are not, since the model is busy.
+    """
+
+    def __init__(self, base_url: str, model: str, keep_alive: str = "30m", max_concurrency: int = 2,
+                 connect_timeout: float = 5, read_timeout: float = 120, max_retries: int = 2,
+                 retry_backoff: float = 0.5):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.keep_alive = keep_alive
+        self.max_concurrency = max_concurrency
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._slots = FairSemaphore(max_concurrency)
+        self._session = requests.Session()
+        # A few spare connections for preloads and tag checks beside the generations
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency + 2)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.requests = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    def _payload(self, prompt: str, options: Optional[Dict[str, Any]], model: Optional[str],
+                 stream: bool) -> Dict[str, Any]:
+        payload = {
+            "model": model or self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+        }
+        if options:
+            payload["options"] = options
+        return payload
+
+    def _count(self, field: str):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def _deadline_exceeded(self, timeout: Optional[float]) -> DeadlineExceededError:
+        self._count("timeouts")
+        return DeadlineExceededError("ollama", timeout or 0.0)
+
+    def _acquire(self):
+        remaining = remaining_time()
+        start = time.perf_counter()
+        acquired = self._slots.acquire(None if remaining is None else max(0.0, remaining))
+        record_stage("llm_queue", time.perf_counter() - start)
+        if not acquired:
+            raise self._deadline_exceeded(time.perf_counter() - start)
+        with self._lock:
+            self.in_flight += 1
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def _post(self, payload: Dict[str, Any], stream: bool) -> requests.Response:
+        """POST to /api/generate, retrying connection failures and overload responses"""
+        attempt = 0
+        while True:
+            remaining = remaining_time()
+            if remaining is not None and remaining <= 0:
+                raise self._deadline_exceeded(None)
+            read_timeout = self.read_timeout if remaining is None else min(self.read_timeout, remaining)
+            connect_timeout = self.connect_timeout if remaining is None else min(self.connect_timeout, remaining)
+            self._count("requests")
+            try:
+                response = self._session.post(f"{self.base_url}/api/generate", json=payload, stream=stream,
+                                              timeout=(connect_timeout, read_timeout))
+                if response.status_code not in _RETRY_STATUSES:
+                    response.raise_for_status()
+                    return response
+                response.close()
+                error: Exception = requests.HTTPError(f"Ollama returned {response.status_code}", response=response)
+            except requests.ConnectionError as e:
+                error = e
+            except requests.Timeout:
+                if remaining is not None and read_timeout >= remaining:
+                    raise self._deadline_exceeded(read_timeout)
+                self._count("errors")
+                raise
+            except requests.RequestException:
+                self._count("errors")
+                raise
+
+            delay = self.retry_backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+            remaining = remaining_time()
+            if attempt >= self.max_retries or (remaining is not None and delay >= remaining):
+                self._count("errors")
+                raise error
+            attempt += 1
+            self._count("retries")
+            logger.warning(f"Ollama request failed ({error}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+            time.sleep(delay)
+
+    def generate(self, prompt: str, options: Optional[Dict[str, Any]] = None,
+                 model: Optional[str] = None) -> Dict[str, Any]:
+        """Run one generation and return Ollama's final response object"""
+        self._acquire()
+        try:
+            return self._post(self._payload(prompt, options, model, stream=False), stream=False).json()
+        finally:
+            self._release()
+
+    def stream(self, prompt: str, options: Optional[Dict[str, Any]] = None,
+               model: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Yield Ollama's streamed response objects; the last one has done=True and the token counts"""
+        self._acquire()
+        try:
+            response = self._post(self._payload(prompt, options, model, stream=True), stream=True)
+            with response:
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    remaining = remaining_time()
+                    if remaining is not None and remaining <= 0:
+                        raise self._deadline_exceeded(None)
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        self._count("errors")
+                        raise RuntimeError(f"Ollama error: {chunk['error']}")
+                    yield chunk
+                    if chunk.get("done"):
+                        return
+        finally:
+            self._release()
+
+    def preload(self, model: Optional[str] = None, timeout: float = 300) -> float:
+        """Load the model into memory and keep it resident for keep_alive; returns seconds taken"""
+        start = time.perf_counter()
+        response = self._session.post(
+            f"{self.base_url}/api/generate",
+            json={"model": model or self.model, "prompt": "", "keep_alive": self.keep_alive, "stream": False},
+            timeout=(self.connect_timeout, timeout)
+        )
+        response.raise_for_status()
+        return time.perf_counter() - start
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "base_url": self.base_url,
+                "model": self.model,
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self.in_flight,
+                "queued": self._slots.waiting,
+                "requests": self.requests,
+                "retries": self.retries,
+                "timeouts": self.timeouts,
+                "errors": self.errors,
+            }
+
+    def close(self):
+        self._session.close()
+
+
+_default_client: Optional[OllamaClient] = None
+_default_client_lock = threading.Lock()
+
+
+def default_client() -> OllamaClient:
+    """The process-wide client, so all callers share one connection pool and concurrency cap"""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = OllamaClient(
+                settings.OLLAMA_HOST,
+                settings.OLLAMA_MODEL,
+                keep_alive=settings.OLLAMA_KEEP_ALIVE,
+                max_concurrency=settings.OLLAMA_MAX_CONCURRENCY,
+                connect_timeout=settings.OLLAMA_CONNECT_TIMEOUT,
+                read_timeout=settings.OLLAMA_READ_TIMEOUT,
+                max_retries=settings.OLLAMA_MAX_RETRIES,
+                retry_backoff=settings.OLLAMA_RETRY_BACKOFF,
+            )
+        return _default_client
+
+
+class OllamaLLM(BaseLLM):
+    """LangChain LLM backed by an OllamaClient, reporting Ollama's token counts in generation_info"""
+
+    client: Any
+    model: Optional[str] = None
+    temperature: float = 0.1
+
+    @property
+    def _llm_type(self) -> str:
+        return "ollama-client"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model": self.model or self.client.model, "temperature": self.temperature}
+
+    def _options(self, stop: Optional[List[str]], kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        # Extra keyword arguments such as num_predict go straight into Ollama's options
+        options = {"temperature": self.temperature, **kwargs}
+        if stop:
+            options["stop"] = stop
+        return options
+
+    def _generate(self, prompts: List[str], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> LLMResult:
+        generations = []
+        for prompt in prompts:
+            response = self.client.generate(prompt, self._options(stop, kwargs), model=self.model)
+            generations.append([Generation(text=response.get("response", ""), generation_info={
+                "prompt_eval_count": response.get("prompt_eval_count"),
+                "eval_count": response.get("eval_count"),
+                "load_duration": response.get("load_duration"),
+            })])
+        return LLMResult(generations=generations)
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[GenerationChunk]:
+        for chunk in self.client.stream(prompt, self._options(stop, kwargs), model=self.model):
+            info = None
+            if chunk.get("done"):
+                info = {"prompt_eval_count": chunk.get("prompt_eval_count"), "eval_count": chunk.get("eval_count")}
+            generation = GenerationChunk(text=chunk.get("response", ""), generation_info=info)
+            if run_manager and generation.text:
+                run_manager.on_llm_new_token(generation.text, chunk=generation)
+            yield generation
@@ -0,0 +1,198 @@
+"""Local stand-in for the Ollama HTTP API, for tests and load experiments without a model.
+
+Implements POST /api/generate (streamed NDJSON or a single JSON object) and
+GET /api/tags. Latency, answer length, model load time, a concurrency limit and
+a rate of 503 failures are configurable, so the API's timeouts, retries and
+generation cap can be exercised:
+
+    python ollama_stub.py --port 11434 --latency-ms 20 --tokens 40 --load-ms 2000
+    OLLAMA_HOST=http://localhost:11434 python start_api.py
+
+A model counts as loaded until its keep_alive runs out; the next request pays
+--load-ms again, as with a real Ollama server.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+_DURATION_PATTERN = re.compile(r"^(-?\d+(?:\.\d+)?)(ms|s|m|h)?$")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600, None: 1}
+
+
+def parse_keep_alive(value: Any) -> float:
+    """Seconds a model stays loaded for a keep_alive value such as "30m", 300 or -1 (forever)"""
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        match = _DURATION_PATTERN.match(str(value).strip())
+        if not match:
+            return 300.0
+        seconds = float(match.group(1)) * _DURATION_UNITS[match.group(2)]
+    return float("inf") if seconds < 0 else seconds
+
+
+class StubState:
+    """Settings and shared state of one stub server"""
+
+    def __init__(self, latency_ms: float = 20, tokens: int = 40, load_ms: float = 0, fail_rate: float = 0,
+                 max_concurrency: int = 0):
+        self.latency = latency_ms / 1000
+        self.tokens = tokens
+        self.load = load_ms / 1000
+        self.fail_rate = fail_rate
+        self.max_concurrency = max_concurrency
+        self.lock = threading.Lock()
+        self.loaded_until: Dict[str, float] = {}
+        self.active = 0
+        self.peak_active = 0
+        self.requests = 0
+        self.failures = 0
+        self.connections = 0
+
+    def load_model(self, model: str, keep_alive: Any) -> float:
+        """Load the model if it is not resident and extend its residency; returns seconds spent loading"""
+        with self.lock:
+            loaded = self.loaded_until.get(model, 0) > time.monotonic()
+        load_seconds = 0.0 if loaded else self.load
+        if load_seconds:
+            time.sleep(load_seconds)
+        with self.lock:
+            self.loaded_until[model] = time.monotonic() + parse_keep_alive(keep_alive)
+        return load_seconds
+
+    def answer(self, prompt: str, limit: Optional[int]) -> List[str]:
+        words = ("Stub answer for: " + prompt[-200:].strip()).split()
+        count = min(self.tokens, limit) if limit is not None and limit >= 0 else self.tokens
+        return [words[i % len(words)] + " " for i in range(count)]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    state: StubState
+    # Keep connections open between requests, as Ollama does, so client connection reuse shows
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.state.lock:
+            self.state.connections += 1
+
+    def log_message(self, format: str, *args):
+        pass
+
+    def _send_json(self, status: int, body: Dict[str, Any]):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path != "/api/tags":
+            self._send_json(404, {"error": "not found"})
+            return
+        with self.state.lock:
+            models = [{"name": name} for name, until in self.state.loaded_until.items() if until > time.monotonic()]
+        self._send_json(200, {"models": models})
+
+    def do_POST(self):
+        if self.path != "/api/generate":
+            # The unread request body would otherwise be parsed as the next request
+            self.close_connection = True
+            self._send_json(404, {"error": "not found"})
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        state = self.state
+        with state.lock:
+            state.requests += 1
+            busy = state.max_concurrency and state.active >= state.max_concurrency
+            failed = busy or random.random() < state.fail_rate
+            if failed:
+                state.failures += 1
+            else:
+                state.active += 1
+                state.peak_active = max(state.peak_active, state.active)
+        if failed:
+            self._send_json(503, {"error": "server busy"})
+            return
+        try:
+            self._generate(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client gave up, e.g. on its deadline
+        finally:
+            with state.lock:
+                state.active -= 1
+
+    def _generate(self, body: Dict[str, Any]):
+        state = self.state
+        model = body.get("model", "stub")
+        start = time.perf_counter()
+        load_seconds = state.load_model(model, body.get("keep_alive", "5m"))
+        prompt = body.get("prompt", "")
+        # An empty prompt only loads the model, as Ollama does for preloading
+        words = state.answer(prompt, (body.get("options") or {}).get("num_predict")) if prompt else []
+        final = {
+            "model": model,
+            "done": True,
+            "prompt_eval_count": len(prompt.split()),
+            "eval_count": len(words),
+            "load_duration": int(load_seconds * 1e9),
+        }
+        if not body.get("stream", True):
+            time.sleep(state.latency * len(words))
+            final["response"] = "".join(words)
+            final["total_duration"] = int((time.perf_counter() - start) * 1e9)
+            self._send_json(200, final)
+            return
+
+        # The stream has no length, so its end is marked by closing the connection
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for word in words:
+            time.sleep(state.latency)
+            self.wfile.write((json.dumps({"model": model, "response": word, "done": False}) + "\n").encode())
+            self.wfile.flush()
+        final["response"] = ""
+        final["total_duration"] = int((time.perf_counter() - start) * 1e9)
+        self.wfile.write((json.dumps(final) + "\n").encode())
+
+
+def serve(port: int = 11434, host: str = "127.0.0.1", **options) -> ThreadingHTTPServer:
+    """Start a stub server in a background thread; stop it with server.shutdown()"""
+    handler = type("Handler", (StubHandler,), {"state": StubState(**options)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Stub Ollama server for tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Time per generated token")
+    parser.add_argument("--tokens", type=int, default=40, help="Tokens per answer unless num_predict is lower")
+    parser.add_argument("--load-ms", type=float, default=0.0, help="Model load time when it is not resident")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--max-concurrency", type=int, default=0,
+                        help="Answer 503 beyond this many concurrent generations (0 = unlimited)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    server = serve(args.port, args.host, latency_ms=args.latency_ms, tokens=args.tokens, load_ms=args.load_ms,
+                   fail_rate=args.fail_rate, max_concurrency=args.max_concurrency)
+    print(f"Stub Ollama listening on http://{args.host}:{args.port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
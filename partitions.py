@@ -0,0 +1,178 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+from vector_index import build_index, configure_search, read_index
+
+logger = logging.getLogger(__name__)
+
+PARTITIONS_FILE = "partitions.npz"
+_PARTITION_INDEX_FILE = "partition-{}.faiss"
+# Pre-filter selectors kept per category combination; building one costs a pass over its rows
+_MAX_SELECTORS = 32
+
+
+def _normalize(vector: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+class CategoryPartitions:
+    """Rows of a vector store grouped by source category, with optional per-category sub-indexes.
+
+    A filtered search only touches the sub-indexes of the requested categories, so
+    its cost follows the partition size rather than the corpus size. Categories
+    without a sub-index are searched in the main index through an ID selector,
+    which skips other categories' vectors but still walks the whole index. Sub-indexes
+    copy their vectors, so CATEGORY_PARTITIONS only builds them by default for
+    approximate index types; over a flat index the selector search is exact and free.
+    Each category also keeps the normalized centroid of its vectors for query routing.
+    """
+
+    def __init__(self, rows: Dict[str, np.ndarray], centroids: Dict[str, np.ndarray],
+                 indexes: Optional[Dict[str, Any]] = None):
+        self.rows = rows
+        self.centroids = centroids
+        self.indexes = indexes or {}
+        self.total = sum(len(category_rows) for category_rows in rows.values())
+        self._selectors: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def categories(self) -> List[str]:
+        return sorted(self.rows)
+
+    def sizes(self) -> Dict[str, int]:
+        return {category: len(self.rows[category]) for category in self.categories}
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, categories: Iterable[str],
+              params: Optional[Dict[str, Any]] = None) -> "CategoryPartitions":
+        """Group index rows by category; with index params, also build a sub-index of that type per category"""
+        codes: Dict[str, int] = {}
+        labels = np.fromiter((codes.setdefault(category, len(codes)) for category in categories), dtype=np.int32)
+        start = time.perf_counter()
+        rows, centroids, indexes = {}, {}, {}
+        for category, code in codes.items():
+            category_rows = np.flatnonzero(labels == code).astype(np.int64)
+            subset = np.ascontiguousarray(vectors[category_rows], dtype=np.float32)
+            rows[category] = category_rows
+            centroids[category] = _normalize(subset.mean(axis=0))
+            # A category holding every row would just duplicate the main index
+            if params is not None and len(category_rows) < len(labels):
+                indexes[category], _ = build_index(subset, params)
+        if indexes:
+            logger.info(f"Built {len(indexes)} category sub-indexes in {time.perf_counter() - start:.1f}s")
+        return cls(rows, centroids, indexes)
+
+    def save(self, folder_path: str):
+        names = self.categories
+        arrays = {"names": np.array(names, dtype=str)}
+        for i, name in enumerate(names):
+            arrays[f"rows_{i}"] = self.rows[name]
+            arrays[f"centroid_{i}"] = self.centroids[name]
+            if name in self.indexes:
+                faiss.write_index(self.indexes[name], os.path.join(folder_path, _PARTITION_INDEX_FILE.format(i)))
+        np.savez(os.path.join(folder_path, PARTITIONS_FILE), **arrays)
+
+    @classmethod
+    def load(cls, folder_path: str, mmap: bool = True, ef_search: int = 64,
+             nprobe: int = 16) -> Optional["CategoryPartitions"]:
+        """Open saved partitions, or None if the index was saved without them"""
+        path = os.path.join(folder_path, PARTITIONS_FILE)
+        if not os.path.exists(path):
+            return None
+        rows, centroids, indexes = {}, {}, {}
+        with np.load(path) as data:
+            for i, name in enumerate(str(name) for name in data["names"]):
+                rows[name] = data[f"rows_{i}"]
+                centroids[name] = data[f"centroid_{i}"]
+                index_path = os.path.join(folder_path, _PARTITION_INDEX_FILE.format(i))
+                if os.path.exists(index_path):
+                    indexes[name] = read_index(index_path, mmap)
+                    configure_search(indexes[name], ef_search, nprobe)
+        return cls(rows, centroids, indexes)
+
+    def search(self, index, vectors: np.ndarray, k: int,
+               categories: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (distances, main index rows) restricted to the given categories, shaped like index.search"""
+        categories = [category for category in set(categories) if category in self.rows]
+        if sum(len(self.rows[category]) for category in categories) == self.total > 0:
+            return index.search(vectors, k)
+        results = []
+        unpartitioned = []
+        for category in categories:
+            sub_index = self.indexes.get(category)
+            if sub_index is None:
+                unpartitioned.append(category)
+                continue
+            distances, indices = sub_index.search(vectors, k)
+            rows = self.rows[category]
+            results.append((distances, np.where(indices >= 0, rows[np.maximum(indices, 0)], -1)))
+        if unpartitioned:
+            # Keep the selector referenced until the search is done; the parameters only point at it
+            selector = self._selector(tuple(sorted(unpartitioned)))
+            results.append(index.search(vectors, k, params=self._filtered_params(index, selector)))
+
+        if not results:
+            return (np.full((len(vectors), k), np.inf, dtype=np.float32),
+                    np.full((len(vectors), k), -1, dtype=np.int64))
+        if len(results) == 1:
+            return results[0]
+        # Every partition lives in the same vector space, so distances merge directly
+        indices = np.hstack([indices for _, indices in results])
+        distances = np.where(indices >= 0, np.hstack([distances for distances, _ in results]), np.inf)
+        order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(distances, order, axis=1), np.take_along_axis(indices, order, axis=1)
+
+    def _selector(self, categories: Tuple[str, ...]):
+        with self._lock:
+            selector = self._selectors.get(categories)
+            if selector is None:
+                if len(self._selectors) >= _MAX_SELECTORS:
+                    self._selectors.clear()
+                ids = np.concatenate([self.rows[category] for category in categories])
+                selector = self._selectors[categories] = faiss.IDSelectorBatch(ids)
+            return selector
+
+    @staticmethod
+    def _filtered_params(index, selector):
+        """Search parameters carrying the selector plus the index's own accuracy knobs, which they would reset"""
+        if isinstance(index, faiss.IndexHNSW):
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+        try:
+            nprobe = faiss.extract_index_ivf(index).nprobe
+        except RuntimeError:
+            return faiss.SearchParameters(sel=selector)
+        return faiss.SearchParametersIVF(sel=selector, nprobe=nprobe)
+
+
+class CategoryRouter:
+    """Routes a query to the categories whose centroids are clearly closer than the rest.
+
+    Categories are ranked by cosine similarity to the query; the top n are chosen
+    for the smallest n (up to ``max_categories``) where the similarity drops by at
+    least ``margin`` right after them. Without such a gap the query is ambiguous and
+    None is returned, meaning search everything.
+    """
+
+    def __init__(self, centroids: Dict[str, np.ndarray], margin: float = 0.05, max_categories: int = 2):
+        self.names = sorted(centroids)
+        self.matrix = np.vstack([centroids[name] for name in self.names]) if self.names else None
+        self.margin = margin
+        self.max_categories = max_categories
+
+    def route(self, vector: np.ndarray) -> Optional[List[str]]:
+        if len(self.names) < 2:
+            return None
+        similarities = self.matrix @ _normalize(np.asarray(vector, dtype=np.float32).ravel())
+        order = np.argsort(-similarities)
+        for n in range(1, min(self.max_categories, len(self.names) - 1) + 1):
+            if similarities[order[n - 1]] - similarities[order[n]] >= self.margin:
+                return sorted(self.names[i] for i in order[:n])
+        return None
@@ -1,120 +1,504 @@
 import logging
-from typing import Dict, Any
-from langchain.llms import Ollama
+import threading
+import time
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from langchain.llms.base import BaseLLM
 from langchain.chains import RetrievalQA
 from langchain.prompts import PromptTemplate
+from response_cache import SemanticResponseCache, normalize_question
+from answer_store import AnswerStore
+from shared_cache import SharedCache
+from singleflight import SingleFlight
+from caching import LRUCache
+from retrieval import VectorSearcher, CachedRetriever
+from partitions import CategoryPartitions, CategoryRouter
+from lexical_index import BM25Index
+from field_index import FieldIndex
+from context_assembly import ContextAssembler
+from ollama_client import OllamaLLM, default_client
+from metrics import ANSWER_PATHS, ERRORS, LLMMetricsCallback, timed
 from config import settings
 
 logger = logging.getLogger(__name__)
 
+def preload_model(model: str = None, timeout: float = 300) -> None:
+    """Ask Ollama to load the model into memory and keep it resident"""
+    seconds = default_client().preload(model, timeout=timeout)
+    logger.info(f"Preloaded Ollama model in {seconds:.1f}s")
+
 class SmartCityRAG:
-    def __init__(self, vector_store, llm_model=None):
+    def __init__(self, vector_store, llm_model=None, index_version: str = "unversioned",
+                 lexical_index: Optional[BM25Index] = None, field_index: Optional[FieldIndex] = None,
+                 partitions: Optional[CategoryPartitions] = None, llm: Optional[BaseLLM] = None):
         self.vector_store = vector_store
-        self.llm = Ollama(
-            model=llm_model or settings.OLLAMA_MODEL, 
+        self.index_version = index_version
+        self.field_index = field_index
+        # Shares the process-wide client's connection pool and generation cap
+        self.llm = llm or OllamaLLM(
+            client=default_client(),
+            model=llm_model,
             temperature=0.1
         )
-        self.qa_chain = self._create_qa_chain()
-        self.response_cache = {}  # Cache for storing successful responses
+        # LLM call durations and token counts for /metrics
+        self.llm.callbacks = list(self.llm.callbacks or []) + [LLMMetricsCallback()]
+        self.prompt = self._create_prompt()
+        # Top-k results per (query, k, index version), shared by the chain, /search and agent tools
+        self.retrieval_cache = LRUCache("retrieval_results", settings.RETRIEVAL_CACHE_SIZE)
+        self.searcher = self._create_searcher(vector_store, index_version, lexical_index, partitions)
+        # Merges overlapping chunks and fits the context to a token budget before prompting
+        self.context_assembler = ContextAssembler(
+            token_budget=settings.CONTEXT_TOKEN_BUDGET,
+            max_blocks=settings.RETRIEVAL_K,
+            mmr_lambda=settings.MMR_LAMBDA,
+            baseline_chunks=settings.RETRIEVAL_K
+        ) if settings.CONTEXT_ASSEMBLY else None
+        self.qa_chain = self._create_qa_chain(self.searcher)
+        # Guards swapping the index so readers always see a consistent store/chain/version
+        self._state_lock = threading.Lock()
+        # Cache for storing successful responses, matched on question similarity
+        self.response_cache = SemanticResponseCache(
+            embed_fn=self._embed_query,
+            similarity_threshold=settings.RESPONSE_CACHE_SIMILARITY,
+            max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+            max_bytes=int(settings.RESPONSE_CACHE_MAX_MB * 1024 * 1024),
+            ttl_seconds=settings.RESPONSE_CACHE_TTL,
+            persist_path=settings.RESPONSE_CACHE_PATH or None,
+            shared=SharedCache(
+                settings.SHARED_CACHE_PATH,
+                "responses",
+                max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+                ttl_seconds=settings.RESPONSE_CACHE_TTL
+            ) if settings.SHARED_CACHE_PATH and settings.RESPONSE_CACHE_MAX_ENTRIES > 0 else None
+        )
+        # Answers generated ahead of time for frequent questions, served while their index version is live
+        self.answer_store = AnswerStore(
+            settings.PRECOMPUTED_ANSWERS_PATH,
+            embed_fn=self.response_cache.embed,
+            similarity_threshold=settings.RESPONSE_CACHE_SIMILARITY,
+            embedding_model=settings.EMBEDDING_MODEL
+        ) if settings.PRECOMPUTED_ANSWERS_PATH else None
+        self._refresh_lock = threading.Lock()
+        self._refresh_thread: Optional[threading.Thread] = None
+        # Concurrent identical questions share one in-flight retrieval and generation
+        self.query_flight = SingleFlight("query")
+        self.search_flight = SingleFlight("search")
+    
+    def _embed_query(self, text: str):
+        """Embed text with the same model (and embedding cache) the vector store uses"""
+        return self.searcher.embed(text)
         
-    def _create_qa_chain(self):
-        """Create the QA chain with custom prompt"""
-        prompt_template = """
-        You are a helpful Smart City Information Assistant. Use the following context to answer the citizen's question about city services, facilities, and policies.
+    def _create_prompt(self) -> PromptTemplate:
+        """Create the custom prompt shared by the QA chain and the streaming path"""
+        # Kept short: every prompt token is evaluated on each request
+        prompt_template = """You are a Smart City Information Assistant. Answer the citizen's question about city services, facilities and policies using the context.
 
-        Context:
-        {context}
+Context:
+{context}
 
-        Question: {question}
+Question: {question}
 
-        Instructions:
-        - Provide accurate, helpful information based on the context
-        - Include specific details like addresses, phone numbers, hours, and fees when available
-        - If you don't have enough information, say so clearly
-        - Be concise but comprehensive
-        - Format important information clearly
-        - If the question refers to a sector or zone not explicitly mentioned in the context, explain that the city uses zone designations (A, B, C, D, E) instead of sectors
-        - For questions about building permits, include form numbers, required documents, fees, and contact information
-        - For questions about business licenses, include application steps, fees, and renewal information
-        - For questions about waste collection, include pickup schedules for different zones
-        - For questions about library hours, include opening times for different days and location details
+Be concise. Include specific details from the context such as form numbers, required documents, fees, schedules, hours, addresses and phone numbers. If the context does not contain the answer, say so. The city uses zones A-E, not sectors.
 
-        Answer:
-        """
+Answer:"""
         
-        prompt = PromptTemplate(
+        return PromptTemplate(
             template=prompt_template,
             input_variables=["context", "question"]
         )
-        
+    
+    def _create_qa_chain(self, searcher: VectorSearcher, categories: Optional[List[str]] = None):
+        """Create the QA chain with custom prompt, retrieving from the given categories if any"""
         return RetrievalQA.from_chain_type(
             llm=self.llm,
             chain_type="stuff",
-            retriever=self.vector_store.as_retriever(search_kwargs={"k": 7}),  # Increased k for better context
-            chain_type_kwargs={"prompt": prompt},
+            retriever=CachedRetriever(
+                searcher=searcher,
+                k=settings.CONTEXT_CANDIDATES if self.context_assembler else settings.RETRIEVAL_K,
+                assembler=self.context_assembler,
+                categories=categories
+            ),
+            chain_type_kwargs={"prompt": self.prompt},
             return_source_documents=True
         )
     
-    def query(self, question: str) -> Dict[str, Any]:
+    def warmup(self) -> Dict[str, float]:
+        """Run one dummy embedding and one tiny generation so the first real request is warm"""
+        timings = {}
+        start = time.perf_counter()
+        self._embed_query("warmup")
+        timings["embedding_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        
+        start = time.perf_counter()
+        self.llm.predict("Reply with OK.", num_predict=1)
+        timings["generation_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        
+        logger.info(f"Warmup finished: {timings}")
+        return timings
+    
+    def _snapshot(self) -> Tuple[VectorSearcher, RetrievalQA, str]:
+        """Return the current (searcher, qa_chain, index_version) as one consistent triple"""
+        with self._state_lock:
+            return self.searcher, self.qa_chain, self.index_version
+    
+    def _create_searcher(self, vector_store, index_version: str, lexical_index: Optional[BM25Index],
+                         partitions: Optional[CategoryPartitions] = None) -> VectorSearcher:
+        """Hybrid BM25 + dense search when a lexical index is available and enabled, with category partitions"""
+        if not settings.HYBRID_RETRIEVAL:
+            lexical_index = None
+        router = None
+        if settings.CATEGORY_ROUTING and partitions is not None:
+            router = CategoryRouter(partitions.centroids, settings.CATEGORY_ROUTING_MARGIN, settings.CATEGORY_ROUTING_MAX)
+        return VectorSearcher(vector_store, index_version, self.retrieval_cache, lexical_index, partitions, router)
+    
+    def categories(self) -> Dict[str, int]:
+        """Source categories that queries and searches can be filtered by, with their chunk counts"""
+        partitions = self._snapshot()[0].partitions
+        return partitions.sizes() if partitions is not None else {}
+    
+    def score_type(self) -> str:
+        """Meaning of the scores search() returns, see VectorSearcher.score_type"""
+        return self._snapshot()[0].score_type
+    
+    @staticmethod
+    def _cache_scope(index_version: str, categories: Optional[List[str]]) -> str:
+        """Response cache version: answers retrieved from a subset of categories are kept apart"""
+        if not categories:
+            return index_version
+        return f"{index_version}|{','.join(sorted(set(categories)))}"
+    
+    def swap_vector_store(self, vector_store, index_version: str,
+                          lexical_index: Optional[BM25Index] = None,
+                          field_index: Optional[FieldIndex] = None,
+                          partitions: Optional[CategoryPartitions] = None) -> int:
+        """Atomically switch to a new vector store; in-flight requests finish on the old one.
+        
+        Returns the number of cached responses invalidated along with the old index version.
+        """
+        searcher = self._create_searcher(vector_store, index_version, lexical_index, partitions)
+        qa_chain = self._create_qa_chain(searcher)
+        with self._state_lock:
+            self.vector_store = vector_store
+            self.searcher = searcher
+            self.qa_chain = qa_chain
+            self.index_version = index_version
+            self.field_index = field_index
+        # Old-version results can never be hit again, so free them right away
+        self.retrieval_cache.clear()
+        logger.info(f"Switched to index version {index_version}")
+        return self.response_cache.invalidate(keep_version=index_version)
+    
+    def refresh_precomputed_answers(self):
+        """Regenerate stale precomputed answers in a background thread, one generation at a time"""
+        if self.answer_store is None or not settings.PRECOMPUTED_REFRESH:
+            return
+        with self._refresh_lock:
+            # A running refresh picks up the new index version when it finishes its pass
+            if self._refresh_thread is None:
+                self._refresh_thread = threading.Thread(
+                    target=self._refresh_answers, name="answer-refresh", daemon=True
+                )
+                self._refresh_thread.start()
+    
+    def _refresh_answers(self):
+        while True:
+            version = self.index_version
+            try:
+                self.answer_store.refresh(
+                    self.precompute_answer, version, should_stop=lambda: self.index_version != version
+                )
+            except Exception as e:
+                logger.error(f"Refreshing precomputed answers failed: {e}")
+                ERRORS.inc(component="answer_store")
+            with self._refresh_lock:
+                if self.index_version == version:
+                    self._refresh_thread = None
+                    return
+    
+    def precompute_answer(self, question: str) -> Optional[Dict[str, Any]]:
+        """Freshly generated answer for the answer store, or None if it should not be stored"""
+        if self._answer_from_fields(question) is not None:
+            return None  # Already answered without the LLM
+        _, qa_chain, _ = self._snapshot()
+        response = self._run_chain(qa_chain, question)
+        return response if response["confidence"] > 0.7 else None
+    
+    def _cached_answer(self, question: str, scope: str) -> Tuple[Optional[Dict[str, Any]], Any]:
+        """A precomputed or cached answer marked with its answer_path, and the question embedding if one was computed"""
+        store = self.answer_store
+        answer = None
+        if store is not None:
+            with timed("answer_store"):
+                answer = store.lookup(question, scope)
+        if answer is not None:
+            answer["answer_path"] = "precomputed"
+            return answer, None
+        with timed("response_cache"):
+            cached, embedding = self.response_cache.lookup(question, scope)
+        if cached is not None:
+            cached["answer_path"] = "cache"
+            return cached, embedding
+        if store is not None and embedding is not None:
+            answer = store.lookup(question, scope, embedding)
+            if answer is not None:
+                answer["answer_path"] = "precomputed"
+                return answer, embedding
+        return None, embedding
+    
+    def query(self, question: str, categories: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Process a query, coalescing with any identical query already in flight"""
+        # Contact/hours/location lookups are answered straight from the field index
+        fast_answer = self._answer_from_fields(question, categories)
+        if fast_answer is not None:
+            ANSWER_PATHS.inc(path="fields")
+            return fast_answer
+        
+        state = self._snapshot()
+        key = (self._cache_scope(state[2], categories), normalize_question(question))
+        result = self.query_flight.do(key, self._query, question, state, categories)
+        ANSWER_PATHS.inc(path=result["answer_path"])
+        return result
+    
+    def _answer_from_fields(self, question: str, categories: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """Templated answer from structured item fields, or None to fall back to the QA chain"""
+        field_index = self.field_index
+        # Field entries do not know their source category, so filtered questions go through retrieval
+        if not settings.FIELD_FAST_PATH or field_index is None or categories:
+            return None
+        with timed("field_lookup"):
+            match = field_index.match(question)
+        if match is None:
+            return None
+        logger.info(f"Answered '{question}' from field index ({match['field']} of {match['item_id']})")
+        return {
+            "answer": match["answer"],
+            "confidence": 0.95,
+            "sources": match["sources"],
+            "source_documents": [],
+            "answer_path": "fields"
+        }
+    
+    def search(self, query: str, k: int = 5, categories: Optional[List[str]] = None) -> List[Tuple[Any, float]]:
+        """Vector search with scores, coalescing identical concurrent searches"""
+        searcher, _, index_version = self._snapshot()
+        key = (self._cache_scope(index_version, categories), normalize_question(query), k)
+        return self.search_flight.do(key, searcher.search, query, k, categories)
+    
+    def retrieve(self, query: str, k: int = 4, categories: Optional[List[str]] = None) -> List[Any]:
+        """Retrieval only: return the top-k chunks, from the given categories if any, without running the LLM"""
+        searcher, _, _ = self._snapshot()
+        return [doc for doc, _ in searcher.search(query, k, categories)]
+    
+    def prepare_batch(self, questions: List[str], categories: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Answer what a batch can without the LLM and retrieve context for the rest in one pass.
+        
+        Returns one item per question: either a finished response (field lookup or cache
+        hit) or ``{"source_documents": [...]}`` still to be passed to ``answer_from_documents``.
+        """
+        searcher, _, index_version = self._snapshot()
+        scope = self._cache_scope(index_version, categories)
+        items: List[Optional[Dict[str, Any]]] = [self._answer_from_fields(question, categories) for question in questions]
+        for item in items:
+            if item is not None:
+                ANSWER_PATHS.inc(path="fields")
+        
+        pending = [i for i, item in enumerate(items) if item is None]
+        if pending:
+            # One encode call for every remaining question; the cache lookups below reuse those vectors
+            searcher.embed_many([questions[i] for i in pending])
+        
+        to_retrieve = []
+        for i in pending:
+            cached, _ = self._cached_answer(questions[i], scope)
+            if cached is not None:
+                cached["source_documents"] = []
+                items[i] = cached
+                ANSWER_PATHS.inc(path=cached["answer_path"])
+            else:
+                to_retrieve.append(i)
+        
+        retrieved_chunks, unique_chunks = 0, set()
+        if to_retrieve:
+            k = settings.CONTEXT_CANDIDATES if self.context_assembler else settings.RETRIEVAL_K
+            results = searcher.search_many([questions[i] for i in to_retrieve], k, categories)
+            for i, hits in zip(to_retrieve, results):
+                documents = [doc for doc, _ in hits]
+                if self.context_assembler:
+                    with timed("context_assembly"):
+                        documents, _ = self.context_assembler.assemble(documents)
+                items[i] = {"source_documents": documents}
+                retrieved_chunks += len(hits)
+                unique_chunks.update(id(doc) for doc, _ in hits)
+        
+        return {
+            "items": items,
+            "index_version": scope,
+            "retrieved_chunks": retrieved_chunks,
+            "unique_chunks": len(unique_chunks)
+        }
+    
+    def answer_from_documents(self, question: str, source_documents: List[Any], index_version: str) -> Dict[str, Any]:
+        """Generate an answer from chunks that were already retrieved; index_version scopes the cached answer"""
+        prompt = self.prompt.format(
+            context="\n\n".join(doc.page_content for doc in source_documents),
+            question=question
+        )
+        answer = self.llm(prompt)
+        confidence = self._calculate_confidence(source_documents)
+        response = {
+            "answer": answer,
+            "confidence": confidence,
+            "sources": [doc.metadata.get("title", "Unknown") for doc in source_documents],
+            "source_documents": source_documents,
+            "answer_path": "llm"
+        }
+        if confidence > 0.7:
+            self.response_cache.put(question, index_version, response)
+        ANSWER_PATHS.inc(path="llm")
+        return response
+    
+    def _query(self, question: str, state: Tuple[VectorSearcher, RetrievalQA, str],
+               categories: Optional[List[str]] = None) -> Dict[str, Any]:
         """Process a query and return response with metadata using pure RAG approach"""
-        # Check cache first for identical questions
-        if question in self.response_cache:
-            logger.info(f"Cache hit for question: {question}")
-            return self.response_cache[question]
+        searcher, qa_chain, index_version = state
+        index_version = self._cache_scope(index_version, categories)
+        if categories:
+            qa_chain = self._create_qa_chain(searcher, categories)
+        
+        # Check precomputed answers and the cache first for identical or near-identical questions
+        cached, question_embedding = self._cached_answer(question, index_version)
+        if cached is not None:
+            logger.info(f"Cache hit ({cached['answer_path']}) for question: {question}")
+            cached["source_documents"] = []
+            return cached
             
         # Use RAG for all queries
         try:
-            # Enhance retrieval by adding common keywords to the query
-            enhanced_query = self._enhance_query(question)
-            
-            # Get result from QA chain
-            result = self.qa_chain({"query": enhanced_query})
-            
-            confidence = self._calculate_confidence(result["source_documents"])
-            
-            sources = [
-                doc.metadata.get("title", "Unknown") 
-                for doc in result["source_documents"]
-            ]
-            
-            response = {
-                "answer": result["result"],
-                "confidence": confidence,
-                "sources": sources,
-                "source_documents": result["source_documents"]
-            }
+            response = self._run_chain(qa_chain, question)
             
             # Cache high-confidence responses
-            if confidence > 0.7:
-                self.response_cache[question] = response
+            if response["confidence"] > 0.7:
+                self.response_cache.put(question, index_version, response, question_embedding)
                 
             return response
             
         except Exception as e:
             logger.error(f"Query processing error: {e}")
+            ERRORS.inc(component="rag")
             return {
                 "answer": "I apologize, but I encountered an error processing your request. Please try again.",
                 "confidence": 0.0,
                 "sources": [],
-                "source_documents": []
+                "source_documents": [],
+                "answer_path": "llm"
             }
     
-    def _enhance_query(self, question: str) -> str:
-        """Enhance query with relevant keywords based on question content"""
-        question_lower = question.lower()
-        
-        if "permit" in question_lower or "building" in question_lower:
-            return f"{question} form requirements fees process"
-        elif "business" in question_lower or "license" in question_lower:
-            return f"{question} application fees requirements renewal"
-        elif "garbage" in question_lower or "waste" in question_lower or "collection" in question_lower:
-            return f"{question} schedule zones pickup days"
-        elif "library" in question_lower or "hours" in question_lower:
-            return f"{question} opening times schedule location"
-        elif "sector" in question_lower or "zone" in question_lower:
-            return f"{question} waste collection schedule zones"
-        else:
-            return question
+    def _run_chain(self, qa_chain: RetrievalQA, question: str) -> Dict[str, Any]:
+        """Retrieve and generate an answer with the QA chain, bypassing every cache"""
+        # Get result from QA chain
+        result = qa_chain({"query": question})
+        
+        confidence = self._calculate_confidence(result["source_documents"])
+        
+        sources = [
+            doc.metadata.get("title", "Unknown") 
+            for doc in result["source_documents"]
+        ]
+        
+        return {
+            "answer": result["result"],
+            "confidence": confidence,
+            "sources": sources,
+            "source_documents": result["source_documents"],
+            "answer_path": "llm"
+        }
+    
+    def stream_query(self, question: str, categories: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+        """Stream a query as events: sources after retrieval, tokens while generating, then done"""
+        start = time.perf_counter()
+        
+        # Field lookups and cached answers are replayed as a single token
+        fast_answer = self._answer_from_fields(question, categories)
+        if fast_answer is not None:
+            ANSWER_PATHS.inc(path="fields")
+            yield {"event": "sources", "data": {"sources": fast_answer["sources"]}}
+            yield {"event": "token", "data": {"text": fast_answer["answer"]}}
+            yield {"event": "done", "data": {
+                "confidence": fast_answer["confidence"],
+                "cached": False,
+                "answer_path": "fields",
+                "timing": {"total_ms": round((time.perf_counter() - start) * 1000, 1)}
+            }}
+            return
+        
+        searcher, qa_chain, index_version = self._snapshot()
+        index_version = self._cache_scope(index_version, categories)
+        cached, question_embedding = self._cached_answer(question, index_version)
+        if cached is not None:
+            logger.info(f"Cache hit ({cached['answer_path']}) for question: {question}")
+            ANSWER_PATHS.inc(path=cached["answer_path"])
+            yield {"event": "sources", "data": {"sources": cached["sources"]}}
+            yield {"event": "token", "data": {"text": cached["answer"]}}
+            yield {"event": "done", "data": {
+                "confidence": cached["confidence"],
+                "cached": True,
+                "answer_path": cached["answer_path"],
+                "timing": {"total_ms": round((time.perf_counter() - start) * 1000, 1)}
+            }}
+            return
+        
+        try:
+            retriever = qa_chain.retriever
+            if categories:
+                retriever = self._create_qa_chain(searcher, categories).retriever
+            source_documents = retriever.get_relevant_documents(question)
+            retrieval_ms = (time.perf_counter() - start) * 1000
+            
+            sources = [doc.metadata.get("title", "Unknown") for doc in source_documents]
+            yield {"event": "sources", "data": {"sources": sources}}
+            
+            prompt = self.prompt.format(
+                context="\n\n".join(doc.page_content for doc in source_documents),
+                question=question
+            )
+            
+            answer_parts = []
+            first_token_ms = None
+            for token in self.llm.stream(prompt):
+                if not token:
+                    continue
+                if first_token_ms is None:
+                    first_token_ms = (time.perf_counter() - start) * 1000
+                answer_parts.append(token)
+                yield {"event": "token", "data": {"text": token}}
+            
+            confidence = self._calculate_confidence(source_documents)
+            ANSWER_PATHS.inc(path="llm")
+            total_ms = (time.perf_counter() - start) * 1000
+            
+            if confidence > 0.7:
+                self.response_cache.put(question, index_version, {
+                    "answer": "".join(answer_parts),
+                    "confidence": confidence,
+                    "sources": sources
+                }, question_embedding)
+            
+            yield {"event": "done", "data": {
+                "confidence": confidence,
+                "cached": False,
+                "answer_path": "llm",
+                "timing": {
+                    "retrieval_ms": round(retrieval_ms, 1),
+                    "first_token_ms": round(first_token_ms, 1) if first_token_ms is not None else None,
+                    "total_ms": round(total_ms, 1)
+                }
+            }}
+            
+        except Exception as e:
+            logger.error(f"Streaming query error: {e}")
+            ERRORS.inc(component="rag")
+            yield {"event": "error", "data": {
+                "detail": "I apologize, but I encountered an error processing your request. Please try again."
+            }}
     
     def _calculate_confidence(self, source_docs) -> float:
         """Calculate confidence based on document relevance and quantity"""
@@ -122,7 +506,9 @@ class SmartCityRAG:
             return 0.0
             
         # Calculate base confidence from number of sources
-        base_confidence = min(0.9, 0.5 + (len(source_docs) * 0.1))
+        # Merged context blocks count once per chunk they were built from
+        chunk_count = sum(doc.metadata.get("merged_chunks", 1) for doc in source_docs)
+        base_confidence = min(0.9, 0.5 + (chunk_count * 0.1))
         
         # Adjust confidence based on relevance scores if available
         relevance_scores = []
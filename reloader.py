@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ReloadInProgressError(Exception):
+    """Raised when a reload is requested while another one is still running"""
+
+
+class KnowledgeBaseReloader:
+    """Rebuilds the vector store from the knowledge file and swaps it into the live RAG system"""
+
+    def __init__(self, knowledge_processor, rag_system, file_path: str):
+        self.knowledge_processor = knowledge_processor
+        self.rag_system = rag_system
+        self.file_path = file_path
+        self._lock = threading.Lock()
+        self.last_reload: Optional[Dict[str, Any]] = None
+
+    def reload(self, force: bool = False) -> Dict[str, Any]:
+        """Build the new index off to the side and swap it in; blocking, run it in a thread"""
+        if not self._lock.acquire(blocking=False):
+            raise ReloadInProgressError("A knowledge base reload is already in progress")
+        try:
+            start = time.perf_counter()
+            previous_version = self.rag_system.index_version
+            new_version = self.knowledge_processor.compute_version(self.file_path)
+            if new_version == previous_version and not force:
+                return {"status": "unchanged", "index_version": previous_version}
+
+            logger.info(f"Reloading knowledge base from {self.file_path}")
+            vector_store = self.knowledge_processor.load_from_file(self.file_path)
+            invalidated = self.rag_system.swap_vector_store(
+                vector_store,
+                self.knowledge_processor.index_version,
+                self.knowledge_processor.lexical_index,
+                self.knowledge_processor.field_index,
+                self.knowledge_processor.partitions
+            )
+            # Precomputed answers for the old version no longer match; regenerate them off the request path
+            self.rag_system.refresh_precomputed_answers()
+
+            self.last_reload = {
+                "status": "reloaded",
+                "previous_version": previous_version,
+                "index_version": self.knowledge_processor.index_version,
+                "invalidated_cache_entries": invalidated,
+                "duration_seconds": round(time.perf_counter() - start, 3),
+                "completed_at": time.time()
+            }
+            logger.info(f"Knowledge base reloaded: {self.last_reload}")
+            return self.last_reload
+        finally:
+            self._lock.release()
+
+    async def watch(self, interval: float):
+        """Poll the knowledge file and reload when its contents change"""
+        loop = asyncio.get_running_loop()
+        last_stat = self._stat()
+        while True:
+            await asyncio.sleep(interval)
+            stat = self._stat()
+            if stat == last_stat:
+                continue
+            last_stat = stat
+            try:
+                await loop.run_in_executor(None, self.reload)
+            except ReloadInProgressError:
+                logger.info("Knowledge file changed during a reload, will retry on next poll")
+                last_stat = None
+            except Exception as e:
+                logger.error(f"Automatic knowledge base reload failed: {e}")
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.file_path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
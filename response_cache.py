@@ -0,0 +1,272 @@
+import logging
+import os
+import pickle
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from shared_cache import SharedCache
+
+logger = logging.getLogger(__name__)
+
+# Words whose following token identifies a specific place or thing ("Zone C", "Room 205")
+_ANCHOR_PATTERN = re.compile(r"\b(?:zone|sector|lot|room|route|line|bus|form|district|ward)\s+([a-z0-9-]+)")
+_NUMERIC_TOKEN_PATTERN = re.compile(r"\b[a-z-]*\d[a-z0-9-]*\b")
+
+
+def normalize_question(question: str) -> str:
+    """Lower-case a question and collapse punctuation and whitespace"""
+    text = re.sub(r"[^\w\s-]", " ", question.lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def query_discriminators(normalized: str) -> frozenset:
+    """Tokens that must match exactly, since embeddings barely separate 'Zone A' from 'Zone B'"""
+    tokens = set(_NUMERIC_TOKEN_PATTERN.findall(normalized))
+    tokens.update(_ANCHOR_PATTERN.findall(normalized))
+    return frozenset(tokens)
+
+
+class _CacheEntry:
+    __slots__ = ("question", "version", "embedding", "response", "created_at", "size", "discriminators")
+
+    def __init__(self, question: str, version: str, embedding: np.ndarray,
+                 response: Dict[str, Any], created_at: float):
+        self.question = question
+        self.version = version
+        self.embedding = embedding
+        self.response = response
+        self.created_at = created_at
+        self.discriminators = query_discriminators(question)
+        self.size = self._estimate_size()
+
+    def _estimate_size(self) -> int:
+        text_bytes = len(self.question) + len(self.response.get("answer", ""))
+        text_bytes += sum(len(source) for source in self.response.get("sources", []))
+        return self.embedding.nbytes + text_bytes + 256  # Rough per-entry object overhead
+
+
+class SemanticResponseCache:
+    """LRU/TTL response cache keyed on question embeddings and scoped to an index version.
+
+    With a ``shared`` store, every entry is also written there and entries written
+    by other worker processes are pulled in before each lookup, so all workers
+    answer from one cache.
+    """
+
+    def __init__(self, embed_fn: Callable[[str], List[float]], similarity_threshold: float = 0.92,
+                 max_entries: int = 1000, max_bytes: int = 32 * 1024 * 1024,
+                 ttl_seconds: float = 3600, persist_path: Optional[str] = None,
+                 shared: Optional[SharedCache] = None):
+        self.embed_fn = embed_fn
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.persist_path = persist_path
+        self.shared = shared
+        # Id of the last shared-store row pulled into this process
+        self._shared_seen = 0
+        self._entries: "OrderedDict[Tuple[str, str], _CacheEntry]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._bytes = 0
+        self._counters = {
+            "exact_hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+            "shared_pulled": 0,
+        }
+        if persist_path:
+            self.load()
+        self._pull_shared()
+
+    def embed(self, question: str) -> np.ndarray:
+        """Embed a normalized question as a unit-length float32 vector"""
+        vector = np.asarray(self.embed_fn(normalize_question(question)), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def lookup(self, question: str, version: str) -> Tuple[Optional[Dict[str, Any]], Optional[np.ndarray]]:
+        """Return (cached response or None, query embedding) for a question.
+
+        The embedding is returned so a subsequent ``put`` does not embed the question twice.
+        It is None when an exact normalized match made the embedding unnecessary.
+        """
+        normalized = normalize_question(question)
+        self._pull_shared()
+        with self._lock:
+            entry = self._entries.get((version, normalized))
+            if entry is not None and not self._expired(entry):
+                self._entries.move_to_end((version, normalized))
+                self._counters["exact_hits"] += 1
+                return dict(entry.response), None
+
+        embedding = self.embed(question)
+        discriminators = query_discriminators(normalized)
+        with self._lock:
+            self._purge_expired()
+            best_key, best_score = None, -1.0
+            candidates = [
+                (key, entry) for key, entry in self._entries.items()
+                if entry.version == version and entry.discriminators == discriminators
+            ]
+            if candidates:
+                matrix = np.stack([entry.embedding for _, entry in candidates])
+                scores = matrix @ embedding
+                best = int(np.argmax(scores))
+                best_key, best_score = candidates[best][0], float(scores[best])
+
+            if best_key is not None and best_score >= self.similarity_threshold:
+                self._entries.move_to_end(best_key)
+                self._counters["semantic_hits"] += 1
+                logger.info(f"Semantic cache hit ({best_score:.3f}) for question: {question}")
+                return dict(self._entries[best_key].response), embedding
+
+            self._counters["misses"] += 1
+            return None, embedding
+
+    def put(self, question: str, version: str, response: Dict[str, Any],
+            embedding: Optional[np.ndarray] = None):
+        """Store a response, dropping heavyweight fields such as source documents"""
+        if embedding is None:
+            embedding = self.embed(question)
+        stored = {
+            "answer": response["answer"],
+            "confidence": response["confidence"],
+            "sources": list(response.get("sources", [])),
+        }
+        key = (version, normalize_question(question))
+        entry = _CacheEntry(key[1], version, embedding.astype(np.float32), stored, time.time())
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.size
+            self._entries[key] = entry
+            self._bytes += entry.size
+            self._evict()
+        if self.shared is not None:
+            record = (entry.question, version, entry.embedding, stored, entry.created_at)
+            self.shared.put(f"{version}\n{key[1]}", pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL), tag=version)
+
+    def _pull_shared(self):
+        """Add entries other workers wrote to the shared store since the last pull"""
+        if self.shared is None:
+            return
+        rows = self.shared.changes(self._shared_seen)
+        if not rows:
+            return
+        records = []
+        for _, _, _, value, _ in rows:
+            try:
+                records.append(pickle.loads(value))
+            except Exception as e:
+                logger.warning(f"Skipping unreadable shared cache entry: {e}")
+        with self._lock:
+            self._shared_seen = max(self._shared_seen, rows[-1][0])
+            self._restore(records)
+            self._counters["shared_pulled"] += len(records)
+
+    def invalidate(self, keep_version: Optional[str] = None) -> int:
+        """Drop entries from every index version except ``keep_version``"""
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry.version != keep_version]
+            for key in stale:
+                self._remove(key)
+            self._counters["invalidations"] += len(stale)
+        if self.shared is not None and keep_version is not None:
+            self.shared.delete_other_tags(keep_version)
+        if stale:
+            logger.info(f"Invalidated {len(stale)} cached responses")
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current occupancy"""
+        with self._lock:
+            hits = self._counters["exact_hits"] + self._counters["semantic_hits"]
+            lookups = hits + self._counters["misses"]
+            return {
+                **self._counters,
+                "hits": hits,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expired(self, entry: _CacheEntry) -> bool:
+        return self.ttl_seconds > 0 and time.time() - entry.created_at > self.ttl_seconds
+
+    def _purge_expired(self):
+        expired = [key for key, entry in self._entries.items() if self._expired(entry)]
+        for key in expired:
+            self._remove(key)
+        self._counters["expirations"] += len(expired)
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            key = next(iter(self._entries))
+            self._remove(key)
+            self._counters["evictions"] += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def save(self):
+        """Persist live entries to disk, replacing the previous file atomically"""
+        if not self.persist_path:
+            return
+        with self._lock:
+            self._purge_expired()
+            records = [
+                (entry.question, entry.version, entry.embedding, entry.response, entry.created_at)
+                for entry in self._entries.values()
+            ]
+        tmp_path = f"{self.persist_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(records, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.persist_path)
+        logger.info(f"Saved {len(records)} cached responses to {self.persist_path}")
+
+    def load(self):
+        """Load persisted entries, skipping any that have expired"""
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, "rb") as f:
+                records = pickle.load(f)
+        except Exception as e:
+            logger.warning(f"Failed to load response cache from {self.persist_path}: {e}")
+            return
+        with self._lock:
+            self._restore(records)
+        logger.info(f"Loaded {len(self._entries)} cached responses from {self.persist_path}")
+
+    def _restore(self, records: List[Tuple]):
+        """Insert (question, version, embedding, response, created_at) records, skipping expired ones"""
+        for question, version, embedding, response, created_at in records:
+            entry = _CacheEntry(question, version, embedding, response, created_at)
+            if self._expired(entry):
+                continue
+            previous = self._entries.pop((version, question), None)
+            if previous is not None:
+                self._bytes -= previous.size
+            self._entries[(version, question)] = entry
+            self._bytes += entry.size
+        self._evict()
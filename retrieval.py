@@ -0,0 +1,267 @@
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain.callbacks.manager import CallbackManagerForRetrieverRun
+from langchain.schema import BaseRetriever, Document
+from langchain.schema.embeddings import Embeddings
+
+from caching import LRUCache
+from lexical_index import BM25Index, identifier_tokens
+from metrics import CATEGORY_SEARCHES, timed
+from partitions import CategoryPartitions, CategoryRouter
+from response_cache import normalize_question
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int, rrf_k: int = 60,
+                           weights: Optional[List[float]] = None) -> Tuple[Tuple[str, float], ...]:
+    """Fuse ranked id lists; each list contributes weight / (rrf_k + rank) per id"""
+    scores: Dict[str, float] = {}
+    for ranking, weight in zip(rankings, weights or [1.0] * len(rankings)):
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + weight / (rrf_k + rank + 1)
+    fused = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+    return tuple(fused)
+
+
+class VectorSearcher:
+    """Top-k search over one FAISS vector store, optionally fused with a BM25 index.
+
+    Results are cached as (docstore id, score) pairs keyed on the normalized query,
+    k and the index version, so repeated lookups skip both the embedding model and
+    FAISS. Dense-only scores are L2 distances (lower is better); hybrid scores are
+    reciprocal-rank-fusion scores (higher is better). One searcher is created per
+    index version; the result cache is shared between them.
+
+    Searches can be restricted to source categories, which then only touch those
+    categories' partitions. Without an explicit filter, a router may narrow the
+    search to the categories a query clearly belongs to.
+    """
+
+    def __init__(self, vector_store, index_version: str, result_cache: LRUCache,
+                 lexical_index: Optional[BM25Index] = None, partitions: Optional[CategoryPartitions] = None,
+                 router: Optional[CategoryRouter] = None):
+        self.vector_store = vector_store
+        self.index_version = index_version
+        self.result_cache = result_cache
+        self.lexical_index = lexical_index
+        self.partitions = partitions
+        self.router = router if partitions is not None else None
+
+    def category_of(self, docstore_id: str) -> str:
+        docstore = self.vector_store.docstore
+        if hasattr(docstore, "metadata"):
+            metadata = docstore.metadata(docstore_id)
+        else:
+            doc = docstore.search(docstore_id)
+            metadata = doc.metadata if isinstance(doc, Document) else None
+        return (metadata or {}).get("source_category", "")
+
+    @property
+    def score_type(self) -> str:
+        """What result scores mean: "distance" (L2, lower is better) or "rrf" (rank fusion, higher is better)"""
+        return "distance" if self.lexical_index is None else "rrf"
+
+    def _route(self, vector: np.ndarray) -> Optional[Tuple[str, ...]]:
+        if self.router is None:
+            return None
+        with timed("routing"):
+            categories = self.router.route(vector)
+        return tuple(categories) if categories else None
+
+    def embed(self, text: str) -> np.ndarray:
+        embedding_function = self.vector_store.embedding_function
+        with timed("embedding"):
+            if hasattr(embedding_function, "embed_query_vector"):
+                return embedding_function.embed_query_vector(text)
+            if isinstance(embedding_function, Embeddings):
+                return np.asarray(embedding_function.embed_query(text), dtype=np.float32)
+            return np.asarray(embedding_function(text), dtype=np.float32)
+
+    def embed_many(self, texts: List[str]) -> np.ndarray:
+        """Embed several queries with one encode call, as an (n, dim) matrix"""
+        embedding_function = self.vector_store.embedding_function
+        with timed("embedding"):
+            if hasattr(embedding_function, "embed_query_vectors"):
+                return embedding_function.embed_query_vectors(texts)
+            if isinstance(embedding_function, Embeddings):
+                return np.asarray(embedding_function.embed_documents(texts), dtype=np.float32)
+            return np.asarray([embedding_function(text) for text in texts], dtype=np.float32)
+
+    def search(self, query: str, k: int,
+               categories: Optional[Sequence[str]] = None) -> List[Tuple[Document, float]]:
+        """Return the top-k chunks with scores, fusing lexical and dense results when enabled"""
+        mode = "dense" if self.lexical_index is None else "hybrid"
+        categories = tuple(sorted(set(categories))) if categories else None
+        # Routing is a function of the query, so routed results are cached under the query alone
+        key = (mode, normalize_question(query), k, self.index_version, categories)
+        with timed("retrieval"):
+            hits = self.result_cache.get(key)
+            if hits is None:
+                if self.lexical_index is None:
+                    vector = self.embed(query)
+                    hits = self._search_index(vector, k, categories or self._route(vector), explicit=bool(categories))
+                else:
+                    hits = self._hybrid_search(query, k, categories)
+                self.result_cache.put(key, hits)
+            return self._resolve(hits)
+
+    def search_many(self, queries: List[str], k: int,
+                    categories: Optional[Sequence[str]] = None) -> List[List[Tuple[Document, float]]]:
+        """Top-k for several queries: one encode call and one FAISS matrix search for all cache misses.
+
+        Each distinct chunk is resolved once, so questions that retrieve the same
+        chunk share the same Document object.
+        """
+        mode = "dense" if self.lexical_index is None else "hybrid"
+        categories = tuple(sorted(set(categories))) if categories else None
+        keys = [(mode, normalize_question(query), k, self.index_version, categories) for query in queries]
+        with timed("retrieval"):
+            hits: List[Optional[Tuple[Tuple[str, float], ...]]] = [self.result_cache.get(key) for key in keys]
+            missing = {}
+            for i, key in enumerate(keys):
+                if hits[i] is None:
+                    missing.setdefault(key, []).append(i)
+
+            lexical: Dict[Tuple, List[str]] = {}
+            dense_keys = list(missing)
+            if self.lexical_index is not None:
+                for key in dense_keys:
+                    lexical[key] = self._lexical_candidates(queries[missing[key][0]], k, categories)
+
+            if dense_keys:
+                candidates = k if self.lexical_index is None else max(k, settings.HYBRID_CANDIDATES)
+                vectors = self.embed_many([queries[missing[key][0]] for key in dense_keys])
+                routes = [categories or self._route(vector) for vector in vectors]
+                for key, route, dense_hits in zip(dense_keys, routes,
+                                                  self._search_routed(vectors, candidates, routes, bool(categories))):
+                    if self.lexical_index is not None:
+                        lexical_ids = lexical[key] if categories else self._in_categories(lexical[key], route)
+                        dense_hits = self._fuse(queries[missing[key][0]], lexical_ids, dense_hits, k)
+                    self._fill(hits, missing[key], key, dense_hits)
+
+            documents: Dict[str, Any] = {}
+            for docstore_id, _ in (hit for query_hits in hits for hit in query_hits):
+                if docstore_id not in documents:
+                    documents[docstore_id] = self.vector_store.docstore.search(docstore_id)
+            return [
+                [(documents[docstore_id], score) for docstore_id, score in query_hits
+                 if isinstance(documents[docstore_id], Document)]
+                for query_hits in hits
+            ]
+
+    def _fill(self, hits: List, positions: List[int], key: Tuple, value: Tuple[Tuple[str, float], ...]):
+        self.result_cache.put(key, value)
+        for i in positions:
+            hits[i] = value
+
+    def _in_categories(self, doc_ids: List[str], categories: Optional[Sequence[str]]) -> List[str]:
+        if not categories:
+            return doc_ids
+        return [doc_id for doc_id in doc_ids if self.category_of(doc_id) in categories]
+
+    def _lexical_candidates(self, query: str, k: int, categories: Optional[Sequence[str]] = None) -> List[str]:
+        """BM25 candidate ids, best first"""
+        doc_filter = (lambda doc_id: self.category_of(doc_id) in categories) if categories else None
+        with timed("bm25"):
+            return [doc_id for doc_id, _ in
+                    self.lexical_index.search(query, max(k, settings.HYBRID_CANDIDATES), doc_filter)]
+
+    def _fuse(self, query: str, lexical_ids: List[str], dense_hits: Sequence[Tuple[str, float]],
+              k: int) -> Tuple[Tuple[str, float], ...]:
+        """RRF of the lexical and dense rankings, with chunks containing the query's identifiers as a boosted third"""
+        rankings = [lexical_ids, [doc_id for doc_id, _ in dense_hits]]
+        weights = [1.0, 1.0]
+        # Exact identifiers ("BP-101", "Room 205") lift the chunks naming them without hiding the semantic matches
+        identifiers = identifier_tokens(query)
+        if identifiers:
+            exact_ids = [doc_id for doc_id in lexical_ids if self.lexical_index.contains_all(doc_id, identifiers)]
+            if exact_ids:
+                rankings.append(exact_ids)
+                weights.append(settings.HYBRID_IDENTIFIER_WEIGHT)
+        return reciprocal_rank_fusion(rankings, k, settings.RRF_K, weights)
+
+    def _hybrid_search(self, query: str, k: int,
+                       categories: Optional[Tuple[str, ...]] = None) -> Tuple[Tuple[str, float], ...]:
+        lexical_ids = self._lexical_candidates(query, k, categories)
+        candidates = max(k, settings.HYBRID_CANDIDATES)
+        vector = self.embed(query)
+        route = categories
+        if route is None:
+            route = self._route(vector)
+            lexical_ids = self._in_categories(lexical_ids, route)
+        dense_hits = self._search_index(vector, candidates, route, explicit=bool(categories))
+        return self._fuse(query, lexical_ids, dense_hits, k)
+
+    def _search_index(self, vector: np.ndarray, k: int, categories: Optional[Sequence[str]] = None,
+                      explicit: bool = False) -> Tuple[Tuple[str, float], ...]:
+        return self._search_routed(vector.reshape(1, -1), k, [categories], explicit)[0]
+
+    def _search_routed(self, vectors: np.ndarray, k: int, routes: List[Optional[Sequence[str]]],
+                       explicit: bool = False) -> List[Tuple[Tuple[str, float], ...]]:
+        """Dense top-k per row, each row searched in its own categories (None: the whole index)"""
+        groups: Dict[Optional[Tuple[str, ...]], List[int]] = {}
+        for row, route in enumerate(routes):
+            groups.setdefault(tuple(route) if route else None, []).append(row)
+            CATEGORY_SEARCHES.inc(scope="all" if not route else "filtered" if explicit else "routed")
+        results: List[Any] = [None] * len(routes)
+        short = []
+        for route, rows in groups.items():
+            subset = vectors if len(rows) == len(routes) else vectors[rows]
+            for row, hits in zip(rows, self._search_index_many(subset, k, route)):
+                results[row] = hits
+                # A routed partition too small to fill k is a guess, not a filter: search everything instead
+                if route is not None and not explicit and len(hits) < k:
+                    short.append(row)
+        if short:
+            for row, hits in zip(short, self._search_index_many(vectors[short], k)):
+                results[row] = hits
+        return results
+
+    def _search_index_many(self, vectors: np.ndarray, k: int,
+                           categories: Optional[Sequence[str]] = None) -> List[Tuple[Tuple[str, float], ...]]:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with timed("faiss"):
+            if categories and self.partitions is not None:
+                distances, indices = self.partitions.search(self.vector_store.index, vectors, k, categories)
+            else:
+                distances, indices = self.vector_store.index.search(vectors, k)
+        results = []
+        for row_indices, row_distances in zip(indices, distances):
+            hits = []
+            for i, distance in zip(row_indices, row_distances):
+                if i == -1:
+                    continue  # FAISS pads with -1 when fewer than k vectors exist
+                hits.append((self.vector_store.index_to_docstore_id[int(i)], float(distance)))
+            results.append(tuple(hits))
+        return results
+
+    def _resolve(self, hits) -> List[Tuple[Document, float]]:
+        results = []
+        for docstore_id, score in hits:
+            doc = self.vector_store.docstore.search(docstore_id)
+            if isinstance(doc, Document):
+                results.append((doc, score))
+        return results
+
+
+class CachedRetriever(BaseRetriever):
+    """LangChain retriever backed by a VectorSearcher, optionally compacting results with a ContextAssembler"""
+
+    searcher: Any
+    k: int = 4
+    assembler: Any = None
+    # Source categories to restrict retrieval to; None searches all (or the routed ones)
+    categories: Optional[List[str]] = None
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        documents = [doc for doc, _ in self.searcher.search(query, self.k, self.categories)]
+        if self.assembler is None:
+            return documents
+        with timed("context_assembly"):
+            documents, _ = self.assembler.assemble(documents)
+        return documents
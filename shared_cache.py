@@ -0,0 +1,129 @@
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Trim the namespace back to max_entries once every this many writes
+_TRIM_EVERY = 100
+
+
+class SharedCache:
+    """Key-value cache in a SQLite file read and written by several worker processes (WAL mode).
+
+    Rows carry an increasing id so a process can pull what the others added since
+    it last looked. Errors are logged and treated as misses: a cache must never
+    fail a request.
+    """
+
+    def __init__(self, path: str, namespace: str, max_entries: int = 10000, ttl_seconds: float = 0):
+        self.path = path
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, namespace TEXT NOT NULL, key TEXT NOT NULL, "
+            "tag TEXT NOT NULL DEFAULT '', value BLOB NOT NULL, created_at REAL NOT NULL, "
+            "UNIQUE (namespace, key))"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS cache_namespace ON cache (namespace, id)")
+        connection.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _cutoff(self) -> float:
+        return time.time() - self.ttl_seconds if self.ttl_seconds > 0 else 0.0
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            row = self._connection().execute(
+                "SELECT value FROM cache WHERE namespace = ? AND key = ? AND created_at >= ?",
+                (self.namespace, key, self._cutoff())
+            ).fetchone()
+        except sqlite3.Error as e:
+            self._failed("read", e)
+            return None
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return row[0]
+
+    def put(self, key: str, value: bytes, tag: str = ""):
+        connection = self._connection()
+        try:
+            with connection:
+                # REPLACE assigns a fresh id, so other processes see the new value as a change
+                connection.execute(
+                    "INSERT OR REPLACE INTO cache (namespace, key, tag, value, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (self.namespace, key, tag, value, time.time())
+                )
+                with self._lock:
+                    self._writes += 1
+                    trim = self._writes % _TRIM_EVERY == 0
+                if trim:
+                    connection.execute(
+                        "DELETE FROM cache WHERE namespace = ? AND (created_at < ? OR id <= ("
+                        "SELECT id FROM cache WHERE namespace = ? ORDER BY id DESC LIMIT 1 OFFSET ?))",
+                        (self.namespace, self._cutoff(), self.namespace, self.max_entries)
+                    )
+        except sqlite3.Error as e:
+            self._failed("write", e)
+
+    def changes(self, after_id: int, limit: int = 1000) -> List[Tuple[int, str, str, bytes, float]]:
+        """Rows written after ``after_id`` as (id, key, tag, value, created_at), oldest first"""
+        try:
+            return self._connection().execute(
+                "SELECT id, key, tag, value, created_at FROM cache "
+                "WHERE namespace = ? AND id > ? AND created_at >= ? ORDER BY id LIMIT ?",
+                (self.namespace, after_id, self._cutoff(), limit)
+            ).fetchall()
+        except sqlite3.Error as e:
+            self._failed("read", e)
+            return []
+
+    def delete_other_tags(self, keep_tag: str) -> int:
+        connection = self._connection()
+        try:
+            with connection:
+                return connection.execute(
+                    "DELETE FROM cache WHERE namespace = ? AND tag != ?", (self.namespace, keep_tag)
+                ).rowcount
+        except sqlite3.Error as e:
+            self._failed("write", e)
+            return 0
+
+    def _failed(self, operation: str, error: Exception):
+        with self._lock:
+            self.errors += 1
+        logger.warning(f"Shared cache {operation} failed ({self.namespace}): {error}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "path": self.path,
+                "namespace": self.namespace,
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self._writes,
+                "errors": self.errors,
+            }
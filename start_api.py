@@ -4,10 +4,18 @@ from config import settings
 if __name__ == "__main__":
     print("🚀 Starting Smart City API Server...")
     print(f"📡 API will run on: http://localhost:{settings.API_PORT}")
+    if settings.API_WORKERS > 1:
+        print(f"👥 Workers: {settings.API_WORKERS} ({settings.FAISS_INDEX_TYPE} index, cache: {settings.SHARED_CACHE_PATH}, "
+              f"history: {settings.HISTORY_BACKEND})")
+        if settings.FAISS_INDEX_TYPE in ("flat", "hnsw") or not settings.INDEX_MMAP:
+            # Only memory-mapped IVF lists are shared; anything else is a full copy in every worker
+            print(f"⚠️  Each worker holds its own copy of the {settings.FAISS_INDEX_TYPE} index "
+                  f"({settings.API_WORKERS}x its size in memory); use FAISS_INDEX_TYPE=ivfflat to share it")
     
     uvicorn.run(
         "main:app", 
         host="0.0.0.0", 
         port=settings.API_PORT,
+        workers=settings.API_WORKERS,
         reload=False
     )
\ No newline at end of file
@@ -1,96 +1,265 @@
+import json
+import time
+import uuid
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
 from config import settings
 
+EXAMPLE_QUESTIONS = {
+    "Building Permits": "How do I apply for a building permit?",
+    "Library Hours": "What are the library hours near downtown?",
+    "Waste Collection": "When is garbage collection in my zone?",
+}
+# Redraw a streaming answer at most this often; one redraw per token floods the browser connection
+RENDER_INTERVAL = 0.05
+# Messages drawn on each rerun; older ones stay in the session but are not re-sent to the browser
+VISIBLE_MESSAGES = 40
+
+@st.cache_resource
+def get_session() -> requests.Session:
+    """One pooled HTTP session shared by every browser session of this Streamlit server"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=settings.STREAMLIT_POOL_SIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def _timeout():
+    return settings.STREAMLIT_CONNECT_TIMEOUT, settings.STREAMLIT_READ_TIMEOUT
+
+def _raise_for_status(response: requests.Response):
+    if response.status_code in (429, 503) and "Retry-After" in response.headers:
+        raise RuntimeError(f"The assistant is busy, please retry in {response.headers['Retry-After']}s")
+    if response.status_code != 200:
+        raise RuntimeError(f"Error: {response.status_code} - {response.text}")
+
+def post_query(api_url, question, user_id):
+    """Non-streaming answer from /query, recorded in the user's history like any other question"""
+    response = get_session().post(
+        f"{api_url}/query", json={"question": question, "user_id": user_id}, timeout=_timeout()
+    )
+    _raise_for_status(response)
+    return response.json()
+
+@st.cache_data(ttl=settings.STREAMLIT_CACHE_TTL, show_spinner=False)
+def cached_search(api_url, query, top_k, categories):
+    response = get_session().post(
+        f"{api_url}/search",
+        json={"query": query, "top_k": top_k, "categories": list(categories) or None},
+        timeout=_timeout()
+    )
+    _raise_for_status(response)
+    return response.json()["results"]
+
+@st.cache_data(ttl=settings.STREAMLIT_CACHE_TTL, show_spinner=False)
+def cached_categories(api_url):
+    try:
+        response = get_session().get(f"{api_url}/categories", timeout=_timeout())
+        return list(response.json()["categories"]) if response.status_code == 200 else []
+    except requests.exceptions.RequestException:
+        return []
+
+def load_history(api_url, user_id):
+    """Chat messages the API recorded for this user, oldest first"""
+    try:
+        response = get_session().get(
+            f"{api_url}/history/{user_id}", params={"limit": VISIBLE_MESSAGES // 2}, timeout=_timeout()
+        )
+        entries = response.json()["history"] if response.status_code == 200 else []
+    except requests.exceptions.RequestException:
+        return []
+    messages = []
+    for entry in sorted(entries, key=lambda entry: entry["timestamp"]):
+        messages.append({"role": "user", "content": entry["question"]})
+        messages.append({"role": "assistant", "content": entry["answer"]})
+    return messages
+
+def get_user_id():
+    """Per-browser-session user id, kept in the URL so a page reload continues the same history"""
+    if "user_id" not in st.session_state:
+        user_id = (st.experimental_get_query_params().get("uid") or [None])[0] or uuid.uuid4().hex
+        st.experimental_set_query_params(uid=user_id)
+        st.session_state.user_id = user_id
+    return st.session_state.user_id
+
+def stream_query(api_url, question, user_id):
+    """Yield (event, data) pairs from the server-sent event stream of /query/stream"""
+    response = get_session().post(
+        f"{api_url}/query/stream",
+        json={"question": question, "user_id": user_id},
+        stream=True,
+        timeout=_timeout()
+    )
+    with response:
+        _raise_for_status(response)
+        event = "message"
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                event = "message"
+            elif line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                yield event, json.loads(line[len("data:"):].strip())
+
+def render_details(message):
+    if message.get("confidence") is not None:
+        st.caption(f"Confidence: {message['confidence']:.2%}")
+    if message.get("sources"):
+        st.caption(f"Sources: {', '.join(message['sources'][:3])}")
+
+def render_streamed_answer(api_url, question, user_id):
+    """Render answer tokens as they arrive and return the finished assistant message"""
+    answer_placeholder = st.empty()
+    answer = ""
+    message = {"role": "assistant", "content": ""}
+    last_render = 0.0
+
+    for event, data in stream_query(api_url, question, user_id):
+        if event == "sources":
+            message["sources"] = data.get("sources", [])
+        elif event == "token":
+            answer += data["text"]
+            if time.monotonic() - last_render >= RENDER_INTERVAL:
+                answer_placeholder.markdown(answer + "▌")
+                last_render = time.monotonic()
+        elif event == "done":
+            message["confidence"] = data.get("confidence")
+        elif event == "error":
+            raise RuntimeError(data.get("detail", "Streaming failed"))
+
+    message["content"] = answer or "No response received"
+    answer_placeholder.markdown(message["content"])
+    render_details(message)
+    return message
+
+def ask(question):
+    """Queue a question, e.g. from an example button, to be answered on the next run"""
+    st.session_state.pending_question = question
+
+def answer_question(api_url, question, use_crew_ai, user_id, example=False):
+    """Answer a question in an assistant chat bubble and return the message, or None on error"""
+    with st.chat_message("assistant"):
+        try:
+            if example:
+                # Not cached here: the API's response cache shares the answer and still records the history
+                data = post_query(api_url, question, user_id)
+            elif not use_crew_ai:
+                return render_streamed_answer(api_url, question, user_id)
+            else:
+                with st.spinner("Searching city database..."):
+                    response = get_session().post(
+                        f"{api_url}/query-crew",
+                        json={"question": question, "user_id": user_id},
+                        timeout=_timeout()
+                    )
+                    _raise_for_status(response)
+                    data = response.json()
+            message = {
+                "role": "assistant",
+                "content": data.get("answer", "No response received"),
+                "confidence": data.get("confidence"),
+                "sources": data.get("sources", [])
+            }
+            st.markdown(message["content"])
+            render_details(message)
+            return message
+        except requests.exceptions.ConnectionError:
+            st.error("Cannot connect to the API. Please ensure the FastAPI server is running.")
+        except requests.exceptions.Timeout:
+            st.error("The API took too long to respond. Please try again.")
+        except Exception as e:
+            st.error(f"An error occurred: {str(e)}")
+    return None
+
+def render_search(api_url):
+    """Sidebar search over the knowledge base, without the LLM"""
+    st.header("Search")
+    query = st.text_input("Search the knowledge base")
+    categories = st.multiselect("Categories", cached_categories(api_url))
+    top_k = st.slider("Results", min_value=1, max_value=10, value=5)
+    if not query:
+        return
+    try:
+        results = cached_search(api_url, query, top_k, tuple(sorted(categories)))
+    except requests.exceptions.RequestException:
+        st.error("Cannot connect to the API. Please ensure the FastAPI server is running.")
+        return
+    except Exception as e:
+        st.error(f"An error occurred: {str(e)}")
+        return
+    for result in results:
+        # Hybrid scores are rank-fusion relevance (higher is better), dense scores L2 distance (lower is better)
+        label = "relevance" if result.get("score_type") == "rrf" else "distance"
+        with st.expander(f"{result['metadata'].get('title', 'Unknown')} ({label} {result['score']:.3f})"):
+            st.markdown(result["content"])
+
 def main():
     st.set_page_config(
         page_title="Smart City Assistant",
         page_icon="🏛️",
         layout="wide"
     )
-    
+
     st.title("🏛️ Smart City Information Assistant")
     st.markdown("Your intelligent guide to city services, facilities, and policies")
-    
+
+    user_id = get_user_id()
+
     # Sidebar for configuration
     with st.sidebar:
         st.header("Settings")
         api_url = st.text_input("API URL", value=f"http://localhost:{settings.API_PORT}")
         use_crew_ai = st.checkbox("Use CrewAI Multi-Agent System", value=False)
-        
+
         st.header("Quick Actions")
         if st.button("Clear History"):
+            # A fresh user id starts a new history bucket on the API as well
+            st.session_state.user_id = uuid.uuid4().hex
+            st.experimental_set_query_params(uid=st.session_state.user_id)
             st.session_state.messages = []
             st.rerun()
-    
-    # Initialize chat history
+
+        render_search(api_url)
+
+    # Initialize chat history, restoring what the API recorded if the page was reloaded
     if "messages" not in st.session_state:
-        st.session_state.messages = []
-    
+        st.session_state.messages = load_history(api_url, user_id)
+
     # Display chat history
-    for message in st.session_state.messages:
+    messages = st.session_state.messages
+    if len(messages) > VISIBLE_MESSAGES:
+        st.caption(f"{len(messages) - VISIBLE_MESSAGES} earlier messages not shown")
+    for message in messages[-VISIBLE_MESSAGES:]:
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
-    
-    # Chat input
-    if prompt := st.chat_input("Ask me about city services, facilities, or policies..."):
+            render_details(message)
+
+    # Chat input, or a question queued by an example button
+    prompt = st.chat_input("Ask me about city services, facilities, or policies...")
+    example = prompt is None and "pending_question" in st.session_state
+    if example:
+        prompt = st.session_state.pop("pending_question")
+    else:
+        st.session_state.pop("pending_question", None)
+
+    if prompt:
         # Add user message to chat history
         st.session_state.messages.append({"role": "user", "content": prompt})
         with st.chat_message("user"):
             st.markdown(prompt)
-        
+
         # Get bot response
-        with st.chat_message("assistant"):
-            with st.spinner("Searching city database..."):
-                try:
-                    endpoint = "/query-crew" if use_crew_ai else "/query"
-                    response = requests.post(
-                        f"{api_url}{endpoint}",
-                        json={"question": prompt}
-                    )
-                    
-                    if response.status_code == 200:
-                        data = response.json()
-                        answer = data.get("answer", "No response received")
-                        
-                        st.markdown(answer)
-                        
-                        if "confidence" in data:
-                            st.caption(f"Confidence: {data['confidence']:.2%}")
-                        if "sources" in data and data["sources"]:
-                            st.caption(f"Sources: {', '.join(data['sources'][:3])}")
-                        
-                        st.session_state.messages.append({
-                            "role": "assistant", 
-                            "content": answer
-                        })
-                    else:
-                        error_msg = f"Error: {response.status_code} - {response.text}"
-                        st.error(error_msg)
-                        
-                except requests.exceptions.ConnectionError:
-                    error_msg = "Cannot connect to the API. Please ensure the FastAPI server is running."
-                    st.error(error_msg)
-                except Exception as e:
-                    error_msg = f"An error occurred: {str(e)}"
-                    st.error(error_msg)
-    
+        message = answer_question(api_url, prompt, use_crew_ai, user_id, example)
+        if message is not None:
+            st.session_state.messages.append(message)
+
     # Example queries
     st.markdown("---")
     st.subheader("Example Questions")
-    col1, col2, col3 = st.columns(3)
-    
-    with col1:
-        if st.button("Building Permits"):
-            st.rerun()
-    
-    with col2:
-        if st.button("Library Hours"):
-            st.rerun()
-    
-    with col3:
-        if st.button("Waste Collection"):
-            st.rerun()
+    for column, (label, question) in zip(st.columns(len(EXAMPLE_QUESTIONS)), EXAMPLE_QUESTIONS.items()):
+        with column:
+            st.button(label, on_click=ask, args=(question,))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,43 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from config import settings  # noqa: E402
+
+KNOWLEDGE_FILE = os.path.join(ROOT, "knowledge.json")
+
+
+@pytest.fixture(scope="session")
+def processor(tmp_path_factory):
+    """Knowledge base processor over the bundled knowledge.json, embedded with the offline hashing embedder"""
+    from benchmark import HashingEmbeddings
+    from knowledge_processor import KnowledgeBaseProcessor
+
+    index_path = settings.INDEX_PATH
+    settings.INDEX_PATH = str(tmp_path_factory.mktemp("index") / "faiss_index")
+    try:
+        processor = KnowledgeBaseProcessor(embedding_model=HashingEmbeddings())
+        processor.load_from_file(KNOWLEDGE_FILE)
+    finally:
+        settings.INDEX_PATH = index_path
+    return processor
+
+
+@pytest.fixture(scope="session")
+def rag(processor):
+    """SmartCityRAG over the processor's index, answering with the benchmark's stub LLM"""
+    from benchmark import StubLLM
+    from rag_system import SmartCityRAG
+
+    return SmartCityRAG(
+        processor.vector_store,
+        index_version=processor.index_version,
+        lexical_index=processor.lexical_index,
+        field_index=processor.field_index,
+        partitions=processor.partitions,
+        llm=StubLLM(latency_ms=0, tokens=5)
+    )
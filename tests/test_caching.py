@@ -0,0 +1,39 @@
+from caching import CachedEmbeddings
+
+
+class RecordingEmbeddings:
+    """Embeds text as its length and records what it was asked to embed"""
+
+    def __init__(self):
+        self.texts = []
+
+    def embed_query(self, text):
+        self.texts.append(text)
+        return [float(len(text)), 1.0]
+
+    def embed_documents(self, texts):
+        self.texts.extend(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+def test_query_is_embedded_in_the_form_it_is_cached_under():
+    model = RecordingEmbeddings()
+    embeddings = CachedEmbeddings(model, max_entries=10)
+
+    first = embeddings.embed_query("Where is City Hall?")
+    second = embeddings.embed_query("where is city hall")
+
+    assert model.texts == ["where is city hall"]
+    assert first == second
+
+
+def test_batch_embeds_each_distinct_normalized_query_once():
+    model = RecordingEmbeddings()
+    embeddings = CachedEmbeddings(model, max_entries=10)
+    embeddings.embed_query("Library hours?")
+
+    vectors = embeddings.embed_query_vectors(["library hours", "Bus fare!", "bus fare", "BUS FARE?"])
+
+    assert model.texts == ["library hours", "bus fare"]
+    assert vectors.shape == (4, 2)
+    assert (vectors[1] == vectors[3]).all()
@@ -0,0 +1,42 @@
+import contextvars
+import threading
+import time
+
+import executor
+from crew_agents import QueryContext, SmartCityAgents
+
+
+class DeadlineTask:
+    """Task stand-in reporting the deadline its thread sees"""
+
+    def execute(self, context=None):
+        return executor.remaining_time()
+
+
+def test_tasks_run_with_the_callers_deadline():
+    agents = SmartCityAgents(rag_system=None)
+
+    def request():
+        executor._deadline.set(time.monotonic() + 5)
+        return agents._submit(QueryContext("q", {}), DeadlineTask()).result()
+
+    try:
+        remaining = contextvars.copy_context().run(request)
+    finally:
+        agents.shutdown()
+    assert 4 < float(remaining) <= 5
+
+
+def test_parallel_tool_calls_are_all_counted():
+    context = QueryContext("q", {})
+
+    def call_tools():
+        for _ in range(1000):
+            context.count_tool_call()
+
+    threads = [threading.Thread(target=call_tools) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert context.tool_calls == 8000
@@ -0,0 +1,45 @@
+import threading
+import time
+
+from embedding_batcher import BatchingEmbeddings
+
+
+class SlowEmbeddings:
+    """Takes a fixed time per encode call, however many texts it gets"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(len(texts))
+        time.sleep(self.seconds)
+        return [[float(len(text))] for text in texts]
+
+
+def test_lone_query_does_not_wait_for_the_window():
+    batcher = BatchingEmbeddings(SlowEmbeddings(0), max_wait_ms=500)
+
+    start = time.perf_counter()
+    assert batcher.embed_query("library hours") == [13.0]
+    assert time.perf_counter() - start < 0.25
+    assert batcher.stats()["batches"] == 1
+
+
+def test_concurrent_queries_are_batched():
+    model = SlowEmbeddings(0.1)
+    batcher = BatchingEmbeddings(model, max_batch_size=32, max_wait_ms=20)
+    results = {}
+
+    def query(i):
+        results[i] = batcher.embed_query("x" * i)
+
+    threads = [threading.Thread(target=query, args=(i,)) for i in range(1, 9)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == {i: [float(i)] for i in range(1, 9)}
+    assert sum(model.calls) == 8
+    assert len(model.calls) < 8
@@ -0,0 +1,87 @@
+import asyncio
+import contextvars
+import threading
+import time
+
+import pytest
+
+import executor
+from executor import BoundedExecutor, DeadlineExceededError, OverloadedError
+
+_request_id: contextvars.ContextVar = contextvars.ContextVar("request_id", default=None)
+
+
+def test_full_queue_sheds_load():
+    pool = BoundedExecutor("test", max_workers=1, max_queue_depth=1, retry_after=7)
+    release = threading.Event()
+
+    async def scenario():
+        running = asyncio.ensure_future(pool.run(release.wait))
+        queued = asyncio.ensure_future(pool.run(release.wait))
+        await asyncio.sleep(0.05)
+        with pytest.raises(OverloadedError) as overloaded:
+            await pool.run(release.wait)
+        release.set()
+        await asyncio.gather(running, queued)
+        return overloaded.value
+
+    error = asyncio.run(scenario())
+    assert error.retry_after == 7
+    assert pool.stats()["rejected"] == 1
+    # Shed work never took a slot, so the pool accepts work again
+    assert asyncio.run(pool.run(lambda: "ok")) == "ok"
+
+
+def test_overloaded_error_becomes_503_with_retry_after():
+    from starlette.requests import Request
+
+    import main
+
+    request = Request({"type": "http", "method": "POST", "path": "/query", "headers": []})
+    response = asyncio.run(main.overloaded_handler(request, OverloadedError("generation", 7)))
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "7"
+
+
+def test_deadline_and_context_follow_work_into_the_pool():
+    pool = BoundedExecutor("test", max_workers=2, max_queue_depth=2)
+
+    def work():
+        return _request_id.get(), executor.remaining_time()
+
+    async def scenario():
+        _request_id.set("request-1")
+        return await pool.run(work, timeout=5)
+
+    request_id, remaining = asyncio.run(scenario())
+    assert request_id == "request-1"
+    assert 4 < remaining <= 5
+    # Outside a work item there is no deadline
+    assert executor.remaining_time() is None
+
+
+def test_work_past_its_deadline_raises():
+    pool = BoundedExecutor("test", max_workers=1, max_queue_depth=1)
+
+    with pytest.raises(DeadlineExceededError):
+        asyncio.run(pool.run(time.sleep, 0.5, timeout=0.1))
+    assert pool.stats()["timed_out"] == 1
+
+
+def test_stream_deadline_covers_the_whole_stream():
+    pool = BoundedExecutor("test", max_workers=1, max_queue_depth=1)
+
+    def slow_items():
+        for i in range(10):
+            time.sleep(0.05)
+            yield i
+
+    async def scenario():
+        items = []
+        with pytest.raises(DeadlineExceededError):
+            async for item in pool.stream(slow_items, timeout=0.2):
+                items.append(item)
+        return items
+
+    items = asyncio.run(scenario())
+    assert 0 < len(items) < 10
@@ -0,0 +1,36 @@
+from conftest import KNOWLEDGE_FILE
+from field_index import FieldIndex
+from ingestion import iter_knowledge_items
+
+
+def _field_index(**kwargs):
+    index = FieldIndex(**kwargs)
+    for section, position, item in iter_knowledge_items(KNOWLEDGE_FILE):
+        if section != "test_queries" and isinstance(item, dict):
+            index.add_item(item.get("id") or f"{section}-{position}", item)
+    return index
+
+
+def test_field_lookup_is_answered_from_the_named_item():
+    index = _field_index()
+
+    hours = index.match("What are the library hours?")
+    phone = index.match("What is the phone number for the building department?")
+
+    assert hours["field"] == "hours" and hours["item_id"] == "PF001"
+    assert phone["field"] == "contact" and phone["item_id"] == "CS001"
+
+
+def test_sub_entity_question_falls_through():
+    index = _field_index()
+    assert index.match("What are the pool hours at the recreation center?") is None
+
+
+def test_partial_matches_need_a_lower_min_score():
+    index = _field_index(min_score=0.5)
+    assert index.match("What are the pool hours at the recreation center?") is not None
+
+
+def test_procedural_questions_are_not_field_lookups():
+    index = _field_index()
+    assert index.match("How do I apply for a building permit?") is None
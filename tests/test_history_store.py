@@ -0,0 +1,37 @@
+import threading
+import time
+
+import pytest
+
+from history_store import HistoryStore, SQLiteHistoryStore
+
+
+def test_history_store_requires_append_and_page():
+    with pytest.raises(TypeError):
+        HistoryStore()
+
+
+def test_close_writes_queued_entries(tmp_path):
+    path = str(tmp_path / "history.db")
+    store = SQLiteHistoryStore(path)
+    for i in range(5):
+        store.append("user", f"question {i}", f"answer {i}")
+    store.close()
+
+    entries, _ = SQLiteHistoryStore(path).page("user")
+    assert [entry["question"] for entry in entries] == [f"question {i}" for i in range(5)]
+
+
+def test_close_does_not_hang_on_a_stuck_writer(tmp_path, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(SQLiteHistoryStore, "_write", lambda self, rows: release.wait())
+    store = SQLiteHistoryStore(str(tmp_path / "history.db"), max_pending_writes=2)
+    store.append("user", "first", "answer")
+    time.sleep(0.05)
+    store.append("user", "second", "answer")
+    store.append("user", "third", "answer")
+
+    start = time.monotonic()
+    store.close(timeout=0.2)
+    assert time.monotonic() - start < 1.0
+    release.set()
@@ -0,0 +1,122 @@
+import json
+import os
+
+import pytest
+
+from config import settings
+
+
+def _write_knowledge(path, items):
+    with open(path, "w") as f:
+        json.dump({"knowledge_base": {"city_services": items}}, f)
+
+
+def _item(item_id, content):
+    return {"id": item_id, "title": item_id.title(), "category": "Services", "content": content}
+
+
+class CountingEmbeddings:
+    """Hashing embedder that records every text it embeds"""
+
+    def __init__(self):
+        from benchmark import HashingEmbeddings
+
+        self.model = HashingEmbeddings()
+        self.texts = []
+
+    def embed_documents(self, texts):
+        self.texts.extend(texts)
+        return self.model.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.model.embed_query(text)
+
+
+@pytest.fixture
+def make_processor(tmp_path, monkeypatch):
+    """Fresh processors sharing one index directory under tmp_path"""
+    from benchmark import HashingEmbeddings
+    from knowledge_processor import KnowledgeBaseProcessor
+
+    monkeypatch.setattr(settings, "INDEX_PATH", str(tmp_path / "faiss_index"))
+    monkeypatch.setattr(settings, "EMBED_PROCESSES", 0)
+    return lambda embedding_model=None: KnowledgeBaseProcessor(embedding_model=embedding_model or HashingEmbeddings())
+
+
+def _versions(index_path):
+    directory, name = os.path.split(index_path)
+    return sorted(entry for entry in os.listdir(directory) if entry.startswith(f"{name}.v-"))
+
+
+def test_saved_index_is_published_by_symlink_and_old_versions_pruned(tmp_path, make_processor):
+    knowledge_file = str(tmp_path / "knowledge.json")
+    for round_ in range(3):
+        _write_knowledge(knowledge_file, [_item("library", f"Library hours, revision {round_}.")])
+        make_processor().load_from_file(knowledge_file)
+
+    index_path = settings.INDEX_PATH
+    assert os.path.islink(index_path)
+    versions = _versions(index_path)
+    # The live version plus the one it replaced
+    assert len(versions) == 2
+    assert os.path.basename(os.path.realpath(index_path)) == versions[-1]
+
+
+def test_legacy_index_directory_is_replaced(tmp_path, make_processor):
+    knowledge_file = str(tmp_path / "knowledge.json")
+    _write_knowledge(knowledge_file, [_item("library", "Library hours.")])
+    make_processor().load_from_file(knowledge_file)
+    index_path = settings.INDEX_PATH
+    live = os.path.realpath(index_path)
+    os.remove(index_path)
+    os.rename(live, index_path)
+
+    _write_knowledge(knowledge_file, [_item("library", "Library hours, extended.")])
+    processor = make_processor()
+    processor.load_from_file(knowledge_file)
+
+    assert os.path.islink(index_path)
+    assert "extended" in processor.vector_store.similarity_search("library hours", k=1)[0].page_content
+
+
+def test_update_embeds_only_added_and_changed_items(tmp_path, make_processor):
+    knowledge_file = str(tmp_path / "knowledge.json")
+    _write_knowledge(knowledge_file, [
+        _item("library", "Library opens at 9am."),
+        _item("parking", "Parking permits cost $40."),
+        _item("pool", "The pool closes in winter."),
+    ])
+    make_processor().load_from_file(knowledge_file)
+
+    _write_knowledge(knowledge_file, [
+        _item("library", "Library opens at 9am."),
+        _item("parking", "Parking permits cost $55."),
+        _item("recycling", "Recycling is collected on Fridays."),
+    ])
+    embeddings = CountingEmbeddings()
+    processor = make_processor(embeddings)
+    processor.load_from_file(knowledge_file)
+
+    embedded = " ".join(embeddings.texts)
+    assert "$55" in embedded and "Fridays" in embedded
+    assert "9am" not in embedded
+    manifest = processor._read_manifest()
+    assert set(manifest["items"]) == {"library", "parking", "recycling"}
+    assert set(manifest["chunks"].values()) == {"library", "parking", "recycling"}
+    store = processor.vector_store
+    contents = " ".join(store.docstore.search(chunk_id).page_content for chunk_id in store.index_to_docstore_id.values())
+    assert "winter" not in contents and "$40" not in contents
+    assert "9am" in contents and "$55" in contents and "Fridays" in contents
+
+
+def test_unchanged_knowledge_reuses_the_saved_index(tmp_path, make_processor):
+    knowledge_file = str(tmp_path / "knowledge.json")
+    _write_knowledge(knowledge_file, [_item("library", "Library opens at 9am.")])
+    make_processor().load_from_file(knowledge_file)
+    live = os.path.realpath(settings.INDEX_PATH)
+
+    embeddings = CountingEmbeddings()
+    make_processor(embeddings).load_from_file(knowledge_file)
+
+    assert embeddings.texts == []
+    assert os.path.realpath(settings.INDEX_PATH) == live
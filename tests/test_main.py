@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+import main
+from executor import DeadlineExceededError
+from models import QueryRequest
+
+
+class FakeRAG:
+    """Records query calls; the first raises the given error, later ones answer"""
+
+    def __init__(self, error):
+        self.error = error
+        self.calls = []
+
+    def categories(self):
+        return {"permits": 3, "parks": 2}
+
+    def query(self, question, categories=None):
+        self.calls.append(categories)
+        if len(self.calls) == 1:
+            raise self.error
+        return {"answer": "From permits", "confidence": 0.8, "sources": ["Permits"], "answer_path": "llm"}
+
+
+@pytest.fixture
+def fake_rag(monkeypatch):
+    def install(error):
+        rag = FakeRAG(error)
+        monkeypatch.setattr(main, "rag_system", rag)
+        monkeypatch.setattr(main, "crew_agents", object())
+        return rag
+    return install
+
+
+def _query_crew(**request):
+    return asyncio.run(main.query_crew_endpoint(QueryRequest(question="Permit fees?", **request)))
+
+
+def test_crew_fallback_keeps_the_requested_categories(fake_rag):
+    rag = fake_rag(RuntimeError("model crashed"))
+
+    result = _query_crew(categories=["permits"])
+
+    assert result["method"] == "RAG Fallback"
+    assert rag.calls == [["permits"], ["permits"]]
+
+
+def test_crew_request_past_its_deadline_is_not_answered_again(fake_rag):
+    rag = fake_rag(DeadlineExceededError("generation", 30))
+
+    with pytest.raises(DeadlineExceededError):
+        _query_crew()
+
+    assert len(rag.calls) == 1
+
+
+def test_search_results_say_how_to_read_their_scores(rag, monkeypatch):
+    from models import SearchRequest
+
+    monkeypatch.setattr(main, "rag_system", rag)
+    response = asyncio.run(main.search_endpoint(SearchRequest(query="library hours", top_k=3)))
+
+    results = response["results"]
+    assert {result.score_type for result in results} == {"rrf"}
+    scores = [result.score for result in results]
+    assert scores == sorted(scores, reverse=True)
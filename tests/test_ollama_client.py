@@ -0,0 +1,147 @@
+import contextvars
+import socket
+import threading
+import time
+
+import pytest
+import requests
+
+import executor
+import ollama_stub
+from executor import DeadlineExceededError
+from ollama_client import FairSemaphore, OllamaClient
+
+
+@pytest.fixture
+def stub():
+    """Start a stub Ollama server on a free port; yields (base_url, state)"""
+    servers = []
+
+    def start(**options):
+        server = ollama_stub.serve(0, latency_ms=options.pop("latency_ms", 0), tokens=options.pop("tokens", 3),
+                                   **options)
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}", server.RequestHandlerClass.state
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _client(base_url, **options):
+    options.setdefault("retry_backoff", 0.01)
+    return OllamaClient(base_url, "stub", **options)
+
+
+def _with_deadline(seconds, fn, *args):
+    """Call fn the way a pool work item with this deadline would"""
+    def call():
+        executor._deadline.set(time.monotonic() + seconds)
+        return fn(*args)
+    return contextvars.copy_context().run(call)
+
+
+def test_overload_response_is_retried(stub, monkeypatch):
+    base_url, state = stub(fail_rate=0.5)
+    # The first request fails, every later one succeeds
+    outcomes = iter([0.0])
+    monkeypatch.setattr(ollama_stub.random, "random", lambda: next(outcomes, 1.0))
+    client = _client(base_url)
+
+    result = client.generate("library hours")
+
+    assert result["done"] is True
+    assert state.failures == 1
+    assert client.stats()["retries"] == 1
+    assert client.stats()["errors"] == 0
+
+
+def test_connection_failure_is_retried_then_raised():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    client = _client(f"http://127.0.0.1:{port}", max_retries=2)
+
+    with pytest.raises(requests.ConnectionError):
+        client.generate("library hours")
+
+    stats = client.stats()
+    assert stats["requests"] == 3
+    assert stats["retries"] == 2
+    assert stats["errors"] == 1
+
+
+def test_slow_generation_raises_deadline_exceeded(stub):
+    base_url, _ = stub(latency_ms=100, tokens=20)
+    client = _client(base_url)
+
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceededError):
+        _with_deadline(0.2, client.generate, "library hours")
+
+    assert time.monotonic() - start < 1.0
+    assert client.stats()["timeouts"] == 1
+
+
+def test_waiting_for_a_slot_is_bounded_by_the_deadline(stub):
+    base_url, _ = stub(latency_ms=100, tokens=10)
+    client = _client(base_url, max_concurrency=1)
+    holder = threading.Thread(target=client.generate, args=("first",))
+    holder.start()
+    time.sleep(0.05)
+
+    with pytest.raises(DeadlineExceededError):
+        _with_deadline(0.1, client.generate, "second")
+    holder.join()
+
+
+def test_concurrent_generations_are_capped(stub):
+    base_url, state = stub(latency_ms=20, tokens=5)
+    client = _client(base_url, max_concurrency=2)
+
+    threads = [threading.Thread(target=client.generate, args=(f"question {i}",)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert state.requests == 8
+    assert state.peak_active == 2
+    assert client.stats()["in_flight"] == 0
+
+
+def test_fair_semaphore_serves_waiters_in_arrival_order():
+    semaphore = FairSemaphore(1)
+    assert semaphore.acquire()
+    order = []
+
+    def waiter(name):
+        semaphore.acquire()
+        order.append(name)
+        semaphore.release()
+
+    threads = []
+    for name in ("a", "b", "c"):
+        threads.append(threading.Thread(target=waiter, args=(name,)))
+        threads[-1].start()
+        while semaphore.waiting < len(threads):
+            time.sleep(0.001)
+    semaphore.release()
+    for thread in threads:
+        thread.join()
+
+    assert order == ["a", "b", "c"]
+    # The slot is free again once everyone is done
+    assert semaphore.acquire(timeout=0)
+
+
+def test_keep_alive_connection_is_reused(stub):
+    base_url, state = stub()
+    client = _client(base_url)
+
+    for i in range(5):
+        client.generate(f"question {i}")
+
+    assert state.requests == 5
+    assert state.connections == 1
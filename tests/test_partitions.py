@@ -0,0 +1,36 @@
+import numpy as np
+
+from partitions import CategoryPartitions
+
+
+def test_flat_index_filters_by_selector_without_sub_indexes(processor):
+    assert processor.index_report["type"] == "flat"
+    assert processor.index_report["params"]["partitions"] is False
+    assert processor.partitions is not None
+    assert processor.partitions.indexes == {}
+
+
+def test_filtered_search_matches_exact_search_within_categories(processor):
+    partitions = processor.partitions
+    index = processor.vector_store.index
+    category = partitions.categories[0]
+    query = index.reconstruct(int(partitions.rows[category][0])).reshape(1, -1)
+
+    _, rows = partitions.search(index, query, 3, [category])
+    assert set(rows[0][rows[0] >= 0]) <= set(partitions.rows[category].tolist())
+    assert rows[0][0] == partitions.rows[category][0]
+
+
+def test_approximate_index_types_get_sub_indexes():
+    vectors = np.random.default_rng(0).random((200, 8), dtype=np.float32)
+    categories = ["a"] * 100 + ["b"] * 100
+    params = {"type": "hnsw", "m": 8, "ef_construction": 40}
+    partitions = CategoryPartitions.build(vectors, categories, params)
+    assert sorted(partitions.indexes) == ["a", "b"]
+
+
+def test_retrieve_honours_categories(processor, rag):
+    category = processor.partitions.categories[0]
+    documents = rag.retrieve("city services hours and fees", k=4, categories=[category])
+    assert documents
+    assert {doc.metadata["source_category"] for doc in documents} == {category}
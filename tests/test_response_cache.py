@@ -0,0 +1,91 @@
+import time
+
+import numpy as np
+
+from response_cache import SemanticResponseCache, normalize_question
+
+_VECTORS = {
+    "when is garbage collection": [1.0, 0.0, 0.0],
+    "what day is trash pickup": [0.95, 0.31, 0.0],
+    "how do i renew a parking permit": [0.6, 0.8, 0.0],
+    "garbage collection in zone a": [0.0, 0.0, 1.0],
+    "garbage collection in zone b": [0.0, 0.0, 1.0],
+}
+
+
+def _embed(question):
+    return _VECTORS.get(question, [0.0, 1.0, 0.0])
+
+
+def _response(answer):
+    return {"answer": answer, "confidence": 0.9, "sources": ["Waste Collection"]}
+
+
+def _cache(**options):
+    return SemanticResponseCache(_embed, similarity_threshold=0.92, **options)
+
+
+def test_similar_question_above_threshold_hits():
+    cache = _cache()
+    cache.put("When is garbage collection?", "v1", _response("Tuesdays"))
+
+    hit, _ = cache.lookup("What day is trash pickup?", "v1")
+    miss, _ = cache.lookup("How do I renew a parking permit?", "v1")
+
+    assert hit["answer"] == "Tuesdays"
+    assert miss is None
+    stats = cache.stats()
+    assert stats["semantic_hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_exact_normalized_match_skips_embedding():
+    cache = _cache()
+    cache.put("When is garbage collection?", "v1", _response("Tuesdays"))
+
+    hit, embedding = cache.lookup("when is GARBAGE collection", "v1")
+    assert hit["answer"] == "Tuesdays"
+    assert embedding is None
+
+
+def test_discriminator_mismatch_misses_despite_identical_embedding():
+    cache = _cache()
+    cache.put("Garbage collection in Zone A", "v1", _response("Mondays"))
+    assert np.allclose(_embed(normalize_question("Garbage collection in Zone A")),
+                       _embed(normalize_question("Garbage collection in Zone B")))
+
+    miss, _ = cache.lookup("Garbage collection in Zone B", "v1")
+    assert miss is None
+
+
+def test_expired_entries_are_not_served():
+    cache = _cache(ttl_seconds=0.05)
+    cache.put("When is garbage collection?", "v1", _response("Tuesdays"))
+    time.sleep(0.1)
+
+    miss, _ = cache.lookup("What day is trash pickup?", "v1")
+    assert miss is None
+    assert cache.stats()["expirations"] == 1
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = _cache(max_entries=2)
+    cache.put("When is garbage collection?", "v1", _response("Tuesdays"))
+    cache.put("How do I renew a parking permit?", "v1", _response("Online"))
+    cache.lookup("When is garbage collection?", "v1")
+    cache.put("Garbage collection in Zone A", "v1", _response("Mondays"))
+
+    assert cache.lookup("When is garbage collection?", "v1")[0] is not None
+    assert cache.lookup("How do I renew a parking permit?", "v1")[0] is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_are_scoped_to_the_index_version():
+    cache = _cache()
+    cache.put("When is garbage collection?", "v1", _response("Tuesdays"))
+
+    assert cache.lookup("When is garbage collection?", "v2")[0] is None
+    assert cache.invalidate(keep_version="v2") == 1
+    assert cache.lookup("When is garbage collection?", "v1")[0] is None
+    assert cache.stats()["invalidations"] == 1
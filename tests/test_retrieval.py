@@ -0,0 +1,80 @@
+from typing import List
+
+from langchain.schema.embeddings import Embeddings
+from langchain.vectorstores import FAISS
+
+from caching import LRUCache
+from lexical_index import BM25Index, identifier_tokens
+from retrieval import VectorSearcher, reciprocal_rank_fusion
+
+_TOPICS = ["parking", "utility", "pet", "property", "traffic"]
+
+
+class TopicEmbeddings(Embeddings):
+    """One dimension per topic word, so the dense ranking is known in advance"""
+
+    def embed_query(self, text: str) -> List[float]:
+        text = text.lower()
+        return [float(text.count(topic)) + 0.01 for topic in _TOPICS]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+
+def _topic_searcher():
+    texts = [
+        "Downtown parking: pay tickets and fines online or with the ParkMetro app. Parking violations start at $25.",
+        "Utility bills are due within 30 days of the statement date.",
+        "Pet licenses must be renewed within 30 days of moving.",
+        "Property maintenance complaints are inspected within 30 days.",
+        "Traffic speed limits are 30 mph in residential areas.",
+        "Room 205 hosts the permit counter; bring form BP-101.",
+    ]
+    vector_store = FAISS.from_texts(texts, TopicEmbeddings(), metadatas=[{"title": text[:20]} for text in texts])
+    return VectorSearcher(vector_store, "test", LRUCache("test_results", 0), BM25Index.from_vector_store(vector_store))
+
+
+def _searcher(processor):
+    return VectorSearcher(processor.vector_store, processor.index_version, LRUCache("test_results", 0),
+                          processor.lexical_index)
+
+
+def _titles(hits):
+    return [doc.metadata.get("title") for doc, _ in hits]
+
+
+def test_bare_numbers_are_not_identifiers():
+    assert identifier_tokens("Where do I pay a parking ticket within 30 days?") == set()
+    assert identifier_tokens("Can I build a 2 story garage with 1 employee?") == set()
+
+
+def test_identifier_shapes():
+    assert identifier_tokens("Where do I get form BP-101?") == {"bp-101"}
+    assert identifier_tokens("Which floor is Room 205 on?") == {"room", "205"}
+
+
+def test_weighted_fusion_boosts_exact_list():
+    fused = reciprocal_rank_fusion([["a", "b"], ["b", "a"], ["a"]], k=2, rrf_k=60, weights=[1.0, 1.0, 2.0])
+    assert [doc_id for doc_id, _ in fused] == ["a", "b"]
+
+
+def test_number_bearing_question_keeps_semantic_match():
+    hits = _topic_searcher().search("Where do I pay a parking ticket within 30 days?", 4)
+    assert any(title.startswith("Downtown parking") for title in _titles(hits))
+
+
+def test_identifier_match_is_boosted_to_the_top():
+    hits = _topic_searcher().search("Where is Room 205?", 3)
+    assert _titles(hits)[0].startswith("Room 205")
+    assert len(hits) == 3
+
+
+def test_identifier_query_still_fuses_dense_results(processor):
+    hits = _searcher(processor).search("What do I need for a building permit application form BP-101?", 4)
+    assert len(hits) == 4
+
+
+def test_score_type_follows_the_search_mode(processor):
+    dense = VectorSearcher(processor.vector_store, processor.index_version, LRUCache("test_results", 0))
+    assert dense.score_type == "distance"
+    assert _searcher(processor).score_type == "rrf"
@@ -0,0 +1,77 @@
+import threading
+import time
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def _run_concurrently(flight, count, fn):
+    """Start count callers of the same key once the first is in flight; return their outcomes"""
+    outcomes = [None] * count
+
+    def call(i):
+        try:
+            outcomes[i] = flight.do("key", fn)
+        except Exception as e:
+            outcomes[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(count)]
+    threads[0].start()
+    while flight.stats()["in_flight"] == 0:
+        time.sleep(0.001)
+    for thread in threads[1:]:
+        thread.start()
+    while flight.stats()["waiting"] < count - 1:
+        time.sleep(0.001)
+    return threads, outcomes
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight("test")
+    release = threading.Event()
+    result = {"answer": 42}
+
+    def work():
+        release.wait()
+        return result
+
+    threads, outcomes = _run_concurrently(flight, 5, work)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert all(outcome is result for outcome in outcomes)
+    stats = flight.stats()
+    assert stats["executions"] == 1
+    assert stats["coalesced"] == 4
+    assert stats["in_flight"] == 0
+
+
+def test_exception_reaches_every_waiter():
+    flight = SingleFlight("test")
+    release = threading.Event()
+    error = ValueError("index unavailable")
+
+    def work():
+        release.wait()
+        raise error
+
+    threads, outcomes = _run_concurrently(flight, 4, work)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert all(outcome is error for outcome in outcomes)
+    # The failed call is not remembered; the next caller runs again
+    assert flight.do("key", lambda: "retried") == "retried"
+    assert flight.stats()["executions"] == 2
+
+
+def test_different_keys_do_not_coalesce():
+    flight = SingleFlight("test")
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("b", lambda: 2) == 2
+    with pytest.raises(KeyError):
+        flight.do("c", dict().__getitem__, "missing")
+    assert flight.stats()["coalesced"] == 0
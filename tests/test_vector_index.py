@@ -0,0 +1,36 @@
+import logging
+
+import faiss
+import numpy as np
+
+from vector_index import build_index, read_index
+
+
+def _vectors(count=2000, dimension=16):
+    return np.random.default_rng(0).random((count, dimension), dtype=np.float32)
+
+
+def test_ivfflat_is_memory_mapped_and_searchable(tmp_path, caplog):
+    vectors = _vectors()
+    index, index_type = build_index(vectors, {"type": "ivfflat", "nlist": 8, "train_sample": 1000})
+    assert index_type == "ivfflat"
+    path = str(tmp_path / "index.faiss")
+    faiss.write_index(index, path)
+
+    with caplog.at_level(logging.INFO, logger="vector_index"):
+        loaded = read_index(path, mmap=True)
+    assert "read into memory" not in caplog.text
+    faiss.extract_index_ivf(loaded).nprobe = 8
+    _, ids = loaded.search(vectors[:5], 1)
+    assert ids[:, 0].tolist() == [0, 1, 2, 3, 4]
+
+
+def test_flat_index_reports_it_is_not_mapped(tmp_path, caplog):
+    vectors = _vectors()
+    index, _ = build_index(vectors, {"type": "flat"})
+    path = str(tmp_path / "index.faiss")
+    faiss.write_index(index, path)
+
+    with caplog.at_level(logging.INFO, logger="vector_index"):
+        read_index(path, mmap=True)
+    assert "read into memory" in caplog.text
@@ -0,0 +1,304 @@
+import logging
+import math
+import os
+import pickle
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import faiss
+import numpy as np
+from langchain.docstore.base import AddableMixin, Docstore
+from langchain.schema import Document
+from langchain.vectorstores import FAISS
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "index.pkl"
+# Raw chunk vectors in index order: lets approximate indexes be rebuilt and checked without re-embedding
+VECTORS_FILE = "vectors.npy"
+
+INDEX_TYPES = ("flat", "hnsw", "ivfflat", "ivfpq")
+# Types trained on the finished corpus, so they are built from the spooled vectors at the end
+_TRAINED_TYPES = ("ivfflat", "ivfpq")
+# k-means wants about this many training points per centroid before its clusters mean anything
+_POINTS_PER_CENTROID = 39
+
+
+class CompactDocstore(Docstore, AddableMixin):
+    """Chunk store that keeps each distinct metadata dict once and chunks as (metadata ref, text).
+
+    Chunks of one item share their metadata, so at hundreds of thousands of chunks
+    this is much smaller in memory and on disk than one Document object per chunk.
+    Documents are materialized on lookup.
+    """
+
+    def __init__(self):
+        self._metadata: List[Dict[str, Any]] = []
+        self._metadata_refs: Dict[Tuple, int] = {}
+        self._chunks: Dict[str, Tuple[int, str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {"metadata": self._metadata, "chunks": self._chunks}
+
+    def __setstate__(self, state: Dict[str, Any]):
+        self._metadata = state["metadata"]
+        self._chunks = state["chunks"]
+        self._metadata_refs = {self._metadata_key(metadata): ref for ref, metadata in enumerate(self._metadata)}
+
+    @staticmethod
+    def _metadata_key(metadata: Dict[str, Any]) -> Tuple:
+        return tuple(sorted((key, repr(value)) for key, value in metadata.items()))
+
+    def add(self, texts: Dict[str, Document]):
+        overlapping = set(texts) & set(self._chunks)
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+        for chunk_id, doc in texts.items():
+            key = self._metadata_key(doc.metadata)
+            ref = self._metadata_refs.get(key)
+            if ref is None:
+                ref = self._metadata_refs[key] = len(self._metadata)
+                self._metadata.append(dict(doc.metadata))
+            self._chunks[chunk_id] = (ref, doc.page_content)
+
+    def delete(self, ids: List):
+        missing = set(ids) - set(self._chunks)
+        if missing:
+            raise ValueError(f"Tried to delete ids that does not exist: {missing}")
+        for chunk_id in ids:
+            del self._chunks[chunk_id]
+
+    def metadata(self, chunk_id: str) -> Optional[Dict[str, Any]]:
+        """The chunk's shared metadata dict without building a Document; do not modify it"""
+        chunk = self._chunks.get(chunk_id)
+        return None if chunk is None else self._metadata[chunk[0]]
+
+    def search(self, search: str) -> Union[str, Document]:
+        chunk = self._chunks.get(search)
+        if chunk is None:
+            return f"ID {search} not found."
+        ref, text = chunk
+        return Document(page_content=text, metadata=dict(self._metadata[ref]))
+
+
+def index_params(settings) -> Dict[str, Any]:
+    """Parameters that shape the saved index; a change means it has to be rebuilt"""
+    index_type = settings.FAISS_INDEX_TYPE
+    if index_type == "hnsw":
+        params = {"type": "hnsw", "m": settings.HNSW_M, "ef_construction": settings.HNSW_EF_CONSTRUCTION}
+    elif index_type == "ivfflat":
+        params = {"type": "ivfflat", "nlist": settings.IVF_NLIST, "train_sample": settings.INDEX_TRAIN_SAMPLE}
+    elif index_type == "ivfpq":
+        params = {"type": "ivfpq", "nlist": settings.IVF_NLIST, "pq_m": settings.PQ_M, "pq_nbits": settings.PQ_NBITS,
+                  "train_sample": settings.INDEX_TRAIN_SAMPLE}
+    else:
+        if index_type != "flat":
+            logger.warning(f"Unknown FAISS_INDEX_TYPE '{index_type}', using flat")
+        params = {"type": "flat"}
+    # Per-category sub-indexes are saved beside the main index
+    params["partitions"] = settings.CATEGORY_PARTITIONS
+    return params
+
+
+def _empty_index(dimension: int, params: Dict[str, Any]):
+    """Index types that need no training and can be filled batch by batch"""
+    if params["type"] == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, params["m"])
+        index.hnsw.efConstruction = params["ef_construction"]
+        return index
+    return faiss.IndexFlatL2(dimension)
+
+
+def build_index(vectors: np.ndarray, params: Dict[str, Any]) -> Tuple[Any, str]:
+    """Build and fill a FAISS index of the requested type; returns the index and the type actually built"""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    count, dimension = vectors.shape
+
+    if params["type"] == "ivfflat":
+        # Capped so every list has enough training points; a single list is an exact search
+        nlist = min(params["nlist"] or max(1, int(4 * math.sqrt(count))), max(1, count // _POINTS_PER_CENTROID))
+        quantizer = faiss.IndexFlatL2(dimension)
+        index = faiss.IndexIVFFlat(quantizer, dimension, nlist)
+        sample_size = min(count, max(params["train_sample"], _POINTS_PER_CENTROID * nlist))
+        sample = vectors[np.sort(np.random.default_rng(0).choice(count, sample_size, replace=False))]
+        start = time.perf_counter()
+        index.train(np.ascontiguousarray(sample, dtype=np.float32))
+        logger.info(f"Trained IVF-Flat (nlist={nlist}) on {sample_size} vectors in {time.perf_counter() - start:.1f}s")
+        index.add(vectors)
+        return index, "ivfflat"
+
+    if params["type"] == "ivfpq":
+        nlist = params["nlist"] or max(1, int(4 * math.sqrt(count)))
+        pq_m = params["pq_m"]
+        if dimension % pq_m:
+            # Each sub-quantizer encodes an equal slice of the vector
+            pq_m = max(m for m in range(1, pq_m + 1) if dimension % m == 0)
+            logger.warning(f"PQ_M={params['pq_m']} does not divide dimension {dimension}, using {pq_m}")
+        needed = _POINTS_PER_CENTROID * max(nlist, 2 ** params["pq_nbits"])
+        if count < needed:
+            logger.warning(f"IVF-PQ needs about {needed} vectors to train, have {count}; building a flat index")
+            index = faiss.IndexFlatL2(dimension)
+            index.add(vectors)
+            return index, "flat"
+
+        quantizer = faiss.IndexFlatL2(dimension)
+        index = faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_m, params["pq_nbits"])
+        sample_size = min(count, max(params["train_sample"], needed))
+        sample = vectors[np.sort(np.random.default_rng(0).choice(count, sample_size, replace=False))]
+        start = time.perf_counter()
+        index.train(np.ascontiguousarray(sample, dtype=np.float32))
+        logger.info(f"Trained IVF-PQ (nlist={nlist}, m={pq_m}) on {sample_size} vectors "
+                    f"in {time.perf_counter() - start:.1f}s")
+        index.add(vectors)
+        return index, "ivfpq"
+
+    index = _empty_index(dimension, params)
+    index.add(vectors)
+    return index, params["type"]
+
+
+def configure_search(index, ef_search: int, nprobe: int):
+    """Apply query-time accuracy/speed knobs, which are not stored in the index file"""
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
+    try:
+        faiss.extract_index_ivf(index).nprobe = nprobe
+    except RuntimeError:
+        pass
+
+
+def measure_recall(index, vectors: np.ndarray, queries: int, k: int = 10) -> Dict[str, Any]:
+    """Recall@k of the index against exact search, using a sample of the stored vectors as queries"""
+    count = vectors.shape[0]
+    k = min(k, count)
+    sample = np.random.default_rng(1).choice(count, min(queries, count), replace=False)
+    query_vectors = np.ascontiguousarray(vectors[np.sort(sample)], dtype=np.float32)
+
+    _, exact = faiss.knn(query_vectors, np.ascontiguousarray(vectors, dtype=np.float32), k)
+    _, approximate = index.search(query_vectors, k)
+    found = sum(len(set(a[a >= 0]) & set(e)) for a, e in zip(approximate, exact))
+
+    # Latency of single-query searches, the shape of a live request
+    timings = []
+    for vector in query_vectors[:200]:
+        start = time.perf_counter()
+        index.search(vector.reshape(1, -1), k)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "k": k,
+        "queries": len(query_vectors),
+        "recall_at_k": round(found / (len(query_vectors) * k), 4),
+        "search_ms_p50": round(timings[len(timings) // 2], 3),
+        "search_ms_p99": round(timings[min(len(timings) - 1, int(len(timings) * 0.99))], 3),
+    }
+
+
+def save_vector_store(vector_store: FAISS, vectors: np.ndarray, folder_path: str):
+    os.makedirs(folder_path, exist_ok=True)
+    faiss.write_index(vector_store.index, os.path.join(folder_path, INDEX_FILE))
+    with open(os.path.join(folder_path, DOCSTORE_FILE), "wb") as f:
+        pickle.dump((vector_store.docstore, vector_store.index_to_docstore_id), f, protocol=pickle.HIGHEST_PROTOCOL)
+    np.save(os.path.join(folder_path, VECTORS_FILE), np.ascontiguousarray(vectors, dtype=np.float32))
+
+
+def load_vectors(folder_path: str) -> Optional[np.ndarray]:
+    """Memory-map the saved chunk vectors read-only, or None if the index predates them"""
+    path = os.path.join(folder_path, VECTORS_FILE)
+    return np.load(path, mmap_mode="r") if os.path.exists(path) else None
+
+
+def read_index(path: str, mmap: bool = True):
+    """Read a FAISS index file, memory-mapping the inverted lists of IVF indexes read-only.
+
+    FAISS only maps IVF lists: flat and HNSW indexes are read into private memory
+    even with the mmap flag, so every process holds its own full copy of them.
+    """
+    if mmap:
+        try:
+            index = faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError as e:
+            logger.warning(f"Memory-mapped index load failed, reading it into memory: {e}")
+        else:
+            if not _is_ivf(index):
+                logger.info(f"{os.path.basename(path)} is not an IVF index, so it was read into memory "
+                            f"({os.path.getsize(path) / 2 ** 20:.0f} MB per process); use ivfflat or ivfpq to share it")
+            return index
+    return faiss.read_index(path)
+
+
+def _is_ivf(index) -> bool:
+    try:
+        faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return False
+    return True
+
+
+def open_vector_store(folder_path: str, embeddings, mmap: bool = True, ef_search: int = 64,
+                      nprobe: int = 16) -> FAISS:
+    """Open a saved index and its docstore"""
+    index = read_index(os.path.join(folder_path, INDEX_FILE), mmap)
+    configure_search(index, ef_search, nprobe)
+
+    with open(os.path.join(folder_path, DOCSTORE_FILE), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+
+class IndexBuilder:
+    """Builds a vector store from embedding batches as they arrive, spooling vectors to disk.
+
+    Flat and HNSW indexes take each batch immediately. IVF indexes need the final
+    corpus size and a training sample, so they are built from the spool at the end.
+    """
+
+    def __init__(self, params: Dict[str, Any], spool_path: str):
+        self.params = params
+        self.spool_path = spool_path
+        self.chunk_ids: List[str] = []
+        self.docstore = CompactDocstore()
+        self.index = None
+        self.dimension: Optional[int] = None
+        # Time spent inside FAISS, excluding embedding
+        self.index_seconds = 0.0
+        self._spool = open(spool_path, "wb")
+
+    def add(self, chunk_ids: List[str], documents: List[Document], vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self.dimension is None:
+            self.dimension = vectors.shape[1]
+            if self.params["type"] not in _TRAINED_TYPES:
+                self.index = _empty_index(self.dimension, self.params)
+        vectors.tofile(self._spool)
+        if self.index is not None:
+            start = time.perf_counter()
+            self.index.add(vectors)
+            self.index_seconds += time.perf_counter() - start
+        self.docstore.add(dict(zip(chunk_ids, documents)))
+        self.chunk_ids.extend(chunk_ids)
+
+    def finish(self, embeddings) -> Tuple[FAISS, str, np.ndarray]:
+        """Return the store, the index type actually built and the spooled vectors, memory-mapped"""
+        self._spool.close()
+        if not self.chunk_ids:
+            raise ValueError("No chunks to index")
+        vectors = np.memmap(self.spool_path, dtype=np.float32, mode="r").reshape(-1, self.dimension)
+        if self.index is None:
+            start = time.perf_counter()
+            index, built_type = build_index(vectors, self.params)
+            self.index_seconds += time.perf_counter() - start
+        else:
+            index, built_type = self.index, self.params["type"]
+        return FAISS(embeddings, index, self.docstore, dict(enumerate(self.chunk_ids))), built_type, vectors
+
+    def discard(self):
+        self._spool.close()
+        try:
+            os.remove(self.spool_path)
+        except OSError:
+            pass